@@ -1,16 +1,26 @@
 """Algorithm class"""
 
 import abc
-import copy
+from collections.abc import MutableMapping
 import dataclasses
 from datetime import date
-from typing import List
+from typing import TYPE_CHECKING, Iterable, List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
 
 import feature_manager
 
+if TYPE_CHECKING:
+    # Not imported at runtime, as `algorithm` resolves to this module when
+    # algorithm/ is on sys.path without a package.
+    from algorithm import schedule as schedule_lib
+
 
 @dataclasses.dataclass
 class Trading:
+    __slots__ = ('code', 'target_price', 'bound_price', 'amount', 'action')
+
     code: str
     target_price: float
     bound_price: float  # used for upper/lower bound for deal
@@ -21,6 +31,8 @@ class Trading:
 
 @dataclasses.dataclass
 class Stock:
+    __slots__ = ('code', 'bought_price', 'amount', 'bought_at')
+
     code: str
     bought_price: int
     amount: int
@@ -30,37 +42,273 @@ class Stock:
         self.amount = amount
 
 
+class PortfolioSnapshot(NamedTuple):
+    codes: np.ndarray
+    amounts: np.ndarray
+    cost_basis: np.ndarray
+    bought_at: np.ndarray
+
+
+class Portfolio:
+    """Owned stocks stored as parallel arrays.
+
+    Each row is one stock code. Codes are interned to `code_index` so rows
+    can be aligned against other code indexed arrays without string
+    comparison.
+    """
+
+    _INITIAL_CAPACITY = 32
+
+    def __init__(self, stocks: Iterable[Stock] = ()):
+        self._code_table = []
+        self._code_ids = {}
+        self._rows = {}  # code index -> row
+        self._size = 0
+        self._code_index = np.empty(self._INITIAL_CAPACITY, dtype=np.int32)
+        self._amount = np.empty(self._INITIAL_CAPACITY, dtype=np.int64)
+        self._cost_basis = np.empty(self._INITIAL_CAPACITY, dtype=np.float64)
+        self._bought_at = np.empty(self._INITIAL_CAPACITY,
+                                   dtype='datetime64[ns]')
+        for stock in stocks:
+            self.add(stock)
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, code):
+        return self._row_of(code) is not None
+
+    @property
+    def code_index(self) -> np.ndarray:
+        return self._code_index[:self._size]
+
+    @property
+    def codes(self) -> np.ndarray:
+        return np.array(self._code_table, dtype=object)[self.code_index]
+
+    @property
+    def amounts(self) -> np.ndarray:
+        return self._amount[:self._size]
+
+    @property
+    def cost_basis(self) -> np.ndarray:
+        return self._cost_basis[:self._size]
+
+    @property
+    def bought_at(self) -> np.ndarray:
+        return self._bought_at[:self._size]
+
+    def _intern(self, code: str) -> int:
+        code_id = self._code_ids.get(code)
+        if code_id is None:
+            code_id = len(self._code_table)
+            self._code_table.append(code)
+            self._code_ids[code] = code_id
+        return code_id
+
+    def _row_of(self, code: str) -> Optional[int]:
+        code_id = self._code_ids.get(code)
+        if code_id is None:
+            return None
+        return self._rows.get(code_id)
+
+    def _grow(self):
+        capacity = len(self._amount) * 2
+        for name in ['_code_index', '_amount', '_cost_basis', '_bought_at']:
+            array = getattr(self, name)
+            grown = np.empty(capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            setattr(self, name, grown)
+
+    def get(self, code: str) -> Optional[Stock]:
+        row = self._row_of(code)
+        if row is None:
+            return None
+        bought_at = self._bought_at[row]
+        return Stock(code=code,
+                     bought_price=self._cost_basis[row].item(),
+                     amount=self._amount[row].item(),
+                     bought_at=(None if np.isnat(bought_at) else
+                                pd.Timestamp(bought_at).to_pydatetime()))
+
+    def set(self, stock: Stock):
+        """Add or replace the row of `stock.code`."""
+        row = self._row_of(stock.code)
+        if row is None:
+            if self._size == len(self._amount):
+                self._grow()
+            row = self._size
+            code_id = self._intern(stock.code)
+            self._code_index[row] = code_id
+            self._rows[code_id] = row
+            self._size += 1
+        self._amount[row] = stock.amount
+        self._cost_basis[row] = stock.bought_price
+        self._bought_at[row] = (np.datetime64('NaT') if stock.bought_at is None
+                                else np.datetime64(stock.bought_at, 'ns'))
+
+    def add(self, stock: Stock):
+        """Add `stock`. Cost basis is averaged if the code is owned already."""
+        row = self._row_of(stock.code)
+        if row is None:
+            self.set(stock)
+            return
+        total_amount = self._amount[row] + stock.amount
+        if total_amount > 0:
+            self._cost_basis[row] = (
+                self._cost_basis[row] * self._amount[row] +
+                stock.bought_price * stock.amount) / total_amount
+        self._amount[row] = total_amount
+
+    def reduce(self, code: str, amount: int) -> int:
+        """Reduce owned amount of `code` and returns actually reduced amount.
+
+        Rows whose amount becomes zero are removed.
+        """
+        row = self._row_of(code)
+        if row is None:
+            return 0
+        reduced = min(amount, self._amount[row].item())
+        self._amount[row] -= reduced
+        if self._amount[row] <= 0:
+            self.remove(code)
+        return reduced
+
+    def remove(self, code: str):
+        row = self._row_of(code)
+        if row is None:
+            raise KeyError(code)
+        last = self._size - 1
+        if row != last:
+            # Move the last row into the hole to keep rows contiguous.
+            for array in [
+                    self._code_index, self._amount, self._cost_basis,
+                    self._bought_at
+            ]:
+                array[row] = array[last]
+            self._rows[self._code_index[row].item()] = row
+        del self._rows[self._code_ids[code]]
+        self._size -= 1
+
+    def align(self, values) -> np.ndarray:
+        """Returns float array of code indexed `values` aligned to rows.
+
+        Args:
+            values: pd.Series or dict keyed by code. Missing codes are NaN.
+        """
+        if not isinstance(values, pd.Series):
+            values = pd.Series(values, dtype=np.float64)
+        return values.reindex(self.codes).values.astype(np.float64)
+
+    def market_values(self, prices: np.ndarray) -> np.ndarray:
+        return self.amounts * prices
+
+    def value(self, prices: np.ndarray) -> float:
+        """Returns total market value with `prices` aligned to rows."""
+        return float(np.dot(self.amounts, prices))
+
+    def exposure(self, prices: np.ndarray) -> np.ndarray:
+        """Returns weight of each row in total market value."""
+        market_values = self.market_values(prices)
+        total = market_values.sum()
+        if total == 0:
+            return np.zeros_like(market_values)
+        return market_values / total
+
+    def pnl(self, prices: np.ndarray) -> np.ndarray:
+        """Returns unrealized profit and loss of each row."""
+        return (prices - self.cost_basis) * self.amounts
+
+    def snapshot(self) -> PortfolioSnapshot:
+        return PortfolioSnapshot(codes=self.codes,
+                                 amounts=self.amounts.copy(),
+                                 cost_basis=self.cost_basis.copy(),
+                                 bought_at=self.bought_at.copy())
+
+
+class BasketView(MutableMapping):
+    """Dict-like view of `Portfolio` keyed by code.
+
+    NOTE: Values are `Stock` copies. Mutating them does not change the
+    portfolio, set them back instead.
+    """
+
+    def __init__(self, portfolio: Portfolio):
+        self._portfolio = portfolio
+
+    def __getitem__(self, code):
+        stock = self._portfolio.get(code)
+        if stock is None:
+            raise KeyError(code)
+        return stock
+
+    def __setitem__(self, code, stock):
+        if code != stock.code:
+            raise ValueError(f'Code mismatch: {code} / {stock.code}')
+        self._portfolio.set(stock)
+
+    def __delitem__(self, code):
+        self._portfolio.remove(code)
+
+    def __contains__(self, code):
+        return code in self._portfolio
+
+    def __iter__(self):
+        return iter(self._portfolio.codes.tolist())
+
+    def __len__(self):
+        return len(self._portfolio)
+
+
 class Context:
     """Context to represent current status."""
 
     def __init__(self, budget=0, basket=None, market_time=None):
         self.budget = budget
-        self.basket = basket if basket else {}
+        self.portfolio = Portfolio(basket.values() if basket else ())
         self.market_time = market_time
+        # Names of schedule triggers fired at `market_time`. None if the
+        # algorithm is not run by its schedule.
+        self.triggers = None
+
+    @property
+    def basket(self) -> BasketView:
+        return BasketView(self.portfolio)
 
     def __str__(self):
         return ''.join([
             f'<Context at {self.market_time}, budget={self.budget}, ',
-            f'basket_count={len(self.basket)}>\n', f'Owned stocks:\n',
-            '\n'.join([f' - {stock}' for stock in self.basket])
+            f'basket_count={len(self.portfolio)}>\n', f'Owned stocks:\n',
+            '\n'.join([f' - {stock}' for stock in self.basket.values()])
         ])
 
     def update_budget(self, budget):
         self.budget = budget
 
     def update_basket(self, basket: dict):
-        self.basket = copy.deepcopy(basket)
+        self.portfolio = Portfolio(basket.values())
 
     def update_market_time(self, market_time):
         self.market_time = market_time
 
+    def update_triggers(self, triggers):
+        self.triggers = triggers
+
     def buy_stocks(self, stocks: List[Stock]):
         total_price = 0
         for stock in stocks:
             total_price += stock.bought_price * stock.amount
-            self.basket[stock.code] = stock
+            self.portfolio.add(stock)
         self.budget -= total_price
 
+    def sell_stocks(self, transactions):
+        """Apply sold `trading_manager.Transaction`s."""
+        returned_budget = 0
+        for trans in transactions:
+            sold_amount = self.portfolio.reduce(trans.code, trans.amount)
+            returned_budget += trans.sold_price * sold_amount
+        self.budget += returned_budget
+
 
 # TODO(jseo): Consider to change as protobuf
 class Algorithm:
@@ -86,6 +334,13 @@ class Algorithm:
         """
         raise NotImplementedError()
 
+    def schedule(self) -> Optional['schedule_lib.Schedule']:
+        """Returns schedule of trading days to run on.
+
+        None means running on every trading day.
+        """
+        return None
+
     def __init_subclass__(cls, **kwargs):
         super().__init_subclass__(**kwargs)
         cls.algorithms[cls.__name__] = cls
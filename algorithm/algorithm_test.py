@@ -0,0 +1,85 @@
+"""Tests of `Portfolio` of owned stocks."""
+
+import datetime
+import unittest
+
+import numpy as np
+
+from algorithm import algorithm
+
+_BOUGHT_AT = datetime.datetime(2021, 3, 2)
+
+
+def _stock(code, bought_price, amount):
+    return algorithm.Stock(code, bought_price, amount, _BOUGHT_AT)
+
+
+class PortfolioTest(unittest.TestCase):
+
+    def test_add_averages_cost_basis(self):
+        portfolio = algorithm.Portfolio([_stock('005930', 100., 10)])
+
+        portfolio.add(_stock('005930', 200., 30))
+
+        self.assertEqual(len(portfolio), 1)
+        self.assertEqual(portfolio.get('005930').amount, 40)
+        self.assertEqual(portfolio.get('005930').bought_price, 175.)
+
+    def test_remove_moves_last_row_into_hole(self):
+        portfolio = algorithm.Portfolio([
+            _stock('005930', 100., 10),
+            _stock('000660', 200., 20),
+            _stock('035420', 300., 30),
+        ])
+
+        portfolio.remove('005930')
+
+        self.assertEqual(portfolio.codes.tolist(), ['035420', '000660'])
+        np.testing.assert_array_equal(portfolio.amounts, [30, 20])
+        np.testing.assert_array_equal(portfolio.cost_basis, [300., 200.])
+        self.assertNotIn('005930', portfolio)
+        self.assertEqual(portfolio.get('035420'),
+                         _stock('035420', 300., 30))
+        self.assertEqual(portfolio.get('000660'),
+                         _stock('000660', 200., 20))
+
+    def test_remove_then_add_again(self):
+        portfolio = algorithm.Portfolio([
+            _stock('005930', 100., 10),
+            _stock('000660', 200., 20),
+        ])
+
+        portfolio.remove('000660')
+        portfolio.add(_stock('000660', 250., 5))
+
+        self.assertEqual(portfolio.codes.tolist(), ['005930', '000660'])
+        self.assertEqual(portfolio.get('000660'), _stock('000660', 250., 5))
+
+    def test_remove_missing_code_raises(self):
+        with self.assertRaises(KeyError):
+            algorithm.Portfolio().remove('005930')
+
+    def test_reduce_removes_sold_out_rows(self):
+        portfolio = algorithm.Portfolio([
+            _stock('005930', 100., 10),
+            _stock('000660', 200., 20),
+        ])
+
+        self.assertEqual(portfolio.reduce('005930', 4), 4)
+        self.assertEqual(portfolio.reduce('000660', 30), 20)
+
+        self.assertEqual(portfolio.codes.tolist(), ['005930'])
+        self.assertEqual(portfolio.get('005930').amount, 6)
+        self.assertEqual(portfolio.reduce('000660', 1), 0)
+
+    def test_grows_past_initial_capacity(self):
+        stocks = [_stock(f'{i:06d}', i, i + 1) for i in range(100)]
+
+        portfolio = algorithm.Portfolio(stocks)
+
+        self.assertEqual(len(portfolio), 100)
+        self.assertEqual(portfolio.get('000099'), stocks[99])
+
+
+if __name__ == '__main__':
+    unittest.main()
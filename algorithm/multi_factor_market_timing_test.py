@@ -0,0 +1,102 @@
+"""Tests of `MultiFactorMarketTiming`."""
+
+import datetime
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from algorithm import algorithm
+from algorithm import multi_factor_market_timing
+
+_KRX = 'algorithm.multi_factor_market_timing.krx_stock'
+
+
+def _kosdaq(closes):
+    dates = pd.bdate_range(end='2021-03-10', periods=len(closes))
+    return pd.DataFrame({'종가': closes}, index=dates)
+
+
+def _prices(prices):
+    return pd.DataFrame({'종가': list(prices.values())},
+                        index=list(prices.keys()))
+
+
+class _Features:
+    listing_index = None
+
+
+class KosdaqDrawdownTest(unittest.TestCase):
+
+    def setUp(self):
+        self.context = algorithm.Context(
+            budget=1000,
+            basket={
+                '005930':
+                    algorithm.Stock('005930', 80000, 10,
+                                    datetime.date(2021, 2, 1)),
+                '000660':
+                    algorithm.Stock('000660', 120000, 5,
+                                    datetime.date(2021, 2, 1)),
+            },
+            market_time=datetime.datetime(2021, 3, 10))
+        self.algorithm = multi_factor_market_timing.MultiFactorMarketTiming()
+
+    @mock.patch(_KRX)
+    def test_drawdown_sells_out(self, krx_stock):
+        # Close falls under all of its 3, 5 and 10 day moving averages.
+        krx_stock.get_index_ohlcv_by_date.return_value = _kosdaq(
+            [1000 - 5 * i for i in range(30)])
+        krx_stock.get_market_ohlcv_by_ticker.return_value = _prices({
+            '005930': 82000.,
+            '000660': 130000.,
+        })
+
+        tradings = self.algorithm.run(self.context, _Features())
+
+        self.assertCountEqual([(t.code, t.amount, t.action) for t in tradings],
+                              [('005930', 10, 'sell'), ('000660', 5, 'sell')])
+        # No portfolio is built on the drawdown day.
+        krx_stock.get_market_fundamental_by_ticker.assert_not_called()
+
+    @mock.patch(_KRX)
+    def test_no_drawdown_skips_non_rebalancing_day(self, krx_stock):
+        krx_stock.get_index_ohlcv_by_date.return_value = _kosdaq(
+            [1000 + 5 * i for i in range(30)])
+        self.algorithm._is_first = False  # pylint: disable=protected-access
+
+        self.assertEqual(self.algorithm.run(self.context, _Features()), [])
+
+
+class KrxTest(unittest.TestCase):
+
+    def test_same_arguments_call_pykrx_once(self):
+        function = mock.Mock(return_value=_prices({'005930': 80000}))
+
+        # pylint: disable=protected-access
+        first = multi_factor_market_timing._krx(function, '20210310',
+                                                market='ALL')
+        first['종가'] = 0
+        second = multi_factor_market_timing._krx(function, '20210310',
+                                                 market='ALL')
+        multi_factor_market_timing._krx(function, '20210311', market='ALL')
+
+        self.assertEqual(second['종가'].tolist(), [80000])
+        self.assertEqual(function.call_args_list, [
+            mock.call('20210310', market='ALL'),
+            mock.call('20210311', market='ALL')
+        ])
+
+    def test_failed_call_is_not_memoized(self):
+        function = mock.Mock(side_effect=[ValueError, _prices({})])
+
+        # pylint: disable=protected-access
+        with self.assertRaises(ValueError):
+            multi_factor_market_timing._krx(function, '20210310')
+        multi_factor_market_timing._krx(function, '20210310')
+
+        self.assertEqual(function.call_count, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
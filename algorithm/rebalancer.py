@@ -0,0 +1,116 @@
+"""Portfolio rebalancer
+
+Nets current holdings against target weights for the whole portfolio at once
+and emits the resulting sell/buy orders.
+"""
+
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from algorithm import algorithm
+
+_SELL_BOUND_RATE = 0.9
+_BUY_BOUND_RATE = 1.1
+
+
+def rebalance(codes,
+              amounts,
+              prices,
+              target_weights,
+              budget: float,
+              cash_buffer: float = 0.,
+              lot_size: int = 1) -> List[algorithm.Trading]:
+    """Calculate netted orders to move holdings to target weights.
+
+    All array arguments are aligned to `codes`. Codes without valid price
+    (NaN or non-positive) are left untouched.
+
+    Args:
+        codes: stock codes of held and targeted stocks.
+        amounts: currently held amount for each code (0 if not held).
+        prices: current price for each code.
+        target_weights: target weight of total equity for each code. Codes
+            dropped out of the portfolio should have 0 weight.
+        budget: cash on hand.
+        cash_buffer: ratio of total equity to keep as cash.
+        lot_size: amounts are rounded down to multiple of this.
+
+    Returns:
+        list of trading items. Sells come before buys so that cash is freed
+        before it is spent.
+    """
+    codes = np.asarray(codes)
+    amounts = np.asarray(amounts, dtype=np.int64)
+    prices = np.asarray(prices, dtype=np.float64)
+    target_weights = np.asarray(target_weights, dtype=np.float64)
+
+    valid = np.isfinite(prices) & (prices > 0)
+    safe_prices = np.where(valid, prices, 1.)
+    equity = budget + np.sum(amounts * safe_prices, where=valid)
+    reserved = equity * cash_buffer
+
+    targets = np.floor(equity * (1 - cash_buffer) * target_weights /
+                       safe_prices / lot_size).astype(np.int64) * lot_size
+    targets = np.where(valid, targets, amounts)
+    diffs = targets - amounts
+
+    sells = diffs < 0
+    buys = diffs > 0
+    cash = budget - reserved + np.sum(-diffs * prices, where=sells)
+    cost = np.sum(diffs * prices, where=buys)
+    if cost > cash:
+        # Not enough cash to fill all buys. Shrink them evenly.
+        scale = max(cash, 0) / cost
+        diffs[buys] = (np.floor(diffs[buys] * scale / lot_size).astype(
+            np.int64) * lot_size)
+        buys = diffs > 0
+
+    tradings = []
+    for idx in np.flatnonzero(sells):
+        tradings.append(
+            algorithm.Trading(code=str(codes[idx]),
+                              target_price=prices[idx],
+                              bound_price=prices[idx] * _SELL_BOUND_RATE,
+                              amount=int(-diffs[idx]),
+                              action='sell'))
+    for idx in np.flatnonzero(buys):
+        tradings.append(
+            algorithm.Trading(code=str(codes[idx]),
+                              target_price=prices[idx],
+                              bound_price=prices[idx] * _BUY_BOUND_RATE,
+                              amount=int(diffs[idx]),
+                              action='buy'))
+    return tradings
+
+
+def rebalance_portfolio(portfolio: algorithm.Portfolio,
+                        budget: float,
+                        target_weights: pd.Series,
+                        prices: pd.Series,
+                        cash_buffer: float = 0.,
+                        lot_size: int = 1) -> List[algorithm.Trading]:
+    """Rebalance `portfolio` of `Context` to target weights.
+
+    Args:
+        portfolio: owned stocks.
+        budget: cash on hand.
+        target_weights: target weights indexed by code. Owned stocks which are
+            not in here are sold out.
+        prices: current prices indexed by code.
+        cash_buffer: ratio of total equity to keep as cash.
+        lot_size: amounts are rounded down to multiple of this.
+
+    Returns:
+        list of trading items, sells first.
+    """
+    held = pd.Series(portfolio.amounts, index=portfolio.codes, dtype=np.int64)
+    codes = held.index.union(target_weights.index)
+    return rebalance(codes.values,
+                     held.reindex(codes, fill_value=0).values,
+                     prices.reindex(codes).values,
+                     target_weights.reindex(codes, fill_value=0.).values,
+                     budget,
+                     cash_buffer=cash_buffer,
+                     lot_size=lot_size)
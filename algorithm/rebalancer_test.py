@@ -0,0 +1,83 @@
+"""Tests of `rebalancer`."""
+
+import unittest
+
+import numpy as np
+
+from algorithm import rebalancer
+
+
+def _orders(tradings):
+    return [(t.code, t.action, t.amount) for t in tradings]
+
+
+class RebalanceTest(unittest.TestCase):
+
+    def test_sells_come_before_buys(self):
+        tradings = rebalancer.rebalance(['000660', '005930'], [0, 10],
+                                        [50., 100.], [1., 0.],
+                                        budget=0)
+
+        self.assertEqual(_orders(tradings), [('005930', 'sell', 10),
+                                             ('000660', 'buy', 20)])
+
+    def test_amounts_are_rounded_down_to_lot(self):
+        tradings = rebalancer.rebalance(['005930'], [0], [30.], [1.],
+                                        budget=1000,
+                                        lot_size=10)
+
+        self.assertEqual(_orders(tradings), [('005930', 'buy', 30)])
+
+    def test_cash_buffer_is_kept(self):
+        tradings = rebalancer.rebalance(['005930'], [0], [10.], [1.],
+                                        budget=1000,
+                                        cash_buffer=0.1)
+
+        self.assertEqual(_orders(tradings), [('005930', 'buy', 90)])
+
+    def test_buys_are_shrunk_evenly_without_enough_cash(self):
+        # Weights over 1 cost twice the cash.
+        tradings = rebalancer.rebalance(['000660', '005930'], [0, 0],
+                                        [10., 20.], [1., 1.],
+                                        budget=1000,
+                                        lot_size=5)
+
+        self.assertEqual(_orders(tradings), [('000660', 'buy', 50),
+                                             ('005930', 'buy', 25)])
+        self.assertLessEqual(sum(t.amount * t.target_price for t in tradings),
+                             1000)
+
+    def test_sold_cash_pays_buys(self):
+        tradings = rebalancer.rebalance(['000660', '005930'], [0, 10],
+                                        [10., 100.], [0.5, 0.5],
+                                        budget=0)
+
+        self.assertEqual(_orders(tradings), [('005930', 'sell', 5),
+                                             ('000660', 'buy', 50)])
+
+    def test_codes_without_valid_price_are_untouched(self):
+        tradings = rebalancer.rebalance(['000660', '005930', '035420'],
+                                        [5, 0, 3], [np.nan, 10., 0.],
+                                        [0., 1., 0.],
+                                        budget=100)
+
+        self.assertEqual(_orders(tradings), [('005930', 'buy', 10)])
+
+    def test_no_orders_on_target(self):
+        tradings = rebalancer.rebalance(['005930'], [10], [100.], [1.],
+                                        budget=0)
+
+        self.assertEqual(tradings, [])
+
+    def test_bound_prices_cap_slippage(self):
+        tradings = rebalancer.rebalance(['000660', '005930'], [0, 10],
+                                        [50., 100.], [1., 0.],
+                                        budget=0)
+
+        sell, buy = tradings
+        self.assertLess(sell.bound_price, sell.target_price)
+        self.assertGreater(buy.bound_price, buy.target_price)
+
+
+if __name__ == '__main__':
+    unittest.main()
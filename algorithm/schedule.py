@@ -0,0 +1,148 @@
+"""Algorithm schedule
+
+Algorithms declare on which trading days they need to run through a
+`Schedule` of triggers. Back tester jumps between these event days instead
+of calling the algorithm on every trading day.
+"""
+
+import abc
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+
+class Trigger(abc.ABC):
+    """Condition which makes an algorithm run on a trading day."""
+    name = ''
+
+    # Whether the trigger depends on owned stocks. Static triggers are
+    # precomputed over all ticks at once, dynamic triggers are evaluated
+    # over each span between events.
+    is_dynamic = False
+
+    def event_mask(self, ticks: pd.DatetimeIndex,
+                   feature_manager) -> np.ndarray:
+        """Returns boolean mask of `ticks` which the trigger fires on."""
+        raise NotImplementedError()
+
+    def first_event(self, ticks: pd.DatetimeIndex, portfolio,
+                    feature_manager) -> Optional[int]:
+        """Returns position of the first tick the trigger fires on or None."""
+        raise NotImplementedError()
+
+
+class MonthlyFirstTradingDay(Trigger):
+    """Fires on the first trading day of each month.
+
+    The first tick is regarded as the first trading day of its month.
+    """
+    name = 'monthly'
+
+    def event_mask(self, ticks, feature_manager):
+        del feature_manager  # Unused
+        months = ticks.year * 12 + ticks.month
+        return np.diff(months, prepend=-1) != 0
+
+
+class Weekly(Trigger):
+    """Fires on the first trading day of each week."""
+    name = 'weekly'
+
+    def event_mask(self, ticks, feature_manager):
+        del feature_manager  # Unused
+        # Monday of the week of each tick.
+        weeks = (ticks - pd.to_timedelta(ticks.weekday, unit='D')).normalize()
+        return np.diff(weeks.values.astype(np.int64), prepend=-1) != 0
+
+
+class IndexCrossing(Trigger):
+    """Fires when close of index crosses under or back over all its MAs.
+
+    Args:
+        code: index code of `FeatureManager`, e.g. 'KQ11' for KOSDAQ.
+        windows: moving average windows in trading days.
+    """
+    name = 'index_crossing'
+
+    def __init__(self, code: str, windows: Sequence[int] = (3, 5, 10)):
+        self._code = code
+        self._windows = windows
+
+    def event_mask(self, ticks, feature_manager):
+        closes = feature_manager.get_feature(
+            self._code,
+            'Close',
+            start=ticks[0].to_pydatetime(),
+            end=ticks[-1].to_pydatetime()).reindex(ticks).ffill()
+        below = np.ones(len(ticks), dtype=bool)
+        for window in self._windows:
+            moving_average = closes.rolling(window, min_periods=1).mean()
+            below &= (closes < moving_average).values
+        return np.diff(below.astype(np.int8), prepend=0) != 0
+
+
+class PriceThreshold(Trigger):
+    """Fires when close of any owned stock moves out of the threshold.
+
+    Thresholds are ratios against the cost basis, e.g. `lower=-0.1` fires on
+    10% loss.
+    """
+    name = 'price_threshold'
+    is_dynamic = True
+
+    def __init__(self,
+                 lower: Optional[float] = None,
+                 upper: Optional[float] = None):
+        self._lower = lower
+        self._upper = upper
+
+    def first_event(self, ticks, portfolio, feature_manager):
+        if not len(portfolio) or not len(ticks):
+            return None
+        closes = np.stack([
+            feature_manager.get_feature(
+                code,
+                'Close',
+                start=ticks[0].to_pydatetime(),
+                end=ticks[-1].to_pydatetime()).reindex(ticks).values
+            for code in portfolio.codes
+        ],
+                          axis=1)
+        hit = np.zeros(closes.shape, dtype=bool)
+        with np.errstate(invalid='ignore'):
+            if self._lower is not None:
+                hit |= closes <= portfolio.cost_basis * (1 + self._lower)
+            if self._upper is not None:
+                hit |= closes >= portfolio.cost_basis * (1 + self._upper)
+        hit_ticks = np.flatnonzero(hit.any(axis=1))
+        return hit_ticks[0] if len(hit_ticks) else None
+
+
+class Schedule:
+    """Set of triggers an algorithm runs on."""
+
+    def __init__(self, triggers: List[Trigger]):
+        self._static_triggers = [t for t in triggers if not t.is_dynamic]
+        self._dynamic_triggers = [t for t in triggers if t.is_dynamic]
+
+    def event_masks(self, ticks: pd.DatetimeIndex,
+                    feature_manager) -> Dict[str, np.ndarray]:
+        """Returns event masks of static triggers keyed by trigger name."""
+        return {
+            trigger.name: trigger.event_mask(ticks, feature_manager)
+            for trigger in self._static_triggers
+        }
+
+    def first_dynamic_event(self, ticks: pd.DatetimeIndex, portfolio,
+                            feature_manager):
+        """Returns (position, trigger name) of the earliest dynamic event.
+
+        Returns (None, None) if no dynamic trigger fires within `ticks`.
+        """
+        first, first_name = None, None
+        for trigger in self._dynamic_triggers:
+            position = trigger.first_event(ticks, portfolio, feature_manager)
+            if position is not None and (first is None or position < first):
+                first, first_name = position, trigger.name
+        return first, first_name
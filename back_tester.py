@@ -1,6 +1,5 @@
 """Back Tester"""
 
-import copy
 import datetime
 
 from absl import app
@@ -9,7 +8,7 @@ from absl import logging
 import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
-from pykrx import stock as krx_stock
+import pandas as pd
 import tqdm
 
 import FinanceDataReader as fdr
@@ -17,10 +16,9 @@ import FinanceDataReader as fdr
 from algorithm import algorithm
 from algorithm import multi_factor_market_timing
 import feature_manager as feature_manager_helper
+import listing_index
 import trading_manager
 
-matplotlib.use('macosx')
-
 FLAGS = flags.FLAGS
 # FLAGS for back test.
 flags.DEFINE_string('start_date', '2001-01-03', 'Start date for back test.')
@@ -28,6 +26,10 @@ flags.DEFINE_string('end_date', '2020-12-31', 'End date for back test.')
 flags.DEFINE_integer('budget', 10_000_000, 'Budget for back test.')
 flags.DEFINE_enum('algorithm', 'DummyAlgorithm',
                   algorithm.Algorithm.algorithms.keys(), 'Algorithm')
+flags.DEFINE_string(
+    'listing_index', None, '(Optional) Path to cached listing index. '
+    'It is built from KRX if not exists. If given, delisted stocks are '
+    'dropped from the basket.')
 
 ENV = 'back_test'
 
@@ -52,29 +54,63 @@ class MetricManager:
         self._profit_rate = 0
         self._asset_list = []
         self._last_total_asset = budget
+        # Transactions of sold stocks.
+        self.transactions = []
 
     def update_metric_by_context(self, context):
         if context.market_time is None:
             # Metric Manager does not support for real time trader.
             return
 
-        current_asset = context.budget
-        for owned_stock in context.basket.values():
-            min_price = self._feature_manager.get_feature_at(
-                owned_stock.code, 'Close', time=context.market_time)
-            if min_price is None:
-                return
-            current_asset += int(owned_stock.amount * min_price)
+        portfolio = context.portfolio
+        prices = np.array([
+            self._feature_manager.get_feature_at(
+                code, 'Close', time=context.market_time)
+            for code in portfolio.codes
+        ],
+                          dtype=np.float64)
+        if np.isnan(prices).any():
+            return
+        current_asset = context.budget + int(portfolio.value(prices))
+        self._append_assets([context.market_time],
+                            np.array([current_asset], dtype=np.float64))
+
+    def update_metric_by_mark_to_market(self, market_dates, context):
+        """Update metrics of skipped `market_dates` at once.
 
-        if current_asset > self._max_total_asset:
-            self._max_total_asset = current_asset
+        Owned stocks are not changed during `market_dates` so that total asset
+        is calculated with a price matrix of the dates.
+        """
+        if not len(market_dates):
+            return
+
+        snapshot = context.portfolio.snapshot()
+        prices = np.zeros((len(market_dates), len(snapshot.codes)))
+        for i, code in enumerate(snapshot.codes):
+            prices[:, i] = self._feature_manager.get_feature(
+                code,
+                'Close',
+                start=market_dates[0].to_pydatetime(),
+                end=market_dates[-1].to_pydatetime()).reindex(
+                    market_dates).values
+        # Same as `update_metric_by_context`, skip dates without price.
+        valid = ~np.isnan(prices).any(axis=1)
+        assets = context.budget + np.floor(prices[valid] @ snapshot.amounts)
+        self._append_assets(market_dates[valid].tolist(), assets)
+
+    def _append_assets(self, market_dates, assets):
+        if not len(assets):
+            return
+        max_assets = np.maximum.accumulate(
+            np.maximum(assets, self._max_total_asset))
+        self._max_total_asset = max_assets[-1].item()
 
-        self._market_dates += [context.market_time]
-        self._profit_rate = _diff_percentage(current_asset, self._init_budget)
-        self._mdd_list += [
-            _diff_percentage(current_asset, self._max_total_asset)
-        ]
-        self._asset_list += [current_asset]
+        self._market_dates += market_dates
+        self._profit_rate = _diff_percentage(assets[-1].item(),
+                                             self._init_budget)
+        self._mdd_list += np.round(
+            (assets - max_assets) / max_assets * 100, 3).tolist()
+        self._asset_list += assets.tolist()
 
     def _get_mdd(self):
         if not self._mdd_list:
@@ -87,6 +123,10 @@ class MetricManager:
     def _get_profit_rate(self):
         return self._profit_rate
 
+    def summary(self):
+        """Returns profit rate and MDD in percentage."""
+        return {'profit_rate': self._get_profit_rate(), 'mdd': self._get_mdd()}
+
     def report(self):
         print('------------ Report for Back Test ------------')
         print(f'Profit: {self._get_profit()} ({self._get_profit_rate()}%)')
@@ -120,25 +160,20 @@ class MetricManager:
         plt.show()
 
 
-def check_delisting(context: algorithm.Context):
-    date = context.market_time
-    close_prices = krx_stock.get_market_ohlcv_by_ticker(
-        date.strftime('%Y%m%d'), market='ALL')
-    close_prices = close_prices['종가']
-    valids = {}
-    for stock in context.basket.values():
-        if stock.code in close_prices:
-            valids[stock.code] = stock
-        else:
-            logging.info(f'[{context.market_time}] {stock.code} is delisted.')
-    context.update_basket(valids)
+def check_delisting(context: algorithm.Context,
+                    index: listing_index.ListingIndex):
+    codes = context.portfolio.codes
+    for code in codes[~index.are_listed(codes, context.market_time)]:
+        logging.info(f'[{context.market_time}] {code} is delisted.')
+        context.portfolio.remove(code)
     return context
 
 
 def algorithm_handler(trade_algorithm: algorithm.Algorithm,
                       context: algorithm.Context,
                       trader: trading_manager.TradingManager, feature_manager):
-    #context = check_delisting(context)
+    if feature_manager.listing_index is not None:
+        context = check_delisting(context, feature_manager.listing_index)
     transaction_history = []
     trading_target = trade_algorithm.run(context, feature_manager)
     logging.debug(f'[{context.market_time.strftime("%Y-%m-%d")}] '
@@ -160,33 +195,7 @@ def trading_buy_handler(context, trader, trading):
 
 def trading_sell_handler(context, trader, trading):
     transactions = trader.sell(trading)
-    remained_stocks = copy.deepcopy(context.basket)
-    returned_budget = 0
-
-    for trans in transactions:
-        remaining_sold_amount = trans.amount
-        updated_basket = {}
-        for owned_stock in remained_stocks.values():
-            # Stock code is not matched
-            if owned_stock.code != trans.code:
-                updated_basket[owned_stock.code] = owned_stock
-                continue
-            # Stock is more than sold amount
-            if owned_stock.amount > trans.amount:
-                returned_budget += trans.sold_price * trans.amount
-                owned_stock.update_amount(owned_stock.amount - trans.amount)
-                updated_basket[owned_stock.code] = owned_stock
-                break
-            # Sold all amount of stock
-            remaining_sold_amount -= trans.amount
-            returned_budget += trans.sold_price * owned_stock.amount
-            if remaining_sold_amount <= 0:
-                break
-        remained_stocks = updated_basket
-
-    context.update_budget(context.budget + returned_budget)
-    context.update_basket(remained_stocks)
-
+    context.sell_stocks(transactions)
     return transactions  # to save all transactions in simulator
 
 
@@ -203,21 +212,15 @@ def _get_ticks(start_date, end_date, feature_manager):
     return kospi_df.index.tolist()
 
 
-def simulate(start_date, end_date, trade_algorithm, budget):
-    print(f'Simulation date range: {start_date} ~ {end_date}')
-    start_date = _parse_datetime(start_date)
-    end_date = _parse_datetime(end_date)
-
-    context = algorithm.Context(budget=budget, basket=[])
-    feature_manager = feature_manager_helper.FinanceDataReaderManager(
-        'KRX', cache_start_date=start_date, cache_end_date=end_date)
-    metric_manager = MetricManager(budget=budget,
-                                   feature_manager=feature_manager)
-    trader = trading_manager.get_trading_manager(
-        'back_test', {'feature_manager': feature_manager})
-
+def _run_every_tick(ticks,
+                    trade_algorithm,
+                    context,
+                    trader,
+                    feature_manager,
+                    metric_manager,
+                    should_stop=None):
     transaction_history = []
-    for now in tqdm.tqdm(_get_ticks(start_date, end_date, feature_manager)):
+    for i, now in enumerate(tqdm.tqdm(ticks)):
         context.update_market_time(now)
         trader.set_user_and_stock_data(context, None)
         transaction_history += algorithm_handler(trade_algorithm, context,
@@ -225,7 +228,125 @@ def simulate(start_date, end_date, trade_algorithm, budget):
 
         metric_manager.update_metric_by_context(context)
         # print(context)
-    # print(transaction_history)
+        if should_stop and should_stop((i + 1) / len(ticks), metric_manager):
+            break
+    return transaction_history
+
+
+def _run_scheduled(ticks,
+                   trade_schedule,
+                   trade_algorithm,
+                   context,
+                   trader,
+                   feature_manager,
+                   metric_manager,
+                   should_stop=None):
+    """Run algorithm only on event days of `trade_schedule`.
+
+    Metrics of days between events are filled by mark-to-market of the
+    owned stocks, which do not change until the next event.
+    """
+    event_masks = trade_schedule.event_masks(ticks, feature_manager)
+    static_events = np.zeros(len(ticks), dtype=bool)
+    for mask in event_masks.values():
+        static_events |= mask
+    static_positions = np.flatnonzero(static_events)
+
+    transaction_history = []
+    position = 0
+    with tqdm.tqdm(total=len(ticks)) as progress:
+        while position < len(ticks):
+            i = np.searchsorted(static_positions, position)
+            next_static = (static_positions[i]
+                           if i < len(static_positions) else len(ticks))
+            dynamic_offset, dynamic_name = trade_schedule.first_dynamic_event(
+                ticks[position:next_static], context.portfolio,
+                feature_manager)
+            event = (next_static if dynamic_offset is None else position +
+                     dynamic_offset)
+
+            metric_manager.update_metric_by_mark_to_market(
+                ticks[position:event], context)
+            progress.update(event - position)
+            if event >= len(ticks):
+                break
+
+            triggers = {
+                name for name, mask in event_masks.items() if mask[event]
+            }
+            if dynamic_name is not None:
+                triggers.add(dynamic_name)
+            context.update_triggers(triggers)
+            context.update_market_time(ticks[event])
+            trader.set_user_and_stock_data(context, None)
+            transaction_history += algorithm_handler(trade_algorithm, context,
+                                                     trader, feature_manager)
+            metric_manager.update_metric_by_context(context)
+            progress.update(1)
+            position = event + 1
+            if should_stop and should_stop(position / len(ticks),
+                                           metric_manager):
+                break
+    return transaction_history
+
+
+def run_back_test(start_date,
+                  end_date,
+                  trade_algorithm,
+                  budget,
+                  feature_manager,
+                  should_stop=None) -> MetricManager:
+    """Run back test and returns its metrics.
+
+    Transactions of the back test are in `transactions` of the metrics.
+
+    Args:
+        start_date: datetime to start.
+        end_date: datetime to end.
+        trade_algorithm: algorithm to test.
+        budget: initial budget.
+        feature_manager: feature manager which can be shared among back tests
+            to reuse its cache.
+        should_stop: (Optional) callable with progress ratio and metric
+            manager. Back test stops early if it returns True.
+    """
+    context = algorithm.Context(budget=budget)
+    metric_manager = MetricManager(budget=budget,
+                                   feature_manager=feature_manager)
+    trader = trading_manager.get_trading_manager(
+        'back_test', {'feature_manager': feature_manager})
+
+    ticks = _get_ticks(start_date, end_date, feature_manager)
+    trade_schedule = trade_algorithm.schedule()
+    if trade_schedule is None:
+        transactions = _run_every_tick(ticks, trade_algorithm, context,
+                                       trader, feature_manager, metric_manager,
+                                       should_stop)
+    else:
+        transactions = _run_scheduled(pd.DatetimeIndex(ticks), trade_schedule,
+                                      trade_algorithm, context, trader,
+                                      feature_manager, metric_manager,
+                                      should_stop)
+    metric_manager.transactions = transactions
+    return metric_manager
+
+
+def simulate(start_date,
+             end_date,
+             trade_algorithm,
+             budget,
+             index: listing_index.ListingIndex = None):
+    print(f'Simulation date range: {start_date} ~ {end_date}')
+    start_date = _parse_datetime(start_date)
+    end_date = _parse_datetime(end_date)
+
+    feature_manager = feature_manager_helper.FinanceDataReaderManager(
+        'KRX',
+        cache_start_date=start_date,
+        cache_end_date=end_date,
+        listing_index=index)
+    metric_manager = run_back_test(start_date, end_date, trade_algorithm,
+                                   budget, feature_manager)
     metric_manager.report()
     metric_manager.plot_profit_rate(comparisons=['KOSPI', 'KOSDAQ'])
 
@@ -233,8 +354,15 @@ def simulate(start_date, end_date, trade_algorithm, budget):
 def main(args):
     del args  # Unused
 
+    # Set here rather than at import, as the backend exists only on macOS and
+    # hparam_search imports this module.
+    matplotlib.use('macosx')
+    index = None
+    if FLAGS.listing_index:
+        index = listing_index.ListingIndex.load_or_build(FLAGS.listing_index)
     trade_algorithm = algorithm.Algorithm.algorithms[FLAGS.algorithm]
-    simulate(FLAGS.start_date, FLAGS.end_date, trade_algorithm(), FLAGS.budget)
+    simulate(FLAGS.start_date, FLAGS.end_date, trade_algorithm(), FLAGS.budget,
+             index)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,134 @@
+"""Annual fundamentals index of KRX companies
+
+NumPy equivalent of `modeling/company_table` for back tests and the
+trader, which should not pay for importing TensorFlow. Rows are sorted by
+'code@year' keys, and many keys are looked up at once with
+`np.searchsorted`.
+"""
+
+import os
+import sys
+from typing import Optional, Tuple
+
+from absl import logging
+import numpy as np
+import pandas as pd
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'))
+import company_schema  # pylint: disable=wrong-import-position
+
+# Columns of looked up values in order, same as `modeling/company_table`.
+NUMERIC_COLUMNS = company_schema.NUMERIC_COLUMNS
+
+
+def make_keys(codes, years) -> np.ndarray:
+    """Returns 'code@year' keys of `codes` and `years` broadcast."""
+    codes = np.asarray(codes, dtype=str)
+    years = np.asarray(years).astype(str)
+    return np.char.add(np.char.add(codes, '@'), years)
+
+
+class CompanyIndex:
+    """Index to look up annual fundamentals by code and year."""
+
+    def __init__(self, keys, corp_names, values):
+        keys = np.asarray(keys, dtype=str)
+        order = np.argsort(keys, kind='stable')
+        self._keys = keys[order]
+        self._corp_names = np.asarray(corp_names, dtype=str)[order]
+        self._values = np.asarray(values, dtype=np.float32)[order]
+
+    def __len__(self):
+        return len(self._keys)
+
+    @classmethod
+    def from_tsv(cls, path: str) -> 'CompanyIndex':
+        """Build index from company data TSV of `convert_company_data.py`."""
+        df_company = company_schema.read_company_data(path)
+        keys = df_company['code'] + '@' + df_company['year']
+        # Keep the last row of duplicated keys.
+        df_company = df_company[~keys.duplicated(keep='last')]
+        return cls(keys[df_company.index].values,
+                   df_company['corp_name'].values,
+                   df_company[list(NUMERIC_COLUMNS)].values)
+
+    @classmethod
+    def load(cls, path: str) -> 'CompanyIndex':
+        with np.load(path) as data:
+            return cls(data['keys'], data['corp_names'], data['values'])
+
+    @classmethod
+    def load_or_build(cls, path: str, tsv_path: str) -> 'CompanyIndex':
+        """Load index cached at `path` or build from `tsv_path` and cache it.
+
+        The cache is rebuilt if it is older than `tsv_path`.
+        """
+        try:
+            if os.path.getmtime(path) >= os.path.getmtime(tsv_path):
+                return cls.load(path)
+        except FileNotFoundError:
+            pass
+        logging.info(f'Building company index to {path}')
+        index = cls.from_tsv(tsv_path)
+        index.save(path)
+        return index
+
+    def save(self, path: str):
+        # Pass file object not to let numpy append '.npz' to the path.
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     keys=self._keys,
+                     corp_names=self._corp_names,
+                     values=self._values)
+
+    def _rows(self, codes, years) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns rows of keys, and whether each key is found."""
+        keys = np.asarray(make_keys(codes, years))
+        rows = np.asarray(np.searchsorted(self._keys, keys))
+        found = np.asarray(rows < len(self._keys))
+        found[found] = self._keys[rows[found]] == keys[found]
+        return rows, found
+
+    def lookup(self,
+               codes,
+               years,
+               default_value: float = np.nan) -> Tuple[np.ndarray, np.ndarray]:
+        """Returns values of `codes` and `years`, and whether each is found.
+
+        Values are [..., len(NUMERIC_COLUMNS)] float32 in order of
+        `NUMERIC_COLUMNS`, and `default_value` for missing keys.
+        """
+        rows, found = self._rows(codes, years)
+        values = np.full(found.shape + (len(NUMERIC_COLUMNS),),
+                         default_value,
+                         dtype=np.float32)
+        values[found] = self._values[rows[found]]
+        return values, found
+
+    def lookup_names(self, codes, years) -> np.ndarray:
+        """Returns corp_name of `codes` and `years`, or '' if missing."""
+        rows, found = self._rows(codes, years)
+        names = np.full(found.shape, '', dtype=self._corp_names.dtype)
+        names[found] = self._corp_names[rows[found]]
+        return names
+
+    def code_frame(self,
+                   code: str,
+                   start: Optional[int] = None,
+                   end: Optional[int] = None) -> pd.DataFrame:
+        """Returns rows of `code` in years `[start, end]` indexed by year."""
+        # Keys of a code are contiguous in ['code@', 'codeA'), as 'A' (0x41)
+        # follows '@' (0x40).
+        first = np.searchsorted(self._keys,
+                                f'{code}@{start}' if start else f'{code}@')
+        last = np.searchsorted(self._keys,
+                               f'{code}@{end}' if end else f'{code}A',
+                               side='right')
+        years = [int(key.partition('@')[2]) for key in self._keys[first:last]]
+        df = pd.DataFrame(self._values[first:last],
+                          index=pd.Index(years, dtype=int, name='year'),
+                          columns=NUMERIC_COLUMNS)
+        df.insert(0, 'code', code)
+        df.insert(1, 'corp_name', self._corp_names[first:last])
+        return df
@@ -0,0 +1,13 @@
+"""pytest configuration of the repository.
+
+Modules import each other flat from the repository root, and tests import
+`algorithm` as a namespace package. pytest prepends directories of test
+files to sys.path, on which `algorithm` would resolve to
+algorithm/algorithm.py, so the package is imported here first.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import algorithm  # pylint: disable=unused-import,wrong-import-position
@@ -0,0 +1,232 @@
+"""asyncio (grpc.aio) variant of Cybos wrapper service.
+
+RPCs are served on one event loop, and only the blocking Cybos calls are
+handed off to executors. Orders and candle queries have separate
+executors, so slow orders never hold the threads of candle queries.
+Realtime subscribers are served by coroutines without a thread for each.
+
+Example usage:
+
+    python async_service.py --port 11231 --candle_workers 8 --order_workers 2
+"""
+
+import asyncio
+from concurrent import futures
+import threading
+import time
+
+from absl import app
+from absl import flags
+from absl import logging
+from google.protobuf import text_format
+import grpc
+
+import cybos_wrapper_service
+from cybos_wrapper_service import CybosException
+import deep_trader_pb2_grpc
+import market_feed
+import request_scheduler
+import rpc_metrics
+
+flags.DEFINE_integer('candle_workers', 8,
+                     'Number of threads for blocking candle queries.')
+flags.DEFINE_integer('order_workers', 2,
+                     'Number of threads for blocking orders.')
+
+FLAGS = flags.FLAGS
+
+# Max number of pages of candle history buffered ahead of the client.
+_HISTORY_BUFFER_PAGES = 2
+
+
+class AsyncCybos5WrapperService(deep_trader_pb2_grpc.DeepTraderServicer):
+    """Async servicer running blocking calls of `service` in executors.
+
+    Args:
+        service: synchronous servicer which does the blocking Cybos calls.
+        candle_workers: number of threads for candle queries.
+        order_workers: number of threads for orders.
+    """
+
+    def __init__(self,
+                 service: cybos_wrapper_service.Cybos5WrapperService,
+                 candle_workers: int = 8,
+                 order_workers: int = 2):
+        self._service = service
+        self._candle_executor = futures.ThreadPoolExecutor(
+            candle_workers, thread_name_prefix='candle')
+        self._order_executor = futures.ThreadPoolExecutor(
+            order_workers, thread_name_prefix='order')
+        self._executor_names = {
+            self._candle_executor: 'candle',
+            self._order_executor: 'order',
+        }
+
+    def shutdown(self):
+        self._candle_executor.shutdown(wait=True)
+        self._order_executor.shutdown(wait=True)
+
+    @property
+    def metrics(self) -> rpc_metrics.RpcMetrics:
+        return self._service.metrics
+
+    def _timed(self, executor, func, *args):
+        # Records time waiting for a thread of `executor`.
+        submitted = time.perf_counter()
+
+        def _call():
+            self.metrics.observe_stage(
+                f'executor_wait.{self._executor_names[executor]}',
+                time.perf_counter() - submitted)
+            return func(*args)
+
+        return _call
+
+    async def _run(self, executor, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor,
+                                          self._timed(executor, func, *args))
+
+    async def GetCandle(self, request, context):
+        logging.debug('GetCandle: %s',
+                      text_format.MessageToString(request, as_utf8=True))
+        try:
+            return await self._run(self._candle_executor,
+                                   self._service.get_candle, request)
+        except CybosException as ex:
+            await context.abort(ex.status, str(ex))
+
+    async def GetCandles(self, request, context):
+        logging.info('GetCandles: %d requests', len(request.requests))
+        for candle_request in request.requests:
+            # Failed codes are reported not to lose the others.
+            try:
+                yield await self._run(self._candle_executor,
+                                      self._service.get_candle,
+                                      candle_request,
+                                      request_scheduler.BULK_CANDLE)
+            except CybosException as ex:
+                logging.warning('GetCandles failed on %s: %s',
+                                candle_request.code, ex)
+                yield cybos_wrapper_service.candle_error_response(
+                    candle_request.code, ex)
+
+    def _pull_history(self, request, loop, pages: asyncio.Queue,
+                      cancelled: threading.Event):
+        # Iterates pages on one thread, as its Cybos session is bound to it.
+        def _put(item):
+            asyncio.run_coroutine_threadsafe(pages.put(item), loop).result()
+
+        try:
+            for response in self._service.iter_candle_history(request):
+                if cancelled.is_set():
+                    return
+                _put(response)
+        except Exception as ex:  # pylint: disable=broad-except
+            _put(ex)
+            return
+        _put(None)
+
+    async def GetCandleHistory(self, request, context):
+        logging.info('GetCandleHistory: %s',
+                     text_format.MessageToString(request, as_utf8=True))
+        loop = asyncio.get_running_loop()
+        pages = asyncio.Queue(maxsize=_HISTORY_BUFFER_PAGES)
+        cancelled = threading.Event()
+        pulling = loop.run_in_executor(
+            self._candle_executor,
+            self._timed(self._candle_executor, self._pull_history, request,
+                        loop, pages, cancelled))
+        try:
+            while True:
+                page = await pages.get()
+                if page is None:
+                    break
+                if isinstance(page, CybosException):
+                    await context.abort(page.status, str(page))
+                if isinstance(page, Exception):
+                    raise page
+                yield page
+        finally:
+            # Stop the puller if the client went away.
+            cancelled.set()
+            while not pulling.done():
+                while not pages.empty():
+                    pages.get_nowait()
+                await asyncio.sleep(0.01)
+
+    async def SubmitOrder(self, request, context):
+        logging.info('SubmitOrder: %s',
+                     text_format.MessageToString(request, as_utf8=True))
+        try:
+            return await self._run(self._order_executor,
+                                   self._service.submit_order, request)
+        except CybosException as ex:
+            await context.abort(ex.status, str(ex))
+
+    async def Subscribe(self, request, context):
+        logging.info('Subscribe: %s', list(request.codes))
+        hub = self._service.hub
+        if hub is None:
+            await context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                                'Realtime feed is not enabled.')
+        if not request.codes:
+            await context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                                'No code to subscribe.')
+        subscription = hub.subscribe_async(request.codes)
+        try:
+            async for event in subscription:
+                yield event
+        finally:
+            hub.unsubscribe(subscription)
+        if subscription.overflowed:
+            await context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                'Subscriber is too slow to receive events.')
+
+
+async def serve(servicer, port: int, metrics: rpc_metrics.RpcMetrics = None):
+    """Starts an async server of `servicer` and returns (server, port).
+
+    RPCs are recorded to `metrics` if given.
+    """
+    interceptors = []
+    if metrics is not None:
+        interceptors.append(rpc_metrics.AsyncMetricsServerInterceptor(metrics))
+    server = grpc.aio.server(interceptors=tuple(interceptors))
+    deep_trader_pb2_grpc.add_DeepTraderServicer_to_server(servicer, server)
+    port = server.add_insecure_port(f'[::]:{port}')
+    await server.start()
+    return server, port
+
+
+async def _serve_forever(servicer):
+    server, port = await serve(servicer, FLAGS.port, servicer.metrics)
+    logging.info('Async Cybos5 wrapping server has started on port %d', port)
+    await server.wait_for_termination()
+
+
+def main(unused_args):
+    scheduler = cybos_wrapper_service.request_scheduler_from_flags()
+    hub = market_feed.FeedHub(market_feed.CybosFeed(), FLAGS.feed_bar_minutes,
+                              FLAGS.subscriber_queue_size)
+    hub.start()
+    service = cybos_wrapper_service.Cybos5WrapperService(
+        cybos_wrapper_service.Win32ComBackend(), scheduler,
+        FLAGS.liveness_ttl, FLAGS.reuse_cybos_sessions,
+        cybos_wrapper_service.candle_cache_from_flags(), FLAGS.max_quota_wait,
+        hub)
+    servicer = AsyncCybos5WrapperService(service, FLAGS.candle_workers,
+                                         FLAGS.order_workers)
+    cybos_wrapper_service.log_metrics_periodically(scheduler,
+                                                   FLAGS.metrics_log_interval,
+                                                   service.metrics)
+    cybos_wrapper_service.serve_metrics_from_flags(scheduler, service.metrics)
+    try:
+        asyncio.run(_serve_forever(servicer))
+    finally:
+        hub.stop()
+        servicer.shutdown()
+
+
+if __name__ == '__main__':
+    app.run(main)
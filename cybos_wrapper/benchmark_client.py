@@ -0,0 +1,156 @@
+"""Benchmark of Cybos wrapper client against the fake backend.
+
+Compares the following ways to get candles of many codes:
+
+- fresh channel per blocking call, as `sample_cli.py` does.
+- pooled `CybosClient` issuing concurrent calls over one channel.
+- one batched `GetCandles` streaming call.
+- polling the same codes `--poll_rounds` times as new candles close, which
+  is served by the candle cache of the service.
+
+Each of them runs against the service creating Cybos sessions per request
+and the service reusing sessions of worker threads. The service runs
+in-process with `fake_cybos.FakeComBackend`, applying `--latency_ms`,
+`--dispatch_latency_ms`, `--failure_rate`, `--candle_cache_*` and the quota
+flags, e.g. `--query_limit`.
+
+Example usage:
+
+    python benchmark_client.py --num_calls 200 --latency_ms 20 \
+        --failure_rate 0.05 --query_limit 100000 --query_burst 1000
+"""
+
+import time
+
+from absl import app
+from absl import flags
+import grpc
+import numpy as np
+
+import cybos_client
+import cybos_wrapper_service
+import deep_trader_pb2
+import deep_trader_pb2_grpc
+import fake_cybos
+
+flags.DEFINE_integer('num_calls', 200, 'Number of GetCandle calls.')
+flags.DEFINE_integer('count', 720, 'Number of candles for each call.')
+flags.DEFINE_integer('poll_rounds', 3, 'Number of rounds to poll candles.')
+
+FLAGS = flags.FLAGS
+
+
+def _report(name, latencies, elapsed):
+    latencies_ms = np.array(latencies) * 1000
+    print(f'{name}: {len(latencies) / elapsed:.1f} calls/s, '
+          f'p50 {np.percentile(latencies_ms, 50):.1f}ms, '
+          f'p95 {np.percentile(latencies_ms, 95):.1f}ms')
+
+
+def _bench_fresh_channel(address, codes):
+    latencies = []
+    failures = 0
+    started = time.monotonic()
+    for code in codes:
+        call_started = time.monotonic()
+        with grpc.insecure_channel(address) as channel:
+            stub = deep_trader_pb2_grpc.DeepTraderStub(channel)
+            try:
+                stub.GetCandle(
+                    deep_trader_pb2.GetCandleRequest(code=code,
+                                                     cycle_type='m',
+                                                     cycle=5,
+                                                     count=FLAGS.count))
+            except grpc.RpcError:
+                failures += 1
+        latencies.append(time.monotonic() - call_started)
+    _report(f'fresh channel ({failures} failed)', latencies,
+            time.monotonic() - started)
+
+
+def _bench_pooled_client(address, codes):
+    latencies = []
+    with cybos_client.CybosClient(address) as client:
+        started = time.monotonic()
+        calls = []
+        for code in codes:
+            call_started = time.monotonic()
+            call = client.get_candle_future(code, 'm', 5, FLAGS.count)
+            call.add_done_callback(lambda _, s=call_started: latencies.append(
+                time.monotonic() - s))
+            calls.append(call)
+        for call in calls:
+            call.result()
+        elapsed = time.monotonic() - started
+    _report('pooled client (retried)', latencies, elapsed)
+
+
+def _bench_batched_stream(address, codes):
+    latencies = []
+    with cybos_client.CybosClient(address) as client:
+        started = time.monotonic()
+        try:
+            for _ in client.stream_candles([(code, 'm', 5, FLAGS.count)
+                                            for code in codes]):
+                latencies.append(time.monotonic() - started)
+        except grpc.RpcError as ex:
+            print(f'batched stream is aborted: {ex.code().name}')
+            return
+        elapsed = time.monotonic() - started
+    # Latency of a batched response is the time to its arrival.
+    _report('batched stream', latencies, elapsed)
+
+
+def _bench_polling(address, codes, com):
+    requests_before = com.request_count
+    candles_before = com.fetched_candles
+    latencies = []
+    with cybos_client.CybosClient(address) as client:
+        started = time.monotonic()
+        for _ in range(FLAGS.poll_rounds):
+            com.advance()
+            round_started = time.monotonic()
+            client.get_candles(codes, 'm', 5, FLAGS.count)
+            latencies.append(time.monotonic() - round_started)
+        elapsed = time.monotonic() - started
+    latencies_ms = np.array(latencies) * 1000
+    print(f'polling: {FLAGS.poll_rounds / elapsed:.1f} rounds/s, '
+          f'p50 {np.percentile(latencies_ms, 50):.1f}ms per round, '
+          f'{com.request_count - requests_before} Cybos requests and '
+          f'{com.fetched_candles - candles_before} candles fetched for '
+          f'{FLAGS.poll_rounds * len(codes)} calls')
+
+
+def main(unused_args):
+    codes = [f'A{i:06d}' for i in range(FLAGS.num_calls)]
+    for reuse_sessions in [False, True]:
+        com = fake_cybos.FakeComBackend(FLAGS.dispatch_latency_ms / 1000,
+                                        FLAGS.latency_ms / 1000,
+                                        FLAGS.failure_rate)
+        scheduler = cybos_wrapper_service.request_scheduler_from_flags()
+        servicer = cybos_wrapper_service.Cybos5WrapperService(
+            com,
+            scheduler,
+            FLAGS.liveness_ttl,
+            reuse_sessions=reuse_sessions,
+            cache=cybos_wrapper_service.candle_cache_from_flags(),
+            max_quota_wait=FLAGS.max_quota_wait)
+        server, port = cybos_wrapper_service.serve(servicer,
+                                                   0,
+                                                   max_workers=16)
+        address = f'localhost:{port}'
+        print(f'--- reuse_sessions={reuse_sessions} ---')
+        try:
+            _bench_fresh_channel(address, codes)
+            _bench_pooled_client(address, codes)
+            _bench_batched_stream(address, codes)
+            _bench_polling(address, codes, com)
+        finally:
+            server.stop(None)
+        print(f'{com.initialize_count} COM initializations, '
+              f'{com.dispatch_count} dispatches')
+        print(f'Scheduler metrics: {scheduler.metrics()}')
+
+
+if __name__ == '__main__':
+    app.run(main)
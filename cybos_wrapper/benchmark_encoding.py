@@ -0,0 +1,97 @@
+"""Benchmark of candle encodings of `GetCandleResponse`.
+
+Compares `candle_data` messages, `packed_candle_data` and delta encoded
+`packed_candle_data` for responses of `--counts` candles:
+
+- encode: build a response from candle tuples and serialize it.
+- decode: parse a response and decode it into NumPy arrays.
+- rpc: GetCandle calls to an in-process service with warm candle cache.
+
+Example usage:
+
+    python benchmark_encoding.py --counts 3000,10000 --repeats 50
+"""
+
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+
+import candle_cache
+import candle_encoding
+import cybos_client
+import cybos_wrapper_service
+import deep_trader_pb2
+import fake_cybos
+
+flags.DEFINE_list('counts', ['3000', '10000'], 'Number of candles.')
+flags.DEFINE_integer('repeats', 50, 'Number of repeats of each case.')
+
+FLAGS = flags.FLAGS
+
+_ENCODINGS = {
+    'message': {},
+    'packed': {
+        'packed': True
+    },
+    'packed+delta': {
+        'packed': True,
+        'delta_encoded': True
+    },
+}
+
+
+def _measure(func):
+    started = time.perf_counter()
+    for _ in range(FLAGS.repeats):
+        func()
+    return (time.perf_counter() - started) / FLAGS.repeats * 1000
+
+
+def _bench_offline(count, encoding):
+    candles = fake_cybos.fake_candles('A005930', count)[::-1]
+    build = lambda: deep_trader_pb2.GetCandleResponse(
+        **candle_encoding.encode_candles(candles, **encoding))
+    data = build().SerializeToString()
+    encode_ms = _measure(lambda: build().SerializeToString())
+    decode_ms = _measure(lambda: candle_encoding.decode_candles(
+        deep_trader_pb2.GetCandleResponse.FromString(data)))
+    return len(data), encode_ms, decode_ms
+
+
+def _bench_rpc(client, count, encoding):
+    request = lambda: candle_encoding.decode_candles(
+        client.get_candle('A005930', 'm', 5, count, **encoding))
+    request()  # Warm up the candle cache.
+    return _measure(request)
+
+
+def main(unused_args):
+    counts = [int(count) for count in FLAGS.counts]
+    servicer = cybos_wrapper_service.Cybos5WrapperService(
+        fake_cybos.FakeComBackend(0, 0, num_candles=max(counts)),
+        cache=candle_cache.CandleCache(ttl=3600, max_candles=max(counts)))
+    server, port = cybos_wrapper_service.serve(servicer, 0)
+
+    with cybos_client.CybosClient(f'localhost:{port}') as client:
+        for count in counts:
+            reference = None
+            for name, encoding in _ENCODINGS.items():
+                size, encode_ms, decode_ms = _bench_offline(count, encoding)
+                rpc_ms = _bench_rpc(client, count, encoding)
+                decoded = candle_encoding.decode_candles(
+                    client.get_candle('A005930', 'm', 5, count, **encoding))
+                if reference is None:
+                    reference = decoded
+                assert all(
+                    np.array_equal(decoded[column], reference[column])
+                    for column in candle_encoding.COLUMNS)
+                print(f'{count} candles, {name}: {size / 1024:.1f}KiB, '
+                      f'encode {encode_ms:.2f}ms, decode {decode_ms:.2f}ms, '
+                      f'rpc {rpc_ms:.2f}ms')
+    server.stop(None)
+
+
+if __name__ == '__main__':
+    app.run(main)
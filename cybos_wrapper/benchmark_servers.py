@@ -0,0 +1,204 @@
+"""Benchmark of Cybos wrapper servers against the fake Cybos.
+
+Runs the synchronous or the asyncio server in process with
+`fake_cybos.FakeComBackend` and `fake_cybos.ReplayFeed`, and drives it
+with concurrent candle queries, slow orders and realtime subscribers for
+`--duration` seconds. Reports latency percentiles and throughput of each
+kind of call, so that both servers can be compared under the same load.
+
+Example usage:
+
+    python benchmark_servers.py --server aio --candle_clients 32 \
+        --order_clients 4 --subscribers 8 --order_latency_ms 200
+"""
+
+import asyncio
+import random
+import time
+
+from absl import app
+from absl import flags
+import grpc
+import numpy as np
+
+import async_service
+import candle_cache
+import cybos_client
+import cybos_wrapper_service
+import fake_cybos
+import market_feed
+
+flags.DEFINE_enum('server', 'aio', ['sync', 'aio'], 'Server to load.')
+flags.DEFINE_float('duration', 10., 'Seconds to put load on the server.')
+flags.DEFINE_integer('candle_clients', 32,
+                     'Number of clients querying candles in a loop.')
+flags.DEFINE_integer('order_clients', 4,
+                     'Number of clients submitting orders in a loop.')
+flags.DEFINE_integer('subscribers', 8,
+                     'Number of clients subscribing realtime events.')
+flags.DEFINE_integer('load_codes', 20, 'Number of codes to query.')
+flags.DEFINE_integer('candle_count', 500, 'Number of candles of each query.')
+flags.DEFINE_float('order_latency_ms', 200.,
+                   'Simulated extra latency of each order.')
+
+FLAGS = flags.FLAGS
+
+
+async def _start_server(service):
+    """Starts the server of `--server` and returns (stop function, port).
+
+    The async server runs on the event loop of the load.
+    """
+    if FLAGS.server == 'sync':
+        server, port = cybos_wrapper_service.serve(service, 0,
+                                                   FLAGS.max_workers,
+                                                   service.metrics)
+
+        async def _stop():
+            server.stop(None)
+
+        return _stop, port
+
+    servicer = async_service.AsyncCybos5WrapperService(
+        service, FLAGS.candle_workers, FLAGS.order_workers)
+    server, port = await async_service.serve(servicer, 0, service.metrics)
+
+    async def _stop():
+        await server.stop(None)
+        servicer.shutdown()
+
+    return _stop, port
+
+
+class _Stats:
+    def __init__(self):
+        self.latencies_ms = []
+        self.errors = {}
+
+    def time(self, started: float):
+        self.latencies_ms.append((time.perf_counter() - started) * 1000)
+
+    def fail(self, ex: grpc.aio.AioRpcError):
+        name = ex.code().name
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def summary(self, elapsed: float) -> str:
+        errors = ''
+        if self.errors:
+            errors = f', errors {self.errors}'
+        if not self.latencies_ms:
+            return f'no call succeeded{errors}'
+        latencies_ms = np.array(self.latencies_ms)
+        p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+        return (f'{len(latencies_ms)} calls, '
+                f'{len(latencies_ms) / elapsed:.1f}/s, p50 {p50:.1f}ms, '
+                f'p95 {p95:.1f}ms, p99 {p99:.1f}ms{errors}')
+
+
+async def _query_candles(client, codes, deadline, stats):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            await client.get_candle(random.choice(codes), 'm', 5,
+                                    FLAGS.candle_count)
+        except grpc.aio.AioRpcError as ex:
+            stats.fail(ex)
+            continue
+        stats.time(started)
+
+
+async def _submit_orders(client, codes, deadline, stats):
+    while time.monotonic() < deadline:
+        started = time.perf_counter()
+        try:
+            await client.submit_order(random.choice(codes),
+                                      random.choice('LS'), 1, 1000)
+        except grpc.aio.AioRpcError as ex:
+            stats.fail(ex)
+            continue
+        stats.time(started)
+
+
+async def _subscribe(client, codes, deadline, stats):
+    call = client.subscribe(codes)
+    try:
+        while time.monotonic() < deadline:
+            try:
+                event = await asyncio.wait_for(
+                    call.read(), deadline - time.monotonic())
+            except asyncio.TimeoutError:
+                break
+            if event is grpc.aio.EOF:
+                break
+            stats.latencies_ms.append(
+                (market_feed.now_us() - event.timestamp_us) / 1000)
+    except grpc.aio.AioRpcError as ex:
+        stats.fail(ex)
+    finally:
+        call.cancel()
+
+
+async def _run_load(service, codes):
+    candle_stats, order_stats, event_stats = _Stats(), _Stats(), _Stats()
+    stop, port = await _start_server(service)
+    try:
+        async with cybos_client.AsyncCybosClient(
+                f'localhost:{port}') as client:
+            deadline = time.monotonic() + FLAGS.duration
+            started = time.monotonic()
+            await asyncio.gather(
+                *[
+                    _query_candles(client, codes, deadline, candle_stats)
+                    for _ in range(FLAGS.candle_clients)
+                ], *[
+                    _submit_orders(client, codes, deadline, order_stats)
+                    for _ in range(FLAGS.order_clients)
+                ], *[
+                    _subscribe(client, codes, deadline, event_stats)
+                    for _ in range(FLAGS.subscribers)
+                ])
+            elapsed = time.monotonic() - started
+            print(f'client metrics:\n{client.metrics.summary()}')
+    finally:
+        await stop()
+    return elapsed, candle_stats, order_stats, event_stats
+
+
+def main(unused_args):
+    # Orders go to the fake Cybos only.
+    FLAGS.block_submit_order = False
+    codes = [f'A{i:06d}' for i in range(FLAGS.load_codes)]
+    com = fake_cybos.FakeComBackend(FLAGS.dispatch_latency_ms / 1000,
+                                    FLAGS.latency_ms / 1000,
+                                    FLAGS.failure_rate,
+                                    order_latency=FLAGS.order_latency_ms /
+                                    1000)
+    # 100 ticks per second at replay speed 1.
+    feed = fake_cybos.ReplayFeed(fake_cybos.synthetic_ticks(codes,
+                                                            10_000,
+                                                            interval_us=10_000),
+                                 FLAGS.replay_speed,
+                                 loop=True)
+    hub = market_feed.FeedHub(feed, FLAGS.feed_bar_minutes,
+                              FLAGS.subscriber_queue_size)
+    hub.start()
+    feed.play()
+    service = cybos_wrapper_service.Cybos5WrapperService(
+        com,
+        cache=candle_cache.CandleCache(ttl=1., max_candles=FLAGS.candle_count),
+        hub=hub)
+    try:
+        elapsed, candle_stats, order_stats, event_stats = asyncio.run(
+            _run_load(service, codes))
+    finally:
+        hub.stop()
+
+    print(f'{FLAGS.server} server, {elapsed:.1f}s')
+    print(f'candles: {candle_stats.summary(elapsed)}')
+    print(f'orders: {order_stats.summary(elapsed)}')
+    print(f'events: {event_stats.summary(elapsed)}')
+    print(f'server metrics:\n{service.metrics.summary()}')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,112 @@
+"""Benchmark of realtime event subscription against the fake feed.
+
+Replays ticks through `fake_cybos.ReplayFeed` to subscribers connected to
+an in-process service, and measures throughput of each subscriber and
+end-to-end latency from publishing an event to receiving it.
+
+Example usage:
+
+    python benchmark_subscribe.py --num_subscribers 8 --num_codes 50 \
+        --num_ticks 100000 --replay_speed 0
+"""
+
+import threading
+import time
+
+from absl import app
+from absl import flags
+import grpc
+import numpy as np
+
+import cybos_client
+import cybos_wrapper_service
+import fake_cybos
+import market_feed
+
+flags.DEFINE_integer('num_subscribers', 8, 'Number of subscribers.')
+flags.DEFINE_integer('num_codes', 50, 'Number of codes to subscribe.')
+flags.DEFINE_integer('num_ticks', 100_000,
+                     'Number of synthetic ticks if no --ticks_file.')
+
+FLAGS = flags.FLAGS
+
+
+class _Subscriber:
+    def __init__(self, address, codes):
+        self._client = cybos_client.CybosClient(address)
+        self._call = self._client.subscribe(codes)
+        self.latencies_us = []
+        self.bars = 0
+        self.error = None
+        self._thread = threading.Thread(target=self._receive)
+        self._thread.start()
+
+    def _receive(self):
+        try:
+            for event in self._call:
+                self.latencies_us.append(market_feed.now_us() -
+                                         event.timestamp_us)
+                if event.HasField('bar'):
+                    self.bars += 1
+        except Exception as ex:  # pylint: disable=broad-except
+            self.error = ex
+
+    def stop(self):
+        self._call.cancel()
+        self._thread.join()
+        self._client.close()
+
+
+def main(unused_args):
+    codes = [f'A{i:06d}' for i in range(FLAGS.num_codes)]
+    if FLAGS.ticks_file:
+        ticks = fake_cybos.load_ticks(FLAGS.ticks_file)
+        codes = sorted({tick[1] for tick in ticks})
+    else:
+        ticks = fake_cybos.synthetic_ticks(codes, FLAGS.num_ticks)
+    feed = fake_cybos.ReplayFeed(ticks, FLAGS.replay_speed)
+    hub = market_feed.FeedHub(feed, FLAGS.feed_bar_minutes,
+                              FLAGS.subscriber_queue_size)
+    hub.start()
+    servicer = cybos_wrapper_service.Cybos5WrapperService(
+        fake_cybos.FakeComBackend(), hub=hub)
+    server, port = cybos_wrapper_service.serve(
+        servicer, 0, max_workers=FLAGS.num_subscribers + 4)
+
+    subscribers = [
+        _Subscriber(f'localhost:{port}', codes)
+        for _ in range(FLAGS.num_subscribers)
+    ]
+    while len(feed.codes) < len(codes):
+        time.sleep(0.01)
+
+    started = time.monotonic()
+    feed.play()
+    feed.done.wait()
+    # Let subscribers drain events in flight.
+    time.sleep(1)
+    elapsed = time.monotonic() - started
+    for subscriber in subscribers:
+        subscriber.stop()
+    hub.stop()
+    server.stop(None)
+
+    print(f'Published {feed.published} events in {elapsed:.2f}s')
+    for i, subscriber in enumerate(subscribers):
+        latencies_ms = np.array(subscriber.latencies_us) / 1000
+        dropped = ''
+        if (isinstance(subscriber.error, grpc.RpcError) and
+                subscriber.error.code() != grpc.StatusCode.CANCELLED):
+            dropped = f' (dropped: {subscriber.error.code().name})'
+        if not len(latencies_ms):
+            print(f'subscriber {i}: no event{dropped}')
+            continue
+        print(f'subscriber {i}: {len(latencies_ms)} events, '
+              f'{subscriber.bars} bars, '
+              f'{len(latencies_ms) / elapsed:.0f} events/s, '
+              f'p50 {np.percentile(latencies_ms, 50):.2f}ms, '
+              f'p99 {np.percentile(latencies_ms, 99):.2f}ms{dropped}')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,122 @@
+"""In-memory cache of Cybos candles.
+
+Past candles never change, so the cache keeps candles of each (code,
+cycle_type, cycle) and only fetches candles since the date of the last
+cached one on refresh. The last cached candles may be still in progress
+and are replaced by the refreshed ones.
+"""
+
+import bisect
+import collections
+import threading
+import time
+from typing import Callable, List, Tuple
+
+# (date, time, open, high, low, close, volume)
+Candle = Tuple[int, int, int, int, int, int, int]
+# (code, cycle_type, cycle)
+CandleKey = Tuple[str, str, int]
+
+
+class _Entry:
+    __slots__ = ('name', 'candles', 'complete', 'refreshed_at', 'lock')
+
+    def __init__(self):
+        self.name = None
+        # Candles in ascending order of (date, time).
+        self.candles = None
+        # Whether `candles` has the whole history of the code.
+        self.complete = False
+        self.refreshed_at = 0.
+        self.lock = threading.Lock()
+
+
+class CandleCache:
+    """LRU cache of candles with incremental refresh.
+
+    Args:
+        ttl: seconds to serve cached candles without refresh.
+        max_entries: max number of (code, cycle_type, cycle) to cache. 0
+            disables the cache.
+        max_candles: max number of candles to cache for each entry. Longer
+            requests and requests of the whole history bypass the cache.
+    """
+
+    def __init__(self,
+                 ttl: float = 5.,
+                 max_entries: int = 1000,
+                 max_candles: int = 5000):
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._max_candles = max_candles
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = collections.Counter()
+
+    def stats(self):
+        """Returns number of hits, refreshes, misses and bypasses."""
+        with self._lock:
+            return dict(self._stats)
+
+    def _count(self, name: str):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _entry(self, key: CandleKey) -> _Entry:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+            return entry
+
+    def get(
+        self, key: CandleKey, count: int,
+        fetch: Callable[[int], Tuple[str, List[Candle]]],
+        fetch_since: Callable[[int], List[Candle]]
+    ) -> Tuple[str, List[Candle]]:
+        """Returns name and the last `count` candles of `key`.
+
+        Args:
+            key: (code, cycle_type, cycle).
+            count: number of candles. 0 gets the whole history.
+            fetch: returns name and the last `count` candles in ascending
+                order.
+            fetch_since: returns candles since given date (YYYYMMDD) in
+                ascending order.
+        """
+        if (self._max_entries <= 0 or count == 0 or
+                count > self._max_candles):
+            self._count('bypasses')
+            return fetch(count)
+
+        entry = self._entry(key)
+        # Concurrent requests of the same key wait for one fetch.
+        with entry.lock:
+            now = time.monotonic()
+            if entry.candles is None or (len(entry.candles) < count and
+                                         not entry.complete):
+                entry.name, entry.candles = fetch(count)
+                entry.complete = len(entry.candles) < count
+                entry.refreshed_at = now
+                self._count('misses')
+            elif now - entry.refreshed_at >= self._ttl:
+                if entry.candles:
+                    fresh = fetch_since(entry.candles[-1][0])
+                else:
+                    fresh = fetch(count)[1]
+                if fresh:
+                    # (date, time) sorts before any candle of the same time.
+                    start = bisect.bisect_left(entry.candles, fresh[0][:2])
+                    entry.candles = entry.candles[:start] + fresh
+                entry.refreshed_at = now
+                self._count('refreshes')
+            else:
+                self._count('hits')
+
+            if len(entry.candles) > self._max_candles:
+                entry.candles = entry.candles[-self._max_candles:]
+                entry.complete = False
+            return entry.name, entry.candles[-count:]
@@ -0,0 +1,70 @@
+"""Tests of `CandleCache`."""
+
+import unittest
+
+import candle_cache
+
+
+def _candle(date, close):
+    return (date, 1530, close, close, close, close, 100)
+
+
+_HISTORY = [_candle(20210301 + day, 1000 + day) for day in range(10)]
+
+
+class _Fetcher:
+    """Fetches from `_HISTORY` and records the requested counts."""
+
+    def __init__(self):
+        self.counts = []
+
+    def fetch(self, count):
+        self.counts.append(count)
+        return 'FAKE', _HISTORY[-count:] if count else list(_HISTORY)
+
+    @staticmethod
+    def fetch_since(date):
+        return [candle for candle in _HISTORY if candle[0] >= date]
+
+
+class CandleCacheTest(unittest.TestCase):
+
+    def _get(self, cache, fetcher, count):
+        return cache.get(('A005930', 'D', 1), count, fetcher.fetch,
+                         fetcher.fetch_since)
+
+    def test_cached_candles_are_reused(self):
+        cache = candle_cache.CandleCache()
+        fetcher = _Fetcher()
+
+        self._get(cache, fetcher, 5)
+        name, candles = self._get(cache, fetcher, 3)
+
+        self.assertEqual(name, 'FAKE')
+        self.assertEqual(candles, _HISTORY[-3:])
+        self.assertEqual(fetcher.counts, [5])
+        self.assertEqual(cache.stats(), {'misses': 1, 'hits': 1})
+
+    def test_zero_count_gets_whole_history(self):
+        cache = candle_cache.CandleCache()
+        fetcher = _Fetcher()
+        self._get(cache, fetcher, 5)
+
+        _, candles = self._get(cache, fetcher, 0)
+
+        self.assertEqual(candles, _HISTORY)
+        self.assertEqual(fetcher.counts, [5, 0])
+        self.assertEqual(cache.stats(), {'misses': 1, 'bypasses': 1})
+
+    def test_count_over_max_candles_bypasses_cache(self):
+        cache = candle_cache.CandleCache(max_candles=4)
+        fetcher = _Fetcher()
+
+        _, candles = self._get(cache, fetcher, 5)
+
+        self.assertEqual(candles, _HISTORY[-5:])
+        self.assertEqual(cache.stats(), {'bypasses': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
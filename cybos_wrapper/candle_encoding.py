@@ -0,0 +1,80 @@
+"""Encoding of candles in `GetCandleResponse`.
+
+Candles are sent either as `candle_data`, one `CandleData` message per
+candle, or as `packed_candle_data`, one packed repeated field per column.
+The packed form avoids building and parsing a message per candle, and its
+delta encoding keeps varints of slowly changing columns short.
+"""
+
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+import deep_trader_pb2
+
+COLUMNS = ('date', 'time', 'open', 'high', 'low', 'close', 'volume')
+
+
+def encode_candles(candles: Sequence[Tuple[int, ...]], packed: bool = False,
+                   delta_encoded: bool = False) -> Dict:
+    """Returns fields of `GetCandleResponse` holding `candles`.
+
+    Args:
+        candles: (date, time, open, high, low, close, volume) of each
+            candle. They are encoded in the given order.
+        packed: encode as `packed_candle_data`.
+        delta_encoded: encode packed columns as differences from the
+            previous candle.
+    """
+    if not packed:
+        return {
+            'candle_data': [
+                deep_trader_pb2.CandleData(date=date,
+                                           time=time,
+                                           open=open_,
+                                           high=high,
+                                           low=low,
+                                           close=close,
+                                           volume=volume)
+                for date, time, open_, high, low, close, volume in candles
+            ]
+        }
+
+    columns = list(zip(*candles)) or [()] * len(COLUMNS)
+    if delta_encoded:
+        columns = [_delta_encode(values) for values in columns]
+    return {
+        'packed_candle_data':
+            deep_trader_pb2.PackedCandleData(delta_encoded=delta_encoded,
+                                             **dict(zip(COLUMNS, columns)))
+    }
+
+
+def _to_array(values: Sequence[int]) -> np.ndarray:
+    return np.fromiter(values, dtype=np.int64, count=len(values))
+
+
+def _delta_encode(values: Sequence[int]) -> List[int]:
+    values = _to_array(values)
+    values[1:] = np.diff(values)
+    return values.tolist()
+
+
+def decode_candles(
+        response: deep_trader_pb2.GetCandleResponse) -> Dict[str, np.ndarray]:
+    """Returns int64 array of each column of candles in `response`."""
+    if response.HasField('packed_candle_data'):
+        packed = response.packed_candle_data
+        columns = {
+            column: _to_array(getattr(packed, column)) for column in COLUMNS
+        }
+        if packed.delta_encoded:
+            for values in columns.values():
+                np.cumsum(values, out=values)
+        return columns
+
+    values = np.array([(candle.date, candle.time, candle.open, candle.high,
+                        candle.low, candle.close, candle.volume)
+                       for candle in response.candle_data],
+                      dtype=np.int64).reshape(-1, len(COLUMNS))
+    return {column: values[:, i] for i, column in enumerate(COLUMNS)}
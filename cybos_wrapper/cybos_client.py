@@ -0,0 +1,364 @@
+"""Client of Cybos wrapper service.
+
+Keeps one long-lived channel to the service. Every call has a deadline and
+idempotent calls (GetCandle) are retried with exponential backoff on
+transient errors. Calls can be issued concurrently as futures, or as
+coroutines with `AsyncCybosClient`. Latency and status of every call
+(including each retry) are recorded to `metrics`.
+"""
+
+import asyncio
+from concurrent import futures
+import random
+import threading
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+from absl import logging
+import grpc
+import numpy as np
+
+import candle_encoding
+import deep_trader_pb2
+import deep_trader_pb2_grpc
+import rpc_metrics
+
+# Transient errors to retry idempotent calls on.
+RETRYABLE_STATUS_CODES = frozenset([
+    grpc.StatusCode.UNAVAILABLE,
+    grpc.StatusCode.DEADLINE_EXCEEDED,
+    grpc.StatusCode.RESOURCE_EXHAUSTED,
+])
+
+_CHANNEL_OPTIONS = [
+    ('grpc.keepalive_time_ms', 30_000),
+    ('grpc.keepalive_timeout_ms', 10_000),
+    ('grpc.keepalive_permit_without_calls', 1),
+    ('grpc.max_receive_message_length', 64 * 1024 * 1024),
+]
+
+
+class CybosClient:
+    """Pooled client of `DeepTrader` service.
+
+    Args:
+        address: 'host:port' of the service.
+        timeout: deadline of each call in seconds.
+        max_retries: max retry count of idempotent calls.
+        initial_backoff: backoff before the first retry in seconds. It is
+            doubled (with jitter) on every retry.
+        max_backoff: upper bound of backoff in seconds.
+    """
+
+    def __init__(self,
+                 address: str,
+                 timeout: float = 10.,
+                 max_retries: int = 3,
+                 initial_backoff: float = 0.1,
+                 max_backoff: float = 2.):
+        self._metrics = rpc_metrics.RpcMetrics()
+        self._channel = grpc.intercept_channel(
+            grpc.insecure_channel(address, options=_CHANNEL_OPTIONS),
+            rpc_metrics.MetricsClientInterceptor(self._metrics))
+        self._stub = deep_trader_pb2_grpc.DeepTraderStub(self._channel)
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    @property
+    def metrics(self) -> rpc_metrics.RpcMetrics:
+        return self._metrics
+
+    def close(self):
+        self._channel.close()
+
+    def _backoff(self, attempt: int) -> float:
+        backoff = min(self._initial_backoff * 2**attempt, self._max_backoff)
+        return backoff * random.uniform(0.5, 1.)
+
+    def _call_future(self, name: str, method, request,
+                     retry: bool) -> futures.Future:
+        """Returns future of `method` call retried on transient errors."""
+        result = futures.Future()
+        result.set_running_or_notify_cancel()
+
+        def _attempt(attempt):
+            call = method.future(request, timeout=self._timeout)
+            call.add_done_callback(lambda c: _on_done(c, attempt))
+
+        def _on_done(call, attempt):
+            error = call.exception()
+            if error is None:
+                result.set_result(call.result())
+                return
+            if (retry and attempt < self._max_retries and
+                    error.code() in RETRYABLE_STATUS_CODES):
+                backoff = self._backoff(attempt)
+                logging.warning('Retry %s in %.3fs: %s', name, backoff,
+                                error.code().name)
+                timer = threading.Timer(backoff, _attempt, (attempt + 1,))
+                timer.daemon = True
+                timer.start()
+                return
+            result.set_exception(error)
+
+        _attempt(0)
+        return result
+
+    def get_candle_future(self,
+                          code: str,
+                          cycle_type: str,
+                          cycle: int,
+                          count: int,
+                          packed: bool = False,
+                          delta_encoded: bool = False) -> futures.Future:
+        return self._call_future(
+            'GetCandle',
+            self._stub.GetCandle,
+            deep_trader_pb2.GetCandleRequest(code=code,
+                                             cycle_type=cycle_type,
+                                             cycle=cycle,
+                                             count=count,
+                                             packed=packed,
+                                             delta_encoded=delta_encoded),
+            retry=True)
+
+    def get_candle(self,
+                   code: str,
+                   cycle_type: str,
+                   cycle: int,
+                   count: int,
+                   packed: bool = False,
+                   delta_encoded: bool = False
+                  ) -> deep_trader_pb2.GetCandleResponse:
+        return self.get_candle_future(code, cycle_type, cycle, count, packed,
+                                      delta_encoded).result()
+
+    def get_candle_arrays(self, code: str, cycle_type: str, cycle: int,
+                          count: int) -> Dict[str, np.ndarray]:
+        """Get candles as array of each column, the latest candle first."""
+        return candle_encoding.decode_candles(
+            self.get_candle(code,
+                            cycle_type,
+                            cycle,
+                            count,
+                            packed=True,
+                            delta_encoded=True))
+
+    def get_candles(self, codes: Sequence[str], cycle_type: str, cycle: int,
+                    count: int) -> List[deep_trader_pb2.GetCandleResponse]:
+        """Get candles of `codes` concurrently."""
+        calls = [
+            self.get_candle_future(code, cycle_type, cycle, count)
+            for code in codes
+        ]
+        return [call.result() for call in calls]
+
+    def stream_candles(
+        self,
+        requests: Sequence[Tuple[str, str, int, int]],
+        timeout: Optional[float] = None,
+        packed: bool = False,
+        delta_encoded: bool = False
+    ) -> Iterator[deep_trader_pb2.GetCandleResponse]:
+        """Get candles of many codes in one batched call.
+
+        Args:
+            requests: list of (code, cycle_type, cycle, count).
+            timeout: deadline of the whole stream. Defaults to the deadline
+                of each call times number of requests.
+            packed: get candles as `packed_candle_data`.
+            delta_encoded: get packed candles delta encoded.
+
+        Returns:
+            iterator of responses in the order the service completes them.
+            Check `code` of each response. Responses of failed codes have
+            nonzero `error_code` and no candles. Streaming call is not
+            retried.
+        """
+        if timeout is None:
+            timeout = self._timeout * max(len(requests), 1)
+        request = deep_trader_pb2.GetCandlesRequest(requests=[
+            deep_trader_pb2.GetCandleRequest(code=code,
+                                             cycle_type=cycle_type,
+                                             cycle=cycle,
+                                             count=count,
+                                             packed=packed,
+                                             delta_encoded=delta_encoded)
+            for code, cycle_type, cycle, count in requests
+        ])
+        return self._stub.GetCandles(request, timeout=timeout)
+
+    def stream_candle_history(
+        self,
+        code: str,
+        cycle_type: str,
+        cycle: int,
+        count: int = 0,
+        packed: bool = True,
+        delta_encoded: bool = True,
+        timeout: Optional[float] = None
+    ) -> Iterator[deep_trader_pb2.GetCandleResponse]:
+        """Get candles of `code` page by page from the latest.
+
+        Args:
+            count: number of candles to get in total. 0 gets all history.
+            timeout: deadline of the whole stream. No deadline by default.
+
+        Returns:
+            iterator of responses, each of which holds one page of candles
+            with the latest candle first. Streaming call is not retried.
+        """
+        return self._stub.GetCandleHistory(
+            deep_trader_pb2.GetCandleRequest(code=code,
+                                             cycle_type=cycle_type,
+                                             cycle=cycle,
+                                             count=count,
+                                             packed=packed,
+                                             delta_encoded=delta_encoded),
+            timeout=timeout)
+
+    def subscribe(self, codes: Sequence[str]):
+        """Subscribe realtime events of `codes`.
+
+        Returns:
+            iterator of `MarketEvent` without deadline. Call `cancel()` of
+            it to unsubscribe.
+        """
+        return self._stub.Subscribe(
+            deep_trader_pb2.SubscribeRequest(codes=codes))
+
+    def submit_order_future(self, code: str, order_type: str, count: int,
+                            price: int) -> futures.Future:
+        # Submitting order is not idempotent, never retry it.
+        return self._call_future(
+            'SubmitOrder',
+            self._stub.SubmitOrder,
+            deep_trader_pb2.SubmitOrderRequest(code=code,
+                                               order_type=order_type,
+                                               count=count,
+                                               price=price),
+            retry=False)
+
+    def submit_order(self, code: str, order_type: str, count: int,
+                     price: int) -> deep_trader_pb2.SubmitOrderResponse:
+        return self.submit_order_future(code, order_type, count,
+                                        price).result()
+
+
+class AsyncCybosClient:
+    """asyncio client of `DeepTrader` service.
+
+    Has the same arguments and retry policy as `CybosClient`. Must be
+    created and used on one event loop.
+    """
+
+    def __init__(self,
+                 address: str,
+                 timeout: float = 10.,
+                 max_retries: int = 3,
+                 initial_backoff: float = 0.1,
+                 max_backoff: float = 2.):
+        self._metrics = rpc_metrics.RpcMetrics()
+        self._channel = grpc.aio.insecure_channel(
+            address,
+            options=_CHANNEL_OPTIONS,
+            interceptors=[
+                rpc_metrics.AsyncMetricsUnaryUnaryInterceptor(self._metrics),
+                rpc_metrics.AsyncMetricsUnaryStreamInterceptor(self._metrics),
+            ])
+        self._stub = deep_trader_pb2_grpc.DeepTraderStub(self._channel)
+        self._timeout = timeout
+        self._max_retries = max_retries
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+    @property
+    def metrics(self) -> rpc_metrics.RpcMetrics:
+        return self._metrics
+
+    async def close(self):
+        await self._channel.close()
+
+    def _backoff(self, attempt: int) -> float:
+        backoff = min(self._initial_backoff * 2**attempt, self._max_backoff)
+        return backoff * random.uniform(0.5, 1.)
+
+    async def get_candle(self,
+                         code: str,
+                         cycle_type: str,
+                         cycle: int,
+                         count: int,
+                         packed: bool = False,
+                         delta_encoded: bool = False
+                        ) -> deep_trader_pb2.GetCandleResponse:
+        request = deep_trader_pb2.GetCandleRequest(code=code,
+                                                   cycle_type=cycle_type,
+                                                   cycle=cycle,
+                                                   count=count,
+                                                   packed=packed,
+                                                   delta_encoded=delta_encoded)
+        attempt = 0
+        while True:
+            try:
+                return await self._stub.GetCandle(request,
+                                                  timeout=self._timeout)
+            except grpc.aio.AioRpcError as ex:
+                if (attempt >= self._max_retries or
+                        ex.code() not in RETRYABLE_STATUS_CODES):
+                    raise
+                backoff = self._backoff(attempt)
+                logging.warning('Retry GetCandle in %.3fs: %s', backoff,
+                                ex.code().name)
+                await asyncio.sleep(backoff)
+                attempt += 1
+
+    async def get_candles(
+            self, codes: Sequence[str], cycle_type: str, cycle: int,
+            count: int) -> List[deep_trader_pb2.GetCandleResponse]:
+        """Get candles of `codes` concurrently."""
+        return await asyncio.gather(*[
+            self.get_candle(code, cycle_type, cycle, count) for code in codes
+        ])
+
+    def stream_candle_history(self,
+                              code: str,
+                              cycle_type: str,
+                              cycle: int,
+                              count: int = 0,
+                              packed: bool = True,
+                              delta_encoded: bool = True,
+                              timeout: Optional[float] = None):
+        """Returns async iterator of pages of candles from the latest."""
+        return self._stub.GetCandleHistory(
+            deep_trader_pb2.GetCandleRequest(code=code,
+                                             cycle_type=cycle_type,
+                                             cycle=cycle,
+                                             count=count,
+                                             packed=packed,
+                                             delta_encoded=delta_encoded),
+            timeout=timeout)
+
+    def subscribe(self, codes: Sequence[str]):
+        """Returns async iterator of realtime `MarketEvent` of `codes`."""
+        return self._stub.Subscribe(
+            deep_trader_pb2.SubscribeRequest(codes=codes))
+
+    async def submit_order(self, code: str, order_type: str, count: int,
+                           price: int) -> deep_trader_pb2.SubmitOrderResponse:
+        # Submitting order is not idempotent, never retry it.
+        return await self._stub.SubmitOrder(deep_trader_pb2.SubmitOrderRequest(
+            code=code, order_type=order_type, count=count, price=price),
+                                            timeout=self._timeout)
@@ -0,0 +1,121 @@
+"""Tests of `cybos_client` against a fake `DeepTrader` servicer."""
+
+import time
+import unittest
+
+import grpc
+
+import cybos_client
+import fake_deep_trader_service
+
+
+class CybosClientTest(unittest.TestCase):
+
+    def _connect(self, servicer, timeout=5., max_retries=3):
+        server, address = fake_deep_trader_service.serve(servicer)
+        self.addCleanup(server.stop, None)
+        client = cybos_client.CybosClient(address,
+                                          timeout=timeout,
+                                          max_retries=max_retries,
+                                          initial_backoff=0.01,
+                                          max_backoff=0.02)
+        self.addCleanup(client.close)
+        return client
+
+    def test_get_candle_retries_on_unavailable(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(failures=2)
+        client = self._connect(servicer)
+
+        response = client.get_candle('A005930', 'm', 1, 10)
+
+        self.assertEqual(response.code, 'A005930')
+        self.assertEqual(servicer.calls['GetCandle'], 3)
+        # Every attempt is recorded.
+        self.assertEqual(
+            client.metrics.snapshot()['methods']['GetCandle']['codes'], {
+                'UNAVAILABLE': 2,
+                'OK': 1
+            })
+
+    def test_get_candle_gives_up_after_max_retries(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(failures=10)
+        client = self._connect(servicer, max_retries=2)
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            client.get_candle('A005930', 'm', 1, 10)
+
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.UNAVAILABLE)
+        self.assertEqual(servicer.calls['GetCandle'], 3)
+
+    def test_get_candle_does_not_retry_on_permanent_error(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(
+            failures=1, code=grpc.StatusCode.INVALID_ARGUMENT)
+        client = self._connect(servicer)
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            client.get_candle('A005930', 'm', 1, 10)
+
+        self.assertEqual(raised.exception.code(),
+                         grpc.StatusCode.INVALID_ARGUMENT)
+        self.assertEqual(servicer.calls['GetCandle'], 1)
+
+    def test_submit_order_is_never_retried(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(failures=1)
+        client = self._connect(servicer)
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            client.submit_order('A005930', 'L', 10, 0)
+
+        self.assertEqual(raised.exception.code(), grpc.StatusCode.UNAVAILABLE)
+        self.assertEqual(servicer.calls['SubmitOrder'], 1)
+        self.assertEqual(servicer.orders, [])
+
+    def test_calls_have_deadline(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer()
+        client = self._connect(servicer, timeout=2.)
+
+        client.get_candle('A005930', 'm', 1, 10)
+        client.submit_order('A005930', 'L', 10, 0)
+
+        self.assertEqual(len(servicer.time_remaining), 2)
+        # Calls without deadline have None remaining.
+        for time_remaining in servicer.time_remaining:
+            self.assertIsNotNone(time_remaining)
+            self.assertLess(time_remaining, 2.1)
+
+    def test_slow_get_candle_exceeds_deadline_on_every_retry(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(latency=0.3)
+        client = self._connect(servicer, timeout=0.05, max_retries=1)
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            client.get_candle('A005930', 'm', 1, 10)
+
+        self.assertEqual(raised.exception.code(),
+                         grpc.StatusCode.DEADLINE_EXCEEDED)
+        self.assertEqual(servicer.calls['GetCandle'], 2)
+
+    def test_slow_submit_order_exceeds_deadline_once(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(latency=0.3)
+        client = self._connect(servicer, timeout=0.05)
+
+        with self.assertRaises(grpc.RpcError) as raised:
+            client.submit_order('A005930', 'L', 10, 0)
+
+        self.assertEqual(raised.exception.code(),
+                         grpc.StatusCode.DEADLINE_EXCEEDED)
+        # Wait for the server to finish the order it was slow on.
+        time.sleep(0.4)
+        self.assertEqual(servicer.calls['SubmitOrder'], 1)
+
+    def test_get_candles_in_order_of_codes(self):
+        servicer = fake_deep_trader_service.FakeDeepTraderServicer(failures=1)
+        client = self._connect(servicer)
+        codes = [f'A{i:06d}' for i in range(8)]
+
+        responses = client.get_candles(codes, 'm', 1, 10)
+
+        self.assertEqual([response.code for response in responses], codes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,21 +1,75 @@
 from concurrent import futures
+import contextlib
+import datetime
+import threading
+import time
 
 from absl import app
 from absl import flags
 from absl import logging
 from google.protobuf import text_format
 import grpc
-import pythoncom
-from win32com import client as win32client
-
+try:
+    import pythoncom
+    from win32com import client as win32client
+except ImportError:
+    # Cybos is only available on Windows. Run `fake_cybos.py` elsewhere.
+    pythoncom = None
+    win32client = None
+
+import candle_cache
+import candle_encoding
 import deep_trader_pb2
 import deep_trader_pb2_grpc
+import market_feed
+import request_scheduler
+import rpc_metrics
 
 flags.DEFINE_integer('port', 11231, 'Port to listen.')
+flags.DEFINE_integer(
+    'max_workers', 16, 'Number of server threads. Each subscriber of '
+    'realtime events occupies one of them.')
 flags.DEFINE_boolean('block_submit_order', True, 'Block submit order rpc.')
+flags.DEFINE_boolean('reuse_cybos_sessions', True,
+                     'Keep Cybos COM objects of each worker thread alive.')
+flags.DEFINE_float('liveness_ttl', 1.,
+                   'Seconds to trust the last Cybos connection check.')
+flags.DEFINE_integer('query_limit', 60,
+                     'Max number of Cybos queries in --quota_period.')
+flags.DEFINE_integer('order_limit', 20,
+                     'Max number of Cybos orders in --quota_period.')
+flags.DEFINE_float('quota_period', 15., 'Period (in sec) of Cybos quotas.')
+flags.DEFINE_integer('query_burst', 15,
+                     'Max number of Cybos queries to send at once.')
+flags.DEFINE_integer('order_burst', 5,
+                     'Max number of Cybos orders to send at once.')
+flags.DEFINE_float('max_quota_wait', 5.,
+                   'Max seconds for a request to wait for Cybos quota.')
+flags.DEFINE_float('metrics_log_interval', 60.,
+                   'Interval (in sec) to log scheduler and RPC metrics.')
+flags.DEFINE_integer(
+    'metrics_port', 11232, 'Local port to serve metrics as JSON at '
+    '/metrics. 0 disables it.')
+flags.DEFINE_integer('feed_bar_minutes', 1,
+                     'Length of bars to build from realtime trades.')
+flags.DEFINE_integer(
+    'subscriber_queue_size', 10_000, 'Max number of events buffered for '
+    'each subscriber. Slower subscribers are dropped.')
+flags.DEFINE_float(
+    'candle_cache_ttl', 5.,
+    'Seconds to serve cached candles before fetching newer candles.')
+flags.DEFINE_integer(
+    'candle_cache_max_entries', 1000,
+    'Max number of (code, cycle_type, cycle) to cache. 0 disables cache.')
+flags.DEFINE_integer(
+    'candle_cache_max_candles', 5000,
+    'Max number of candles to cache for each (code, cycle_type, cycle).')
 
 FLAGS = flags.FLAGS
 
+# Count of candles to request whole history.
+_ALL_CANDLES = 3_000_000
+
 
 class CybosException(Exception):
     def __init__(self, status: grpc.StatusCode, message: str):
@@ -23,18 +77,99 @@ class CybosException(Exception):
         self.status = status
 
 
-class CybosWrapper(object):
+def candle_error_response(code: str, ex: CybosException
+                         ) -> deep_trader_pb2.GetCandleResponse:
+    """Returns response of GetCandles to the failed request of `code`."""
+    return deep_trader_pb2.GetCandleResponse(code=code,
+                                             error_code=ex.status.value[0],
+                                             error_message=str(ex))
+
+
+class ComBackend(object):
+    """COM runtime to access Cybos objects."""
+
+    # Exception types raised by broken COM objects.
+    errors = ()
+
+    def initialize(self):
+        """Initializes COM on the calling thread."""
+        raise NotImplementedError
+
+    def uninitialize(self):
+        raise NotImplementedError
+
+    def dispatch(self, prog_id: str):
+        """Returns COM object of `prog_id`."""
+        raise NotImplementedError
+
+
+class Win32ComBackend(ComBackend):
     def __init__(self):
-        self.cybos_status = win32client.Dispatch('CpUtil.CpCybos')
-        self.cybos_code_util = win32client.Dispatch('CpUtil.CpCodeMgr')
-        self.cybos_chart = win32client.Dispatch('CpSysDib.StockChart')
-        self.cybos_order_util = win32client.Dispatch('CpTrade.CpTdUtil')
-        self.cybos_order = win32client.Dispatch('CpTrade.CpTd0311')
+        if pythoncom is None:
+            raise RuntimeError('pywin32 is required to access Cybos.')
+        self.errors = (pythoncom.com_error,)
 
-    def _is_cybos_connect_alive(self):
-        return self.cybos_status.IsConnect == 1
+    def initialize(self):
+        pythoncom.CoInitialize()
+
+    def uninitialize(self):
+        pythoncom.CoUninitialize()
+
+    def dispatch(self, prog_id):
+        return win32client.Dispatch(prog_id)
 
-    def get_candle(self, code, cycle_type, cycle, count):
+
+class CybosWrapper(object):
+    def __init__(self,
+                 com: ComBackend,
+                 liveness_ttl: float = 0.,
+                 metrics: rpc_metrics.RpcMetrics = None):
+        self.cybos_status = com.dispatch('CpUtil.CpCybos')
+        self.cybos_code_util = com.dispatch('CpUtil.CpCodeMgr')
+        self.cybos_chart = com.dispatch('CpSysDib.StockChart')
+        self.cybos_order_util = com.dispatch('CpTrade.CpTdUtil')
+        self.cybos_order = com.dispatch('CpTrade.CpTd0311')
+        self._liveness_ttl = liveness_ttl
+        self._alive_until = 0.
+        self._metrics = metrics or rpc_metrics.RpcMetrics()
+
+    def _is_cybos_connect_alive(self):
+        # Connection is checked at most once per `liveness_ttl` seconds.
+        now = time.monotonic()
+        if now < self._alive_until:
+            return True
+        if self.cybos_status.IsConnect != 1:
+            return False
+        self._alive_until = now + self._liveness_ttl
+        return True
+
+    def _check_dib_status(self, dib):
+        if dib.GetDibStatus() != 0:
+            # Check connection again on the next request.
+            self._alive_until = 0.
+            raise CybosException(grpc.StatusCode.INTERNAL,
+                                 f'Error in cybos. {dib.GetDibMsg1()}')
+
+    def get_name(self, code):
+        return self.cybos_code_util.CodeToName(code)
+
+    def iter_candle_pages(self,
+                          code,
+                          cycle_type,
+                          cycle,
+                          count=0,
+                          since=0,
+                          before_request=None):
+        """Yields pages of candles following Cybos continuation.
+
+        Pages are yielded from the latest one. Each page is a list of
+        (date, time, open, high, low, close, volume) in ascending order.
+
+        Args:
+            count: number of candles to get in total. 0 gets all history.
+            since: get candles since this date (YYYYMMDD) instead of count.
+            before_request: called before each request to Cybos.
+        """
         if not self._is_cybos_connect_alive():
             raise CybosException(
                 grpc.StatusCode.INTERNAL,
@@ -46,36 +181,71 @@ class CybosWrapper(object):
                 f'Improper cycle type {cycle_type} is given.')
 
         self.cybos_chart.SetInputValue(0, code)
-        self.cybos_chart.SetInputValue(1, ord('2'))
-        self.cybos_chart.SetInputValue(4, count)
+        if since:
+            # Request by period from `since` to today.
+            self.cybos_chart.SetInputValue(1, ord('1'))
+            self.cybos_chart.SetInputValue(
+                2, int(datetime.date.today().strftime('%Y%m%d')))
+            self.cybos_chart.SetInputValue(3, since)
+        else:
+            self.cybos_chart.SetInputValue(1, ord('2'))
+            self.cybos_chart.SetInputValue(4, count or _ALL_CANDLES)
         self.cybos_chart.SetInputValue(5, [0, 1, 2, 3, 4, 5, 8])
         self.cybos_chart.SetInputValue(6, ord(cycle_type))
         self.cybos_chart.SetInputValue(7, cycle)
         self.cybos_chart.SetInputValue(9, ord('1'))
 
-        logging.info('Sending get candle data request to Cybos.')
-        self.cybos_chart.BlockRequest()
-
-        if self.cybos_chart.GetDibStatus() != 0:
-            raise CybosException(
-                grpc.StatusCode.INTERNAL,
-                f'Error in cybos. {self.cybos_chart.GetDibMsg1}')
-        logging.info('Get candle data request is completed.')
-
-        results = []
-        for i in range(self.cybos_chart.GetHeaderValue(3)):
-            results.append(
-                deep_trader_pb2.CandleData(
-                    date=self.cybos_chart.GetDataValue(0, i),
-                    time=self.cybos_chart.GetDataValue(1, i),
-                    open=self.cybos_chart.GetDataValue(2, i),
-                    high=self.cybos_chart.GetDataValue(3, i),
-                    low=self.cybos_chart.GetDataValue(4, i),
-                    close=self.cybos_chart.GetDataValue(5, i),
-                    volume=self.cybos_chart.GetDataValue(6, i)))
-
-        return deep_trader_pb2.GetCandleResponse(
-            name=self.cybos_code_util.CodeToName(code), candle_data=results)
+        remaining = count or None
+        while True:
+            if before_request is not None:
+                before_request()
+            logging.debug('Sending get candle data request to Cybos.')
+            with self._metrics.stage('com.chart'):
+                result = self.cybos_chart.BlockRequest()
+            if result == 4:
+                raise CybosException(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                                     'Cybos request limit exceeded.')
+            self._check_dib_status(self.cybos_chart)
+
+            num_candles = self.cybos_chart.GetHeaderValue(3)
+            if remaining is not None:
+                num_candles = min(num_candles, remaining)
+                remaining -= num_candles
+            # Cybos returns the latest candle first.
+            page = [
+                tuple(
+                    self.cybos_chart.GetDataValue(field, i)
+                    for field in range(7))
+                for i in reversed(range(num_candles))
+            ]
+            if page:
+                yield page
+            if not page or remaining == 0 or not self.cybos_chart.Continue:
+                return
+
+    def get_candles(self, code, cycle_type, cycle, count, before_request=None):
+        """Returns the last `count` candles in ascending order.
+
+        Each candle is (date, time, open, high, low, close, volume).
+        """
+        pages = list(
+            self.iter_candle_pages(code,
+                                   cycle_type,
+                                   cycle,
+                                   count=count,
+                                   before_request=before_request))
+        return [candle for page in reversed(pages) for candle in page]
+
+    def get_candles_since(self, code, cycle_type, cycle, since,
+                          before_request=None):
+        """Returns candles since `since` (YYYYMMDD) in ascending order."""
+        pages = list(
+            self.iter_candle_pages(code,
+                                   cycle_type,
+                                   cycle,
+                                   since=since,
+                                   before_request=before_request))
+        return [candle for page in reversed(pages) for candle in page]
 
     def submit_order(self, code, order_type, count, price):
         if FLAGS.block_submit_order:
@@ -112,58 +282,323 @@ class CybosWrapper(object):
         else:
             self.cybos_order.SetInputValue(8, "03")
 
-        order_result = self.cybos_order.BlockRequest()
+        with self._metrics.stage('com.order'):
+            order_result = self.cybos_order.BlockRequest()
         if order_result == 4:
-            raise CybosException(grpc.StatusCode.INTERNAL,
+            raise CybosException(grpc.StatusCode.RESOURCE_EXHAUSTED,
                                  f'Cybos order request limit exceeded.')
         elif order_result != 0:
             raise CybosException(
                 grpc.StatusCode.INTERNAL,
                 f'Cybos order request is failed with unknown error.')
 
-        if self.cybos_order.GetDibStatus() != 0:
-            raise CybosException(
-                grpc.StatusCode.INTERNAL,
-                f'Error in cybos. {self.cybos_chart.GetDibMsg1}')
+        self._check_dib_status(self.cybos_order)
 
         return deep_trader_pb2.SubmitOrderResponse()
 
 
+class CybosSessionPool(object):
+    """Cybos sessions bound to worker threads.
+
+    A worker thread initializes COM and dispatches Cybos objects on its
+    first request, and reuses them for the following requests. COM of the
+    worker threads stays initialized as they live as long as the server.
+
+    Args:
+        com: COM runtime.
+        liveness_ttl: seconds to trust the last connection check.
+        reuse: if False, initialize COM and dispatch Cybos objects on every
+            request.
+        metrics: metrics to record time of Cybos calls.
+    """
+
+    def __init__(self,
+                 com: ComBackend,
+                 liveness_ttl: float = 1.,
+                 reuse: bool = True,
+                 metrics: rpc_metrics.RpcMetrics = None):
+        self._com = com
+        self._liveness_ttl = liveness_ttl
+        self._reuse = reuse
+        self._metrics = metrics or rpc_metrics.RpcMetrics()
+        self._local = threading.local()
+
+    def _create(self):
+        with self._metrics.stage('com.dispatch'):
+            return CybosWrapper(self._com, self._liveness_ttl, self._metrics)
+
+    @contextlib.contextmanager
+    def session(self):
+        """Yields `CybosWrapper` of the calling thread."""
+        if not self._reuse:
+            self._com.initialize()
+            try:
+                yield self._create()
+            finally:
+                self._com.uninitialize()
+            return
+
+        wrapper = getattr(self._local, 'wrapper', None)
+        if wrapper is None:
+            if not getattr(self._local, 'com_initialized', False):
+                self._com.initialize()
+                self._local.com_initialized = True
+            wrapper = self._local.wrapper = self._create()
+            logging.info('Cybos session is created on %s.',
+                         threading.current_thread().name)
+        try:
+            yield wrapper
+        except self._com.errors:
+            # Dispatch COM objects again on the next request.
+            self._local.wrapper = None
+            raise
+
+
 class Cybos5WrapperService(deep_trader_pb2_grpc.DeepTraderServicer):
+    def __init__(self,
+                 com: ComBackend,
+                 scheduler: request_scheduler.RequestScheduler = None,
+                 liveness_ttl: float = 1.,
+                 reuse_sessions: bool = True,
+                 cache: candle_cache.CandleCache = None,
+                 max_quota_wait: float = 5.,
+                 hub: market_feed.FeedHub = None,
+                 metrics: rpc_metrics.RpcMetrics = None):
+        self._metrics = metrics or rpc_metrics.RpcMetrics()
+        self._sessions = CybosSessionPool(com, liveness_ttl, reuse_sessions,
+                                          self._metrics)
+        self._cache = cache or candle_cache.CandleCache(max_entries=0)
+        self._scheduler = scheduler
+        self._max_quota_wait = max_quota_wait
+        self._hub = hub
+
+    def _acquire_quota(self, priority: int):
+        if self._scheduler is None:
+            return
+        try:
+            waited = self._scheduler.acquire(priority, self._max_quota_wait)
+        except request_scheduler.QuotaTimeout as ex:
+            raise CybosException(grpc.StatusCode.RESOURCE_EXHAUSTED, str(ex))
+        self._metrics.observe_stage(
+            f'quota_wait.{request_scheduler.PRIORITY_NAMES[priority]}', waited)
+
+    def _get_candle(self, wrapper, request, priority):
+        code, cycle_type, cycle = (request.code, request.cycle_type,
+                                   request.cycle)
+
+        acquire = lambda: self._acquire_quota(priority)
+
+        def _fetch(count):
+            candles = wrapper.get_candles(code, cycle_type, cycle, count,
+                                          acquire)
+            return wrapper.get_name(code), candles
+
+        def _fetch_since(since):
+            return wrapper.get_candles_since(code, cycle_type, cycle, since,
+                                             acquire)
+
+        name, candles = self._cache.get((code, cycle_type, cycle),
+                                        request.count, _fetch, _fetch_since)
+        # Latest candle first as Cybos returns.
+        return deep_trader_pb2.GetCandleResponse(
+            name=name,
+            code=code,
+            **candle_encoding.encode_candles(candles[::-1], request.packed,
+                                             request.delta_encoded))
+
+    @property
+    def hub(self) -> market_feed.FeedHub:
+        return self._hub
+
+    @property
+    def metrics(self) -> rpc_metrics.RpcMetrics:
+        return self._metrics
+
+    # Blocking calls below run on the calling thread with its Cybos session
+    # and raise `CybosException` on errors.
+
+    def get_candle(self, request, priority=request_scheduler.CANDLE):
+        with self._sessions.session() as wrapper:
+            return self._get_candle(wrapper, request, priority)
+
+    def iter_candle_history(self, request):
+        """Yields `GetCandleResponse` of each page from the latest."""
+        with self._sessions.session() as wrapper:
+            name = wrapper.get_name(request.code)
+            pages = wrapper.iter_candle_pages(
+                request.code,
+                request.cycle_type,
+                request.cycle,
+                count=request.count,
+                before_request=lambda: self._acquire_quota(
+                    request_scheduler.BULK_CANDLE))
+            for page in pages:
+                # Latest candle first as Cybos returns.
+                yield deep_trader_pb2.GetCandleResponse(
+                    name=name,
+                    code=request.code,
+                    **candle_encoding.encode_candles(page[::-1],
+                                                     request.packed,
+                                                     request.delta_encoded))
+
+    def submit_order(self, request):
+        with self._sessions.session() as wrapper:
+            # Sells reduce risk, so they go ahead of buys.
+            if request.order_type == 'S':
+                self._acquire_quota(request_scheduler.SELL_ORDER)
+            else:
+                self._acquire_quota(request_scheduler.BUY_ORDER)
+            return wrapper.submit_order(request.code, request.order_type,
+                                        request.count, request.price)
+
     def GetCandle(self, request, context):
-        logging.info('GetCandle: %s',
+        logging.debug('GetCandle: %s',
+                      text_format.MessageToString(request, as_utf8=True))
+        try:
+            return self.get_candle(request)
+        except CybosException as ex:
+            context.abort(ex.status, str(ex))
+
+    def GetCandles(self, request, context):
+        logging.info('GetCandles: %d requests', len(request.requests))
+        with self._sessions.session() as wrapper:
+            for candle_request in request.requests:
+                if not context.is_active():
+                    logging.info('GetCandles is cancelled.')
+                    return
+                # Failed codes are reported not to lose the others.
+                try:
+                    yield self._get_candle(wrapper, candle_request,
+                                           request_scheduler.BULK_CANDLE)
+                except CybosException as ex:
+                    logging.warning('GetCandles failed on %s: %s',
+                                    candle_request.code, ex)
+                    yield candle_error_response(candle_request.code, ex)
+
+    def GetCandleHistory(self, request, context):
+        logging.info('GetCandleHistory: %s',
                      text_format.MessageToString(request, as_utf8=True))
-        pythoncom.CoInitialize()
         try:
-            return CybosWrapper().get_candle(request.code, request.cycle_type,
-                                             request.cycle, request.count)
+            for response in self.iter_candle_history(request):
+                if not context.is_active():
+                    logging.info('GetCandleHistory is cancelled.')
+                    return
+                yield response
         except CybosException as ex:
             context.abort(ex.status, str(ex))
-        finally:
-            pythoncom.CoUninitialize()
 
     def SubmitOrder(self, request, context):
         logging.info('SubmitOrder: %s',
                      text_format.MessageToString(request, as_utf8=True))
-        pythoncom.CoInitialize()
         try:
-            return CybosWrapper().submit_order(request.code,
-                                               request.order_type,
-                                               request.count, request.price)
+            return self.submit_order(request)
         except CybosException as ex:
             context.abort(ex.status, str(ex))
+
+    def Subscribe(self, request, context):
+        logging.info('Subscribe: %s', list(request.codes))
+        if self._hub is None:
+            context.abort(grpc.StatusCode.UNIMPLEMENTED,
+                          'Realtime feed is not enabled.')
+        if not request.codes:
+            context.abort(grpc.StatusCode.INVALID_ARGUMENT,
+                          'No code to subscribe.')
+        subscription = self._hub.subscribe(request.codes)
+        # Stop iterating as soon as the client goes away.
+        context.add_callback(subscription.close)
+        try:
+            yield from subscription
         finally:
-            pythoncom.CoUninitialize()
+            self._hub.unsubscribe(subscription)
+        if subscription.overflowed:
+            context.abort(grpc.StatusCode.RESOURCE_EXHAUSTED,
+                          'Subscriber is too slow to receive events.')
+
+
+def serve(servicer,
+          port: int,
+          max_workers: int = 16,
+          metrics: rpc_metrics.RpcMetrics = None):
+    """Starts a server of `servicer` and returns (server, bound port).
+
+    RPCs are recorded to `metrics` if given.
+    """
+    interceptors = []
+    if metrics is not None:
+        interceptors.append(rpc_metrics.MetricsServerInterceptor(metrics))
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=max_workers),
+                         interceptors=interceptors)
+    deep_trader_pb2_grpc.add_DeepTraderServicer_to_server(servicer, server)
+    port = server.add_insecure_port(f'[::]:{port}')
+    server.start()
+    return server, port
+
+
+def request_scheduler_from_flags():
+    return request_scheduler.RequestScheduler({
+        request_scheduler.QUERY:
+            request_scheduler.TokenBucket(FLAGS.query_limit,
+                                          FLAGS.quota_period,
+                                          FLAGS.query_burst),
+        request_scheduler.ORDER:
+            request_scheduler.TokenBucket(FLAGS.order_limit,
+                                          FLAGS.quota_period,
+                                          FLAGS.order_burst),
+    })
+
+
+def log_metrics_periodically(scheduler: request_scheduler.RequestScheduler,
+                             interval: float,
+                             metrics: rpc_metrics.RpcMetrics = None):
+    """Logs scheduler and RPC metrics every `interval` seconds."""
+
+    def _log():
+        while True:
+            time.sleep(interval)
+            logging.info('Scheduler metrics: %s', scheduler.metrics())
+            if metrics is not None:
+                logging.info('RPC metrics:\n%s', metrics.summary())
+
+    threading.Thread(target=_log, name='metrics_logger', daemon=True).start()
+
+
+def serve_metrics_from_flags(scheduler: request_scheduler.RequestScheduler,
+                             metrics: rpc_metrics.RpcMetrics):
+    """Serves metrics of `scheduler` and RPCs on --metrics_port."""
+    if not FLAGS.metrics_port:
+        return None
+    return rpc_metrics.serve_metrics(FLAGS.metrics_port, {
+        'scheduler': scheduler.metrics,
+        'rpc': metrics.snapshot,
+    })
+
+
+def candle_cache_from_flags():
+    return candle_cache.CandleCache(FLAGS.candle_cache_ttl,
+                                    FLAGS.candle_cache_max_entries,
+                                    FLAGS.candle_cache_max_candles)
 
 
 def main(unused_args):
-    server = grpc.server(futures.ThreadPoolExecutor(max_workers=5))
-    servicer = Cybos5WrapperService()
-    deep_trader_pb2_grpc.add_DeepTraderServicer_to_server(servicer, server)
-    server.add_insecure_port(f'[::]:{FLAGS.port}')
-    server.start()
-    logging.info('Cybor5 wrapping server has started on port %d', FLAGS.port)
-    server.wait_for_termination()
+    scheduler = request_scheduler_from_flags()
+    hub = market_feed.FeedHub(market_feed.CybosFeed(), FLAGS.feed_bar_minutes,
+                              FLAGS.subscriber_queue_size)
+    hub.start()
+    servicer = Cybos5WrapperService(Win32ComBackend(), scheduler,
+                                    FLAGS.liveness_ttl,
+                                    FLAGS.reuse_cybos_sessions,
+                                    candle_cache_from_flags(),
+                                    FLAGS.max_quota_wait, hub)
+    log_metrics_periodically(scheduler, FLAGS.metrics_log_interval,
+                             servicer.metrics)
+    serve_metrics_from_flags(scheduler, servicer.metrics)
+    server, port = serve(servicer, FLAGS.port, FLAGS.max_workers,
+                         servicer.metrics)
+    logging.info('Cybor5 wrapping server has started on port %d', port)
+    try:
+        server.wait_for_termination()
+    finally:
+        hub.stop()
 
 
 if __name__ == '__main__':
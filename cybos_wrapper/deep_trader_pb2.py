@@ -19,7 +19,7 @@ DESCRIPTOR = _descriptor.FileDescriptor(
   syntax='proto3',
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_pb=b'\n\x11\x64\x65\x65p_trader.proto\x12\ndeeptrader\"R\n\x10GetCandleRequest\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x12\n\ncycle_type\x18\x02 \x01(\t\x12\r\n\x05\x63ycle\x18\x03 \x01(\x05\x12\r\n\x05\x63ount\x18\x04 \x01(\x05\"p\n\nCandleData\x12\x0c\n\x04\x64\x61te\x18\x01 \x01(\x05\x12\x0c\n\x04time\x18\x02 \x01(\x05\x12\x0c\n\x04open\x18\x03 \x01(\x05\x12\x0c\n\x04high\x18\x04 \x01(\x05\x12\x0b\n\x03low\x18\x05 \x01(\x05\x12\r\n\x05\x63lose\x18\x06 \x01(\x05\x12\x0e\n\x06volume\x18\x07 \x01(\x05\"N\n\x11GetCandleResponse\x12\x0c\n\x04name\x18\x01 \x01(\t\x12+\n\x0b\x63\x61ndle_data\x18\x02 \x03(\x0b\x32\x16.deeptrader.CandleData\"T\n\x12SubmitOrderRequest\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x12\n\norder_type\x18\x02 \x01(\t\x12\r\n\x05\x63ount\x18\x03 \x01(\x05\x12\r\n\x05price\x18\x04 \x01(\x05\"\x15\n\x13SubmitOrderResponse2\xa6\x01\n\nDeepTrader\x12H\n\tGetCandle\x12\x1c.deeptrader.GetCandleRequest\x1a\x1d.deeptrader.GetCandleResponse\x12N\n\x0bSubmitOrder\x12\x1e.deeptrader.SubmitOrderRequest\x1a\x1f.deeptrader.SubmitOrderResponseb\x06proto3'
+  serialized_pb=b'\n\x11\x64\x65\x65p_trader.proto\x12\ndeeptrader\"y\n\x10GetCandleRequest\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x12\n\ncycle_type\x18\x02 \x01(\t\x12\r\n\x05\x63ycle\x18\x03 \x01(\x05\x12\r\n\x05\x63ount\x18\x04 \x01(\x05\x12\x0e\n\x06packed\x18\x05 \x01(\x08\x12\x15\n\rdelta_encoded\x18\x06 \x01(\x08\"p\n\nCandleData\x12\x0c\n\x04\x64\x61te\x18\x01 \x01(\x05\x12\x0c\n\x04time\x18\x02 \x01(\x05\x12\x0c\n\x04open\x18\x03 \x01(\x05\x12\x0c\n\x04high\x18\x04 \x01(\x05\x12\x0b\n\x03low\x18\x05 \x01(\x05\x12\r\n\x05\x63lose\x18\x06 \x01(\x05\x12\x0e\n\x06volume\x18\x07 \x01(\x05\"\x8d\x01\n\x10PackedCandleData\x12\x0c\n\x04\x64\x61te\x18\x01 \x03(\x11\x12\x0c\n\x04time\x18\x02 \x03(\x11\x12\x0c\n\x04open\x18\x03 \x03(\x11\x12\x0c\n\x04high\x18\x04 \x03(\x11\x12\x0b\n\x03low\x18\x05 \x03(\x11\x12\r\n\x05\x63lose\x18\x06 \x03(\x11\x12\x0e\n\x06volume\x18\x07 \x03(\x11\x12\x15\n\rdelta_encoded\x18\x08 \x01(\x08\"\xc1\x01\n\x11GetCandleResponse\x12\x0c\n\x04name\x18\x01 \x01(\t\x12+\n\x0b\x63\x61ndle_data\x18\x02 \x03(\x0b\x32\x16.deeptrader.CandleData\x12\x0c\n\x04\x63ode\x18\x03 \x01(\t\x12\x38\n\x12packed_candle_data\x18\x04 \x01(\x0b\x32\x1c.deeptrader.PackedCandleData\x12\x12\n\nerror_code\x18\x05 \x01(\x05\x12\x15\n\rerror_message\x18\x06 \x01(\t\"C\n\x11GetCandlesRequest\x12.\n\x08requests\x18\x01 \x03(\x0b\x32\x1c.deeptrader.GetCandleRequest\"T\n\x12SubmitOrderRequest\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x12\n\norder_type\x18\x02 \x01(\t\x12\r\n\x05\x63ount\x18\x03 \x01(\x05\x12\r\n\x05price\x18\x04 \x01(\x05\"\x15\n\x13SubmitOrderResponse\"!\n\x10SubscribeRequest\x12\r\n\x05\x63odes\x18\x01 \x03(\t\"&\n\x05Trade\x12\r\n\x05price\x18\x01 \x01(\x05\x12\x0e\n\x06volume\x18\x02 \x01(\x05\"-\n\x05Quote\x12\x11\n\task_price\x18\x01 \x01(\x05\x12\x11\n\tbid_price\x18\x02 \x01(\x05\"\xa9\x01\n\x0bMarketEvent\x12\x0c\n\x04\x63ode\x18\x01 \x01(\t\x12\x14\n\x0ctimestamp_us\x18\x02 \x01(\x03\x12\"\n\x05trade\x18\x03 \x01(\x0b\x32\x11.deeptrader.TradeH\x00\x12\"\n\x05quote\x18\x04 \x01(\x0b\x32\x11.deeptrader.QuoteH\x00\x12%\n\x03\x62\x61r\x18\x05 \x01(\x0b\x32\x16.deeptrader.CandleDataH\x00\x42\x07\n\x05\x65vent2\x8d\x03\n\nDeepTrader\x12H\n\tGetCandle\x12\x1c.deeptrader.GetCandleRequest\x1a\x1d.deeptrader.GetCandleResponse\x12L\n\nGetCandles\x12\x1d.deeptrader.GetCandlesRequest\x1a\x1d.deeptrader.GetCandleResponse0\x01\x12Q\n\x10GetCandleHistory\x12\x1c.deeptrader.GetCandleRequest\x1a\x1d.deeptrader.GetCandleResponse0\x01\x12N\n\x0bSubmitOrder\x12\x1e.deeptrader.SubmitOrderRequest\x1a\x1f.deeptrader.SubmitOrderResponse\x12\x44\n\tSubscribe\x12\x1c.deeptrader.SubscribeRequest\x1a\x17.deeptrader.MarketEvent0\x01\x62\x06proto3'
 )
 
 
@@ -61,6 +61,20 @@ _GETCANDLEREQUEST = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='packed', full_name='deeptrader.GetCandleRequest.packed', index=4,
+      number=5, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='delta_encoded', full_name='deeptrader.GetCandleRequest.delta_encoded', index=5,
+      number=6, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
   ],
   extensions=[
   ],
@@ -74,7 +88,7 @@ _GETCANDLEREQUEST = _descriptor.Descriptor(
   oneofs=[
   ],
   serialized_start=33,
-  serialized_end=115,
+  serialized_end=154,
 )
 
 
@@ -147,8 +161,89 @@ _CANDLEDATA = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=117,
-  serialized_end=229,
+  serialized_start=156,
+  serialized_end=268,
+)
+
+
+_PACKEDCANDLEDATA = _descriptor.Descriptor(
+  name='PackedCandleData',
+  full_name='deeptrader.PackedCandleData',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='date', full_name='deeptrader.PackedCandleData.date', index=0,
+      number=1, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='time', full_name='deeptrader.PackedCandleData.time', index=1,
+      number=2, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='open', full_name='deeptrader.PackedCandleData.open', index=2,
+      number=3, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='high', full_name='deeptrader.PackedCandleData.high', index=3,
+      number=4, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='low', full_name='deeptrader.PackedCandleData.low', index=4,
+      number=5, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='close', full_name='deeptrader.PackedCandleData.close', index=5,
+      number=6, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='volume', full_name='deeptrader.PackedCandleData.volume', index=6,
+      number=7, type=17, cpp_type=1, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='delta_encoded', full_name='deeptrader.PackedCandleData.delta_encoded', index=7,
+      number=8, type=8, cpp_type=7, label=1,
+      has_default_value=False, default_value=False,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=271,
+  serialized_end=412,
 )
 
 
@@ -174,6 +269,66 @@ _GETCANDLERESPONSE = _descriptor.Descriptor(
       message_type=None, enum_type=None, containing_type=None,
       is_extension=False, extension_scope=None,
       serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='code', full_name='deeptrader.GetCandleResponse.code', index=2,
+      number=3, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='packed_candle_data', full_name='deeptrader.GetCandleResponse.packed_candle_data', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='error_code', full_name='deeptrader.GetCandleResponse.error_code', index=4,
+      number=5, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='error_message', full_name='deeptrader.GetCandleResponse.error_message', index=5,
+      number=6, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=415,
+  serialized_end=608,
+)
+
+
+_GETCANDLESREQUEST = _descriptor.Descriptor(
+  name='GetCandlesRequest',
+  full_name='deeptrader.GetCandlesRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='requests', full_name='deeptrader.GetCandlesRequest.requests', index=0,
+      number=1, type=11, cpp_type=10, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
   ],
   extensions=[
   ],
@@ -186,8 +341,8 @@ _GETCANDLERESPONSE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=231,
-  serialized_end=309,
+  serialized_start=610,
+  serialized_end=677,
 )
 
 
@@ -239,8 +394,8 @@ _SUBMITORDERREQUEST = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=311,
-  serialized_end=395,
+  serialized_start=679,
+  serialized_end=763,
 )
 
 
@@ -264,16 +419,211 @@ _SUBMITORDERRESPONSE = _descriptor.Descriptor(
   extension_ranges=[],
   oneofs=[
   ],
-  serialized_start=397,
-  serialized_end=418,
+  serialized_start=765,
+  serialized_end=786,
+)
+
+
+_SUBSCRIBEREQUEST = _descriptor.Descriptor(
+  name='SubscribeRequest',
+  full_name='deeptrader.SubscribeRequest',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='codes', full_name='deeptrader.SubscribeRequest.codes', index=0,
+      number=1, type=9, cpp_type=9, label=3,
+      has_default_value=False, default_value=[],
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=788,
+  serialized_end=821,
+)
+
+
+_TRADE = _descriptor.Descriptor(
+  name='Trade',
+  full_name='deeptrader.Trade',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='price', full_name='deeptrader.Trade.price', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='volume', full_name='deeptrader.Trade.volume', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=823,
+  serialized_end=861,
+)
+
+
+_QUOTE = _descriptor.Descriptor(
+  name='Quote',
+  full_name='deeptrader.Quote',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='ask_price', full_name='deeptrader.Quote.ask_price', index=0,
+      number=1, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='bid_price', full_name='deeptrader.Quote.bid_price', index=1,
+      number=2, type=5, cpp_type=1, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+  ],
+  serialized_start=863,
+  serialized_end=908,
+)
+
+
+_MARKETEVENT = _descriptor.Descriptor(
+  name='MarketEvent',
+  full_name='deeptrader.MarketEvent',
+  filename=None,
+  file=DESCRIPTOR,
+  containing_type=None,
+  create_key=_descriptor._internal_create_key,
+  fields=[
+    _descriptor.FieldDescriptor(
+      name='code', full_name='deeptrader.MarketEvent.code', index=0,
+      number=1, type=9, cpp_type=9, label=1,
+      has_default_value=False, default_value=b"".decode('utf-8'),
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='timestamp_us', full_name='deeptrader.MarketEvent.timestamp_us', index=1,
+      number=2, type=3, cpp_type=2, label=1,
+      has_default_value=False, default_value=0,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='trade', full_name='deeptrader.MarketEvent.trade', index=2,
+      number=3, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='quote', full_name='deeptrader.MarketEvent.quote', index=3,
+      number=4, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+    _descriptor.FieldDescriptor(
+      name='bar', full_name='deeptrader.MarketEvent.bar', index=4,
+      number=5, type=11, cpp_type=10, label=1,
+      has_default_value=False, default_value=None,
+      message_type=None, enum_type=None, containing_type=None,
+      is_extension=False, extension_scope=None,
+      serialized_options=None, file=DESCRIPTOR,  create_key=_descriptor._internal_create_key),
+  ],
+  extensions=[
+  ],
+  nested_types=[],
+  enum_types=[
+  ],
+  serialized_options=None,
+  is_extendable=False,
+  syntax='proto3',
+  extension_ranges=[],
+  oneofs=[
+    _descriptor.OneofDescriptor(
+      name='event', full_name='deeptrader.MarketEvent.event',
+      index=0, containing_type=None,
+      create_key=_descriptor._internal_create_key,
+    fields=[]),
+  ],
+  serialized_start=911,
+  serialized_end=1080,
 )
 
 _GETCANDLERESPONSE.fields_by_name['candle_data'].message_type = _CANDLEDATA
+_GETCANDLERESPONSE.fields_by_name['packed_candle_data'].message_type = _PACKEDCANDLEDATA
+_GETCANDLESREQUEST.fields_by_name['requests'].message_type = _GETCANDLEREQUEST
+_MARKETEVENT.fields_by_name['trade'].message_type = _TRADE
+_MARKETEVENT.fields_by_name['quote'].message_type = _QUOTE
+_MARKETEVENT.fields_by_name['bar'].message_type = _CANDLEDATA
+_MARKETEVENT.oneofs_by_name['event'].fields.append(
+  _MARKETEVENT.fields_by_name['trade'])
+_MARKETEVENT.fields_by_name['trade'].containing_oneof = _MARKETEVENT.oneofs_by_name['event']
+_MARKETEVENT.oneofs_by_name['event'].fields.append(
+  _MARKETEVENT.fields_by_name['quote'])
+_MARKETEVENT.fields_by_name['quote'].containing_oneof = _MARKETEVENT.oneofs_by_name['event']
+_MARKETEVENT.oneofs_by_name['event'].fields.append(
+  _MARKETEVENT.fields_by_name['bar'])
+_MARKETEVENT.fields_by_name['bar'].containing_oneof = _MARKETEVENT.oneofs_by_name['event']
 DESCRIPTOR.message_types_by_name['GetCandleRequest'] = _GETCANDLEREQUEST
 DESCRIPTOR.message_types_by_name['CandleData'] = _CANDLEDATA
+DESCRIPTOR.message_types_by_name['PackedCandleData'] = _PACKEDCANDLEDATA
 DESCRIPTOR.message_types_by_name['GetCandleResponse'] = _GETCANDLERESPONSE
+DESCRIPTOR.message_types_by_name['GetCandlesRequest'] = _GETCANDLESREQUEST
 DESCRIPTOR.message_types_by_name['SubmitOrderRequest'] = _SUBMITORDERREQUEST
 DESCRIPTOR.message_types_by_name['SubmitOrderResponse'] = _SUBMITORDERRESPONSE
+DESCRIPTOR.message_types_by_name['SubscribeRequest'] = _SUBSCRIBEREQUEST
+DESCRIPTOR.message_types_by_name['Trade'] = _TRADE
+DESCRIPTOR.message_types_by_name['Quote'] = _QUOTE
+DESCRIPTOR.message_types_by_name['MarketEvent'] = _MARKETEVENT
 _sym_db.RegisterFileDescriptor(DESCRIPTOR)
 
 GetCandleRequest = _reflection.GeneratedProtocolMessageType('GetCandleRequest', (_message.Message,), {
@@ -290,6 +640,13 @@ CandleData = _reflection.GeneratedProtocolMessageType('CandleData', (_message.Me
   })
 _sym_db.RegisterMessage(CandleData)
 
+PackedCandleData = _reflection.GeneratedProtocolMessageType('PackedCandleData', (_message.Message,), {
+  'DESCRIPTOR' : _PACKEDCANDLEDATA,
+  '__module__' : 'deep_trader_pb2'
+  # @@protoc_insertion_point(class_scope:deeptrader.PackedCandleData)
+  })
+_sym_db.RegisterMessage(PackedCandleData)
+
 GetCandleResponse = _reflection.GeneratedProtocolMessageType('GetCandleResponse', (_message.Message,), {
   'DESCRIPTOR' : _GETCANDLERESPONSE,
   '__module__' : 'deep_trader_pb2'
@@ -297,6 +654,13 @@ GetCandleResponse = _reflection.GeneratedProtocolMessageType('GetCandleResponse'
   })
 _sym_db.RegisterMessage(GetCandleResponse)
 
+GetCandlesRequest = _reflection.GeneratedProtocolMessageType('GetCandlesRequest', (_message.Message,), {
+  'DESCRIPTOR' : _GETCANDLESREQUEST,
+  '__module__' : 'deep_trader_pb2'
+  # @@protoc_insertion_point(class_scope:deeptrader.GetCandlesRequest)
+  })
+_sym_db.RegisterMessage(GetCandlesRequest)
+
 SubmitOrderRequest = _reflection.GeneratedProtocolMessageType('SubmitOrderRequest', (_message.Message,), {
   'DESCRIPTOR' : _SUBMITORDERREQUEST,
   '__module__' : 'deep_trader_pb2'
@@ -311,6 +675,34 @@ SubmitOrderResponse = _reflection.GeneratedProtocolMessageType('SubmitOrderRespo
   })
 _sym_db.RegisterMessage(SubmitOrderResponse)
 
+SubscribeRequest = _reflection.GeneratedProtocolMessageType('SubscribeRequest', (_message.Message,), {
+  'DESCRIPTOR' : _SUBSCRIBEREQUEST,
+  '__module__' : 'deep_trader_pb2'
+  # @@protoc_insertion_point(class_scope:deeptrader.SubscribeRequest)
+  })
+_sym_db.RegisterMessage(SubscribeRequest)
+
+Trade = _reflection.GeneratedProtocolMessageType('Trade', (_message.Message,), {
+  'DESCRIPTOR' : _TRADE,
+  '__module__' : 'deep_trader_pb2'
+  # @@protoc_insertion_point(class_scope:deeptrader.Trade)
+  })
+_sym_db.RegisterMessage(Trade)
+
+Quote = _reflection.GeneratedProtocolMessageType('Quote', (_message.Message,), {
+  'DESCRIPTOR' : _QUOTE,
+  '__module__' : 'deep_trader_pb2'
+  # @@protoc_insertion_point(class_scope:deeptrader.Quote)
+  })
+_sym_db.RegisterMessage(Quote)
+
+MarketEvent = _reflection.GeneratedProtocolMessageType('MarketEvent', (_message.Message,), {
+  'DESCRIPTOR' : _MARKETEVENT,
+  '__module__' : 'deep_trader_pb2'
+  # @@protoc_insertion_point(class_scope:deeptrader.MarketEvent)
+  })
+_sym_db.RegisterMessage(MarketEvent)
+
 
 
 _DEEPTRADER = _descriptor.ServiceDescriptor(
@@ -320,8 +712,8 @@ _DEEPTRADER = _descriptor.ServiceDescriptor(
   index=0,
   serialized_options=None,
   create_key=_descriptor._internal_create_key,
-  serialized_start=421,
-  serialized_end=587,
+  serialized_start=1083,
+  serialized_end=1480,
   methods=[
   _descriptor.MethodDescriptor(
     name='GetCandle',
@@ -333,16 +725,46 @@ _DEEPTRADER = _descriptor.ServiceDescriptor(
     serialized_options=None,
     create_key=_descriptor._internal_create_key,
   ),
+  _descriptor.MethodDescriptor(
+    name='GetCandles',
+    full_name='deeptrader.DeepTrader.GetCandles',
+    index=1,
+    containing_service=None,
+    input_type=_GETCANDLESREQUEST,
+    output_type=_GETCANDLERESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
+  _descriptor.MethodDescriptor(
+    name='GetCandleHistory',
+    full_name='deeptrader.DeepTrader.GetCandleHistory',
+    index=2,
+    containing_service=None,
+    input_type=_GETCANDLEREQUEST,
+    output_type=_GETCANDLERESPONSE,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
   _descriptor.MethodDescriptor(
     name='SubmitOrder',
     full_name='deeptrader.DeepTrader.SubmitOrder',
-    index=1,
+    index=3,
     containing_service=None,
     input_type=_SUBMITORDERREQUEST,
     output_type=_SUBMITORDERRESPONSE,
     serialized_options=None,
     create_key=_descriptor._internal_create_key,
   ),
+  _descriptor.MethodDescriptor(
+    name='Subscribe',
+    full_name='deeptrader.DeepTrader.Subscribe',
+    index=4,
+    containing_service=None,
+    input_type=_SUBSCRIBEREQUEST,
+    output_type=_MARKETEVENT,
+    serialized_options=None,
+    create_key=_descriptor._internal_create_key,
+  ),
 ])
 _sym_db.RegisterServiceDescriptor(_DEEPTRADER)
 
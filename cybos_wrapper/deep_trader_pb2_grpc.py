@@ -19,11 +19,26 @@ class DeepTraderStub(object):
                 request_serializer=deep__trader__pb2.GetCandleRequest.SerializeToString,
                 response_deserializer=deep__trader__pb2.GetCandleResponse.FromString,
                 )
+        self.GetCandles = channel.unary_stream(
+                '/deeptrader.DeepTrader/GetCandles',
+                request_serializer=deep__trader__pb2.GetCandlesRequest.SerializeToString,
+                response_deserializer=deep__trader__pb2.GetCandleResponse.FromString,
+                )
+        self.GetCandleHistory = channel.unary_stream(
+                '/deeptrader.DeepTrader/GetCandleHistory',
+                request_serializer=deep__trader__pb2.GetCandleRequest.SerializeToString,
+                response_deserializer=deep__trader__pb2.GetCandleResponse.FromString,
+                )
         self.SubmitOrder = channel.unary_unary(
                 '/deeptrader.DeepTrader/SubmitOrder',
                 request_serializer=deep__trader__pb2.SubmitOrderRequest.SerializeToString,
                 response_deserializer=deep__trader__pb2.SubmitOrderResponse.FromString,
                 )
+        self.Subscribe = channel.unary_stream(
+                '/deeptrader.DeepTrader/Subscribe',
+                request_serializer=deep__trader__pb2.SubscribeRequest.SerializeToString,
+                response_deserializer=deep__trader__pb2.MarketEvent.FromString,
+                )
 
 
 class DeepTraderServicer(object):
@@ -35,12 +50,34 @@ class DeepTraderServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def GetCandles(self, request, context):
+        """여러 종목의 캔들을 조회하고, 조회가 끝나는 순서대로 응답을 스트리밍
+        실패한 종목은 error_code와 error_message만 채워서 응답
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
+    def GetCandleHistory(self, request, context):
+        """한 종목의 캔들을 연속 조회하여 최근 페이지부터 스트리밍, count가 0이면 전체
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
     def SubmitOrder(self, request, context):
         """Missing associated documentation comment in .proto file."""
         context.set_code(grpc.StatusCode.UNIMPLEMENTED)
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def Subscribe(self, request, context):
+        """종목들의 실시간 체결, 호가와 분봉 마감 이벤트를 스트리밍
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_DeepTraderServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -49,11 +86,26 @@ def add_DeepTraderServicer_to_server(servicer, server):
                     request_deserializer=deep__trader__pb2.GetCandleRequest.FromString,
                     response_serializer=deep__trader__pb2.GetCandleResponse.SerializeToString,
             ),
+            'GetCandles': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetCandles,
+                    request_deserializer=deep__trader__pb2.GetCandlesRequest.FromString,
+                    response_serializer=deep__trader__pb2.GetCandleResponse.SerializeToString,
+            ),
+            'GetCandleHistory': grpc.unary_stream_rpc_method_handler(
+                    servicer.GetCandleHistory,
+                    request_deserializer=deep__trader__pb2.GetCandleRequest.FromString,
+                    response_serializer=deep__trader__pb2.GetCandleResponse.SerializeToString,
+            ),
             'SubmitOrder': grpc.unary_unary_rpc_method_handler(
                     servicer.SubmitOrder,
                     request_deserializer=deep__trader__pb2.SubmitOrderRequest.FromString,
                     response_serializer=deep__trader__pb2.SubmitOrderResponse.SerializeToString,
             ),
+            'Subscribe': grpc.unary_stream_rpc_method_handler(
+                    servicer.Subscribe,
+                    request_deserializer=deep__trader__pb2.SubscribeRequest.FromString,
+                    response_serializer=deep__trader__pb2.MarketEvent.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'deeptrader.DeepTrader', rpc_method_handlers)
@@ -81,6 +133,40 @@ class DeepTrader(object):
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
 
+    @staticmethod
+    def GetCandles(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/deeptrader.DeepTrader/GetCandles',
+            deep__trader__pb2.GetCandlesRequest.SerializeToString,
+            deep__trader__pb2.GetCandleResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def GetCandleHistory(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/deeptrader.DeepTrader/GetCandleHistory',
+            deep__trader__pb2.GetCandleRequest.SerializeToString,
+            deep__trader__pb2.GetCandleResponse.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
     @staticmethod
     def SubmitOrder(request,
             target,
@@ -97,3 +183,20 @@ class DeepTrader(object):
             deep__trader__pb2.SubmitOrderResponse.FromString,
             options, channel_credentials,
             insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
+
+    @staticmethod
+    def Subscribe(request,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.unary_stream(request, target, '/deeptrader.DeepTrader/Subscribe',
+            deep__trader__pb2.SubscribeRequest.SerializeToString,
+            deep__trader__pb2.MarketEvent.FromString,
+            options, channel_credentials,
+            insecure, call_credentials, compression, wait_for_ready, timeout, metadata)
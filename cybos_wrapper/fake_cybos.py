@@ -0,0 +1,391 @@
+"""Fake Cybos backend which runs without Cybos.
+
+Emulates the Cybos COM objects used by `CybosWrapper` with simulated
+dispatch and request latency, and replays recorded or synthetic ticks as
+the realtime feed, so that the wrapper service and its clients can be
+developed and benchmarked on Linux.
+
+Example usage:
+
+    python fake_cybos.py --port 11231 --latency_ms 20 --noblock_submit_order
+"""
+
+import csv
+import datetime
+import random
+import threading
+import time
+from typing import List, Sequence, Tuple
+
+from absl import app
+from absl import flags
+from absl import logging
+
+import cybos_wrapper_service
+import deep_trader_pb2
+import market_feed
+
+flags.DEFINE_float('latency_ms', 20., 'Simulated latency of each request.')
+flags.DEFINE_float('dispatch_latency_ms', 5.,
+                   'Simulated latency of dispatching a COM object.')
+flags.DEFINE_float(
+    'failure_rate', 0., 'Ratio of requests to fail with request limit '
+    'exceeded.')
+flags.DEFINE_string(
+    'ticks_file', None, 'CSV file of ticks to replay with columns '
+    'Timestamp (in us),Code,Price,Volume,AskPrice,BidPrice. Synthetic ticks '
+    'are replayed if not given.')
+flags.DEFINE_float('replay_speed', 1.,
+                   'Replay speed of ticks. 0 replays as fast as possible.')
+
+FLAGS = flags.FLAGS
+
+# `BlockRequest` result of exceeding request limit.
+_REQUEST_LIMIT_EXCEEDED = 4
+
+_FIRST_DAY = datetime.date(2021, 10, 1)
+# 5 minute candles from 09:05 to 15:30.
+_CANDLES_PER_DAY = 78
+
+
+def fake_candles(code: str, count: int):
+    """Returns deterministic random walk 5 minute candles of `code`.
+
+    Each candle is (date, time, open, high, low, close, volume) in
+    ascending order. Candles of a code are the same for the same index.
+    """
+    rng = random.Random(code)
+    price = rng.randint(1_000, 100_000)
+    day = _FIRST_DAY
+    candles = []
+    for i in range(count):
+        if i % _CANDLES_PER_DAY == 0 and i:
+            day += datetime.timedelta(days=3 if day.weekday() == 4 else 1)
+        minutes = 9 * 60 + 5 * (i % _CANDLES_PER_DAY + 1)
+        open_price = price
+        price = max(1, int(price * (1 + rng.gauss(0, 0.01))))
+        candles.append((int(day.strftime('%Y%m%d')),
+                        minutes // 60 * 100 + minutes % 60, open_price,
+                        max(open_price, price), min(open_price, price), price,
+                        rng.randint(0, 100_000)))
+    return candles
+
+
+class FakeComError(Exception):
+    pass
+
+
+class _FakeCpCybos:
+    IsConnect = 1
+
+
+class _FakeCpCodeMgr:
+    def CodeToName(self, code):
+        return f'FAKE{code}'
+
+
+class _FakeDib:
+    """Base of request objects with `SetInputValue` and `BlockRequest`."""
+
+    def __init__(self, com):
+        self._com = com
+        self._inputs = {}
+
+    def SetInputValue(self, index, value):
+        self._inputs[index] = value
+
+    def BlockRequest(self):
+        if not self._com.simulate_request():
+            return _REQUEST_LIMIT_EXCEEDED
+        self._on_request()
+        return 0
+
+    def _on_request(self):
+        pass
+
+    def GetDibStatus(self):
+        return 0
+
+    def GetDibMsg1(self):
+        return ''
+
+
+class _FakeStockChart(_FakeDib):
+    def __init__(self, com):
+        super().__init__(com)
+        self._candles = []
+        # Candles of the request not returned yet, the latest first.
+        self._remaining = None
+        self.Continue = 0
+
+    def SetInputValue(self, index, value):
+        super().SetInputValue(index, value)
+        # Changing inputs starts a new request.
+        self._remaining = None
+
+    def _on_request(self):
+        if self._remaining is None:
+            candles = self._com.candles(self._inputs[0])
+            if self._inputs[1] == ord('1'):
+                since = self._inputs[3]
+                candles = [candle for candle in candles if candle[0] >= since]
+            else:
+                candles = candles[-self._inputs[4]:]
+            # Latest candle first as Cybos returns.
+            self._remaining = candles[::-1]
+        page_size = self._com.page_size
+        self._candles = self._remaining[:page_size]
+        self._remaining = self._remaining[page_size:]
+        self.Continue = int(bool(self._remaining))
+        self._com.record_fetch(len(self._candles))
+
+    def GetHeaderValue(self, index):
+        if index != 3:
+            raise FakeComError(f'Unsupported header {index}')
+        return len(self._candles)
+
+    def GetDataValue(self, field, index):
+        return self._candles[index][field]
+
+
+class _FakeCpTdUtil:
+    AccountNumber = ['00000000']
+
+    def TradeInit(self, unused_flag):
+        return 0
+
+    def GoodsList(self, unused_account, unused_filter):
+        return ('01',)
+
+
+class _FakeCpTd0311(_FakeDib):
+    def _on_request(self):
+        self._com.record_order(dict(self._inputs))
+
+
+class FakeComBackend(cybos_wrapper_service.ComBackend):
+    """Pure Python COM runtime serving fake Cybos objects.
+
+    Args:
+        dispatch_latency: simulated latency of each dispatch in seconds.
+        request_latency: simulated latency of each request in seconds.
+        failure_rate: ratio of requests to fail with request limit exceeded.
+        num_candles: number of candles of each code. Call `advance` to add
+            new candles.
+        page_size: max number of candles of each chart request. Cybos
+            returns more of them on continued requests.
+        order_latency: simulated extra latency of each order in seconds.
+    """
+
+    errors = (FakeComError,)
+
+    _CLASSES = {
+        'CpUtil.CpCybos': lambda com: _FakeCpCybos(),
+        'CpUtil.CpCodeMgr': lambda com: _FakeCpCodeMgr(),
+        'CpSysDib.StockChart': _FakeStockChart,
+        'CpTrade.CpTdUtil': lambda com: _FakeCpTdUtil(),
+        'CpTrade.CpTd0311': _FakeCpTd0311,
+    }
+
+    def __init__(self,
+                 dispatch_latency: float = 0.005,
+                 request_latency: float = 0.02,
+                 failure_rate: float = 0.,
+                 num_candles: int = 5000,
+                 page_size: int = 2856,
+                 order_latency: float = 0.):
+        self._dispatch_latency = dispatch_latency
+        self._request_latency = request_latency
+        self._failure_rate = failure_rate
+        self._num_candles = num_candles
+        self.page_size = page_size
+        self._order_latency = order_latency
+        self._candles = {}
+        self._lock = threading.Lock()
+        self.initialize_count = 0
+        self.dispatch_count = 0
+        self.request_count = 0
+        self.fetched_candles = 0
+        self.orders = []
+
+    def initialize(self):
+        with self._lock:
+            self.initialize_count += 1
+
+    def uninitialize(self):
+        pass
+
+    def dispatch(self, prog_id):
+        time.sleep(self._dispatch_latency)
+        with self._lock:
+            self.dispatch_count += 1
+        return self._CLASSES[prog_id](self)
+
+    def simulate_request(self) -> bool:
+        """Returns False if the request should fail."""
+        time.sleep(self._request_latency)
+        with self._lock:
+            self.request_count += 1
+        return random.random() >= self._failure_rate
+
+    def advance(self, num_candles: int = 1):
+        """Closes `num_candles` new candles of every code."""
+        with self._lock:
+            self._num_candles += num_candles
+
+    def candles(self, code: str):
+        """Returns candles of `code` closed so far in ascending order."""
+        with self._lock:
+            num_candles = self._num_candles
+            candles = self._candles.get(code)
+            if candles is None or len(candles) < num_candles:
+                # Generate ahead not to regenerate on every advance.
+                candles = self._candles[code] = fake_candles(
+                    code, num_candles + 1000)
+        return candles[:num_candles]
+
+    def record_fetch(self, num_candles: int):
+        with self._lock:
+            self.fetched_candles += num_candles
+
+    def record_order(self, inputs):
+        time.sleep(self._order_latency)
+        with self._lock:
+            self.orders.append(inputs)
+
+
+# (timestamp_us, code, price, volume, ask_price, bid_price)
+Tick = Tuple[int, str, int, int, int, int]
+
+
+def synthetic_ticks(codes: Sequence[str], num_ticks: int,
+                    interval_us: int = 1000) -> List[Tick]:
+    """Returns random walk ticks of `codes` in round robin."""
+    rng = random.Random(0)
+    prices = {code: rng.randint(1_000, 100_000) for code in codes}
+    ticks = []
+    for i in range(num_ticks):
+        code = codes[i % len(codes)]
+        price = prices[code] = max(
+            1, int(prices[code] * (1 + rng.gauss(0, 0.001))))
+        ticks.append((i * interval_us, code, price, rng.randint(1, 1000),
+                      price + 1, price - 1))
+    return ticks
+
+
+def load_ticks(path: str) -> List[Tick]:
+    with open(path) as f:
+        return [(int(row['Timestamp']), row['Code'], int(row['Price']),
+                 int(row['Volume']), int(row['AskPrice']),
+                 int(row['BidPrice'])) for row in csv.DictReader(f)]
+
+
+class ReplayFeed(market_feed.Feed):
+    """Realtime feed replaying ticks.
+
+    Intervals between ticks are kept (scaled by `speed`) and timestamps of
+    events are the wall clock time of replay.
+
+    Args:
+        ticks: ticks in ascending order of timestamp.
+        speed: replay speed. 0 replays as fast as possible.
+        loop: replay ticks again from the start when done.
+    """
+
+    def __init__(self, ticks: Sequence[Tick], speed: float = 1.,
+                 loop: bool = False):
+        self._ticks = ticks
+        self._speed = speed
+        self._loop = loop
+        self._publish = None
+        self._codes = frozenset()
+        self._stopped = threading.Event()
+        self.done = threading.Event()
+        self.published = 0
+
+    def start(self, publish):
+        self._publish = publish
+
+    def set_codes(self, codes):
+        self._codes = frozenset(codes)
+
+    @property
+    def codes(self):
+        return self._codes
+
+    def play(self):
+        """Starts to replay ticks in background."""
+        threading.Thread(target=self._replay, name='replay_feed',
+                         daemon=True).start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def _replay(self):
+        while not self._stopped.is_set():
+            started = time.monotonic()
+            first_us = self._ticks[0][0]
+            for timestamp_us, code, price, volume, ask, bid in self._ticks:
+                if self._stopped.is_set():
+                    break
+                if self._speed:
+                    delay = (started +
+                             (timestamp_us - first_us) / 1e6 / self._speed -
+                             time.monotonic())
+                    if delay > 0:
+                        time.sleep(delay)
+                if code not in self._codes:
+                    continue
+                now_us = market_feed.now_us()
+                self._publish(
+                    deep_trader_pb2.MarketEvent(
+                        code=code,
+                        timestamp_us=now_us,
+                        trade=deep_trader_pb2.Trade(price=price,
+                                                    volume=volume)))
+                self._publish(
+                    deep_trader_pb2.MarketEvent(
+                        code=code,
+                        timestamp_us=now_us,
+                        quote=deep_trader_pb2.Quote(ask_price=ask,
+                                                    bid_price=bid)))
+                self.published += 2
+            if not self._loop:
+                break
+        self.done.set()
+
+
+def main(unused_args):
+    com = FakeComBackend(FLAGS.dispatch_latency_ms / 1000,
+                         FLAGS.latency_ms / 1000, FLAGS.failure_rate)
+    if FLAGS.ticks_file:
+        ticks = load_ticks(FLAGS.ticks_file)
+    else:
+        ticks = synthetic_ticks(['A005930', 'A000660', 'A035420'], 10_000)
+    feed = ReplayFeed(ticks, FLAGS.replay_speed, loop=True)
+    hub = market_feed.FeedHub(feed, FLAGS.feed_bar_minutes,
+                              FLAGS.subscriber_queue_size)
+    hub.start()
+    feed.play()
+
+    scheduler = cybos_wrapper_service.request_scheduler_from_flags()
+    servicer = cybos_wrapper_service.Cybos5WrapperService(
+        com, scheduler, FLAGS.liveness_ttl, FLAGS.reuse_cybos_sessions,
+        cybos_wrapper_service.candle_cache_from_flags(), FLAGS.max_quota_wait,
+        hub)
+    cybos_wrapper_service.log_metrics_periodically(scheduler,
+                                                   FLAGS.metrics_log_interval,
+                                                   servicer.metrics)
+    cybos_wrapper_service.serve_metrics_from_flags(scheduler, servicer.metrics)
+    server, port = cybos_wrapper_service.serve(servicer, FLAGS.port,
+                                               FLAGS.max_workers,
+                                               servicer.metrics)
+    logging.info('Fake Cybos wrapping server has started on port %d', port)
+    try:
+        server.wait_for_termination()
+    finally:
+        hub.stop()
+
+
+if __name__ == '__main__':
+    app.run(main)
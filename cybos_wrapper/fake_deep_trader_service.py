@@ -0,0 +1,86 @@
+"""Fake `DeepTrader` servicer to test clients of Cybos wrapper service.
+
+Fails calls as scripted and records the calls and the deadline of each, so
+that retries and deadlines of clients can be checked without Cybos.
+"""
+
+import collections
+from concurrent import futures
+import threading
+import time
+from typing import Sequence, Tuple
+
+import grpc
+
+import deep_trader_pb2
+import deep_trader_pb2_grpc
+
+
+class FakeDeepTraderServicer(deep_trader_pb2_grpc.DeepTraderServicer):
+    """Fails the first `failures` calls of each method with `code`.
+
+    Args:
+        failures: number of calls of each method to fail.
+        code: status code of the failed calls.
+        latency: seconds each call takes.
+        failed_codes: stock codes whose calls always fail with `code`.
+    """
+
+    def __init__(self,
+                 failures: int = 0,
+                 code: grpc.StatusCode = grpc.StatusCode.UNAVAILABLE,
+                 latency: float = 0.,
+                 failed_codes: Sequence[str] = ()):
+        self._failures = failures
+        self._code = code
+        self._latency = latency
+        self._failed_codes = set(failed_codes)
+        self._lock = threading.Lock()
+        self.calls = collections.Counter()
+        self.time_remaining = []
+        self.orders = []
+
+    def _simulate(self, method: str, request, context):
+        with self._lock:
+            self.calls[method] += 1
+            attempt = self.calls[method]
+            self.time_remaining.append(context.time_remaining())
+        time.sleep(self._latency)
+        if attempt <= self._failures or request.code in self._failed_codes:
+            context.abort(self._code, 'Injected failure.')
+
+    def GetCandle(self, request, context):
+        self._simulate('GetCandle', request, context)
+        return deep_trader_pb2.GetCandleResponse(code=request.code,
+                                                 name=f'FAKE{request.code}')
+
+    def GetCandles(self, request, context):
+        with self._lock:
+            self.calls['GetCandles'] += 1
+            self.time_remaining.append(context.time_remaining())
+        # Failed codes are reported as the service does.
+        for candle_request in request.requests:
+            if candle_request.code in self._failed_codes:
+                yield deep_trader_pb2.GetCandleResponse(
+                    code=candle_request.code,
+                    error_code=self._code.value[0],
+                    error_message='Injected failure.')
+            else:
+                yield deep_trader_pb2.GetCandleResponse(
+                    code=candle_request.code,
+                    name=f'FAKE{candle_request.code}')
+
+    def SubmitOrder(self, request, context):
+        self._simulate('SubmitOrder', request, context)
+        with self._lock:
+            self.orders.append(request)
+        return deep_trader_pb2.SubmitOrderResponse()
+
+
+def serve(servicer: FakeDeepTraderServicer) -> Tuple[grpc.Server, str]:
+    """Starts a server of `servicer` and returns (server, address)."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=4))
+    deep_trader_pb2_grpc.add_DeepTraderServicer_to_server(servicer, server)
+    port = server.add_insecure_port('localhost:0')
+    server.start()
+    return server, f'localhost:{port}'
@@ -0,0 +1,372 @@
+"""Realtime market events of Cybos fanned out to subscribers.
+
+One upstream feed is subscribed to the union of codes of all subscribers.
+`FeedHub` builds bars from the trades of the feed and pushes trades,
+quotes and bar closes to a bounded queue of each subscriber. A subscriber
+which can't keep up is dropped instead of blocking the others.
+"""
+
+import asyncio
+import collections
+import datetime
+import queue
+import threading
+import time
+from typing import Callable, Iterable, Optional, Set
+
+from absl import logging
+try:
+    import pythoncom
+    from win32com import client as win32client
+except ImportError:
+    pythoncom = None
+    win32client = None
+
+import deep_trader_pb2
+
+Publish = Callable[[deep_trader_pb2.MarketEvent], None]
+
+
+def now_us() -> int:
+    return int(time.time() * 1_000_000)
+
+
+class BarBuilder:
+    """Builds bars of a code from its trades."""
+
+    def __init__(self, code: str, bar_minutes: int):
+        self._code = code
+        self._bar_us = bar_minutes * 60 * 1_000_000
+        self._end_us = None
+        self._bar = None
+
+    def _close(self) -> deep_trader_pb2.MarketEvent:
+        # Cybos labels a minute bar by its end time.
+        end = datetime.datetime.fromtimestamp(self._end_us / 1_000_000)
+        self._bar.date = int(end.strftime('%Y%m%d'))
+        self._bar.time = end.hour * 100 + end.minute
+        event = deep_trader_pb2.MarketEvent(code=self._code,
+                                            timestamp_us=self._end_us,
+                                            bar=self._bar)
+        self._end_us = None
+        self._bar = None
+        return event
+
+    def add(self, timestamp_us: int, price: int,
+            volume: int) -> Optional[deep_trader_pb2.MarketEvent]:
+        """Adds a trade and returns the bar closed by it if any."""
+        closed = None
+        if self._end_us is not None and timestamp_us >= self._end_us:
+            closed = self._close()
+        if self._bar is None:
+            self._end_us = (timestamp_us // self._bar_us + 1) * self._bar_us
+            self._bar = deep_trader_pb2.CandleData(open=price,
+                                                   high=price,
+                                                   low=price,
+                                                   close=price,
+                                                   volume=volume)
+        else:
+            self._bar.high = max(self._bar.high, price)
+            self._bar.low = min(self._bar.low, price)
+            self._bar.close = price
+            self._bar.volume += volume
+        return closed
+
+    def close_due(self,
+                  timestamp_us: int) -> Optional[deep_trader_pb2.MarketEvent]:
+        """Returns the bar ended by `timestamp_us` without any new trade."""
+        if self._end_us is not None and timestamp_us >= self._end_us:
+            return self._close()
+        return None
+
+
+class Subscription:
+    """Events of subscribed codes buffered for one subscriber."""
+
+    def __init__(self, codes: Iterable[str], queue_size: int):
+        self.codes = frozenset(codes)
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._closed = threading.Event()
+        self.overflowed = False
+
+    def put(self, event: deep_trader_pb2.MarketEvent):
+        if self.overflowed:
+            return
+        try:
+            self._queue.put_nowait(event)
+        except queue.Full:
+            logging.warning('Subscriber of %d codes is dropped for overflow.',
+                            len(self.codes))
+            self.overflowed = True
+            self.close()
+
+    def close(self):
+        self._closed.set()
+
+    def __iter__(self):
+        # Overflowed subscription stops at once, closed one is drained.
+        while not self.overflowed and not (self._closed.is_set() and
+                                           self._queue.empty()):
+            try:
+                yield self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+
+
+class AsyncSubscription:
+    """`Subscription` consumed by a coroutine on `loop`.
+
+    Events are handed over to the loop, so that many subscribers are
+    served without a thread for each of them.
+    """
+
+    def __init__(self, codes: Iterable[str], queue_size: int,
+                 loop: asyncio.AbstractEventLoop):
+        self.codes = frozenset(codes)
+        self._queue_size = queue_size
+        self._loop = loop
+        # Unbounded to always fit the end of stream. Size is checked on put.
+        self._queue = asyncio.Queue()
+        self._closed = False
+        self.overflowed = False
+
+    def put(self, event: deep_trader_pb2.MarketEvent):
+        if self._closed:
+            return
+        try:
+            self._loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop is closed.
+            self._closed = True
+
+    def _put(self, event):
+        if self._closed:
+            return
+        if self._queue.qsize() >= self._queue_size:
+            logging.warning('Subscriber of %d codes is dropped for overflow.',
+                            len(self.codes))
+            self.overflowed = True
+            self._close()
+            return
+        self._queue.put_nowait(event)
+
+    def close(self):
+        try:
+            self._loop.call_soon_threadsafe(self._close)
+        except RuntimeError:
+            self._closed = True
+
+    def _close(self):
+        if not self._closed:
+            self._closed = True
+            self._queue.put_nowait(None)
+
+    async def __aiter__(self):
+        # Overflowed subscription stops at once, closed one is drained.
+        while not self.overflowed:
+            event = await self._queue.get()
+            if event is None:
+                return
+            yield event
+
+
+class Feed:
+    """Upstream feed of realtime market events."""
+
+    def start(self, publish: Publish):
+        """Starts to call `publish` on every event."""
+        raise NotImplementedError
+
+    def set_codes(self, codes: Set[str]):
+        """Changes codes to receive events of."""
+        raise NotImplementedError
+
+    def stop(self):
+        raise NotImplementedError
+
+
+class FeedHub:
+    """Fans out events of one upstream feed to subscribers.
+
+    Args:
+        feed: upstream feed.
+        bar_minutes: length of bars to build from trades.
+        queue_size: max number of events buffered for each subscriber.
+    """
+
+    def __init__(self, feed: Feed, bar_minutes: int = 1,
+                 queue_size: int = 10_000):
+        self._feed = feed
+        self._bar_minutes = bar_minutes
+        self._queue_size = queue_size
+        self._lock = threading.Lock()
+        self._subscriptions = collections.defaultdict(set)
+        self._bars = {}
+        self._stopped = threading.Event()
+        self._bar_closer = threading.Thread(target=self._close_due_bars,
+                                            name='bar_closer',
+                                            daemon=True)
+
+    def start(self):
+        self._feed.start(self.publish)
+        self._bar_closer.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._feed.stop()
+        with self._lock:
+            subscriptions = set().union(*self._subscriptions.values())
+        for subscription in subscriptions:
+            subscription.close()
+
+    def subscribe(self, codes: Iterable[str]) -> Subscription:
+        subscription = Subscription(codes, self._queue_size)
+        self._register(subscription)
+        return subscription
+
+    def subscribe_async(self, codes: Iterable[str]) -> AsyncSubscription:
+        """Subscribe from a coroutine running on the event loop."""
+        subscription = AsyncSubscription(codes, self._queue_size,
+                                         asyncio.get_running_loop())
+        self._register(subscription)
+        return subscription
+
+    def _register(self, subscription):
+        with self._lock:
+            for code in subscription.codes:
+                self._subscriptions[code].add(subscription)
+            codes = set(self._subscriptions)
+        self._feed.set_codes(codes)
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            for code in subscription.codes:
+                subscriptions = self._subscriptions.get(code)
+                if subscriptions is None:
+                    continue
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[code]
+                    self._bars.pop(code, None)
+            codes = set(self._subscriptions)
+        self._feed.set_codes(codes)
+
+    def _fan_out(self, code: str, events):
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(code, ()))
+        for subscription in subscriptions:
+            for event in events:
+                subscription.put(event)
+
+    def publish(self, event: deep_trader_pb2.MarketEvent):
+        """Called by the feed on each event."""
+        if event.code not in self._subscriptions:
+            return
+        events = [event]
+        if event.HasField('trade'):
+            with self._lock:
+                builder = self._bars.get(event.code)
+                if builder is None:
+                    builder = self._bars[event.code] = BarBuilder(
+                        event.code, self._bar_minutes)
+                closed = builder.add(event.timestamp_us, event.trade.price,
+                                     event.trade.volume)
+            if closed is not None:
+                # Bar close goes before the trade of the next bar.
+                events.insert(0, closed)
+        self._fan_out(event.code, events)
+
+    def _close_due_bars(self):
+        # Close bars of codes without trades after the end of the bar.
+        while not self._stopped.wait(0.2):
+            timestamp_us = now_us()
+            with self._lock:
+                closed = [(code, builder.close_due(timestamp_us))
+                          for code, builder in self._bars.items()]
+            for code, event in closed:
+                if event is not None:
+                    self._fan_out(code, [event])
+
+
+class CybosFeed(Feed):
+    """Realtime trades and quotes of Cybos `DsCbo1.StockCur`.
+
+    COM objects and their events live on a dedicated thread pumping COM
+    messages. Codes are changed by commands to the thread.
+    """
+
+    def __init__(self):
+        if pythoncom is None:
+            raise RuntimeError('pywin32 is required to access Cybos.')
+        self._publish = None
+        self._commands = queue.Queue()
+        self._thread = threading.Thread(target=self._run,
+                                        name='cybos_feed',
+                                        daemon=True)
+
+    def start(self, publish):
+        self._publish = publish
+        self._thread.start()
+
+    def set_codes(self, codes):
+        self._commands.put(set(codes))
+
+    def stop(self):
+        self._commands.put(None)
+        self._thread.join()
+
+    def _on_received(self, stock_cur):
+        code = stock_cur.GetHeaderValue(0)
+        timestamp_us = now_us()
+        self._publish(
+            deep_trader_pb2.MarketEvent(
+                code=code,
+                timestamp_us=timestamp_us,
+                trade=deep_trader_pb2.Trade(
+                    price=stock_cur.GetHeaderValue(13),
+                    volume=stock_cur.GetHeaderValue(17))))
+        self._publish(
+            deep_trader_pb2.MarketEvent(
+                code=code,
+                timestamp_us=timestamp_us,
+                quote=deep_trader_pb2.Quote(
+                    ask_price=stock_cur.GetHeaderValue(7),
+                    bid_price=stock_cur.GetHeaderValue(8))))
+
+    def _subscribe(self, code):
+        feed = self
+
+        class _Handler:
+            def OnReceived(self):
+                feed._on_received(stock_cur)
+
+        stock_cur = win32client.Dispatch('DsCbo1.StockCur')
+        win32client.WithEvents(stock_cur, _Handler)
+        stock_cur.SetInputValue(0, code)
+        stock_cur.Subscribe()
+        return stock_cur
+
+    def _run(self):
+        pythoncom.CoInitialize()
+        subscribed = {}
+        try:
+            while True:
+                try:
+                    codes = self._commands.get_nowait()
+                except queue.Empty:
+                    pythoncom.PumpWaitingMessages()
+                    time.sleep(0.001)
+                    continue
+                if codes is None:
+                    break
+                for code in set(subscribed) - codes:
+                    subscribed.pop(code).Unsubscribe()
+                for code in codes - set(subscribed):
+                    subscribed[code] = self._subscribe(code)
+                logging.info('Subscribing realtime events of %d codes.',
+                             len(subscribed))
+        finally:
+            for stock_cur in subscribed.values():
+                stock_cur.Unsubscribe()
+            pythoncom.CoUninitialize()
@@ -0,0 +1,160 @@
+"""Scheduler of Cybos requests under its request quotas.
+
+Cybos limits the number of requests in a time window separately for
+queries (charts, quotes, ...) and for orders. Each of them is guarded by a
+token bucket, and requests waiting for a token are served by priority so
+that sell orders go first and bulk chart downloads go last.
+"""
+
+import collections
+import heapq
+import itertools
+import threading
+import time
+from typing import Dict
+
+import numpy as np
+
+# Priorities of requests. Lower goes first.
+SELL_ORDER = 0
+BUY_ORDER = 1
+CANDLE = 2
+BULK_CANDLE = 3
+
+PRIORITY_NAMES = {
+    SELL_ORDER: 'sell_order',
+    BUY_ORDER: 'buy_order',
+    CANDLE: 'candle',
+    BULK_CANDLE: 'bulk_candle',
+}
+
+QUERY = 'query'
+ORDER = 'order'
+
+_QUOTA_OF_PRIORITY = {
+    SELL_ORDER: ORDER,
+    BUY_ORDER: ORDER,
+    CANDLE: QUERY,
+    BULK_CANDLE: QUERY,
+}
+
+# Number of recent wait times to compute percentiles.
+_NUM_WAIT_SAMPLES = 1000
+
+
+class QuotaTimeout(Exception):
+    pass
+
+
+class TokenBucket:
+    """Token bucket which never exceeds `limit` requests in `period`.
+
+    Up to `burst` requests are allowed at once, and tokens are refilled at
+    (limit - burst) / period per second, so that any window of `period`
+    seconds has at most `limit` requests.
+    """
+
+    def __init__(self, limit: int, period: float, burst: int):
+        if not 0 < burst < limit:
+            raise ValueError(f'burst should be in (0, {limit}): {burst}')
+        self._capacity = burst
+        self._rate = (limit - burst) / period
+        self.tokens = float(burst)
+        self._updated_at = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self._capacity,
+                          self.tokens + (now - self._updated_at) * self._rate)
+        self._updated_at = now
+
+    def time_to_token(self, now: float) -> float:
+        """Returns seconds until a token is available."""
+        self._refill(now)
+        return max(0., (1 - self.tokens) / self._rate)
+
+    def take(self):
+        self.tokens -= 1
+
+
+class RequestScheduler:
+    """Grants Cybos quota to requests by priority.
+
+    Args:
+        buckets: token bucket of each quota, `QUERY` and `ORDER`.
+    """
+
+    def __init__(self, buckets: Dict[str, TokenBucket]):
+        self._buckets = buckets
+        self._cond = threading.Condition()
+        self._queues = {quota: [] for quota in buckets}
+        self._sequence = itertools.count()
+        self._waits = {
+            priority: collections.deque(maxlen=_NUM_WAIT_SAMPLES)
+            for priority in PRIORITY_NAMES
+        }
+        self._granted = collections.Counter()
+        self._timeouts = collections.Counter()
+
+    def acquire(self, priority: int, timeout: float) -> float:
+        """Waits for a token of the quota of `priority`.
+
+        Returns:
+            seconds waited.
+
+        Raises:
+            QuotaTimeout: if no token is granted in `timeout` seconds.
+        """
+        quota = _QUOTA_OF_PRIORITY[priority]
+        bucket = self._buckets[quota]
+        queue = self._queues[quota]
+        started = time.monotonic()
+        deadline = started + timeout
+        waiter = (priority, next(self._sequence))
+        with self._cond:
+            heapq.heappush(queue, waiter)
+            while True:
+                now = time.monotonic()
+                wait = deadline - now
+                if queue[0] == waiter:
+                    wait_for_token = bucket.time_to_token(now)
+                    if wait_for_token <= 0:
+                        bucket.take()
+                        heapq.heappop(queue)
+                        # Let the next waiter check the bucket.
+                        self._cond.notify_all()
+                        waited = now - started
+                        self._waits[priority].append(waited)
+                        self._granted[priority] += 1
+                        return waited
+                    wait = min(wait, wait_for_token)
+                if now >= deadline:
+                    queue.remove(waiter)
+                    heapq.heapify(queue)
+                    self._cond.notify_all()
+                    self._timeouts[priority] += 1
+                    raise QuotaTimeout(
+                        f'No {quota} quota in {timeout:.1f}s for '
+                        f'{PRIORITY_NAMES[priority]}.')
+                self._cond.wait(wait)
+
+    def metrics(self) -> Dict[str, Dict[str, float]]:
+        """Returns queue depth of each quota and wait times by priority."""
+        with self._cond:
+            metrics = {}
+            for quota, queue in self._queues.items():
+                metrics[quota] = {
+                    'queue_depth': len(queue),
+                    'tokens': self._buckets[quota].tokens,
+                }
+            for priority, waits in self._waits.items():
+                if not waits and not self._timeouts[priority]:
+                    continue
+                waits_ms = np.array(waits) * 1000 if waits else np.zeros(1)
+                metrics[PRIORITY_NAMES[priority]] = {
+                    'granted': self._granted[priority],
+                    'timeouts': self._timeouts[priority],
+                    'wait_p50_ms': float(np.percentile(waits_ms, 50)),
+                    'wait_p95_ms': float(np.percentile(waits_ms, 95)),
+                    'wait_max_ms': float(waits_ms.max()),
+                }
+            return metrics
@@ -0,0 +1,421 @@
+"""Metrics of RPCs of Cybos wrapper service and its clients.
+
+Interceptors record latency, payload sizes and status codes of each method
+into `RpcMetrics`. The service also records stages inside RPCs, e.g. time
+in Cybos COM calls and time waiting for quota or a worker thread, so that
+latency of an RPC can be split into queueing and Cybos.
+
+Metrics are logged periodically and served as JSON by `serve_metrics`:
+
+    curl localhost:11232/metrics
+"""
+
+import asyncio
+import bisect
+import collections
+import contextlib
+from http import server as http_server
+import json
+import threading
+import time
+from typing import Callable, Dict, Sequence
+
+from absl import logging
+import grpc
+
+# Upper bounds of histogram buckets of latency in milliseconds.
+LATENCY_BUCKETS_MS = (1, 2, 3, 5, 7, 10, 15, 20, 30, 50, 70, 100, 150, 200,
+                      300, 500, 700, 1_000, 1_500, 2_000, 3_000, 5_000, 10_000,
+                      30_000, 60_000)
+# Upper bounds of histogram buckets of payload size in bytes.
+SIZE_BUCKETS = (256, 1 << 10, 4 << 10, 16 << 10, 64 << 10, 256 << 10,
+                1 << 20, 4 << 20, 16 << 20)
+
+
+class Histogram:
+    """Histogram with fixed buckets. Percentiles are bucket upper bounds."""
+
+    def __init__(self, bounds: Sequence[float]):
+        self._bounds = bounds
+        # The last bucket counts values above all bounds.
+        self._counts = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.sum = 0.
+        self.max = 0.
+
+    def observe(self, value: float):
+        self._counts[bisect.bisect_left(self._bounds, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        rank = q / 100 * self.count
+        seen = 0
+        for bound, count in zip(self._bounds, self._counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self) -> Dict:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else 0.,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'buckets': dict(
+                zip([str(bound) for bound in self._bounds] + ['inf'],
+                    self._counts)),
+        }
+
+
+class _MethodMetrics:
+    def __init__(self):
+        self.latency_ms = Histogram(LATENCY_BUCKETS_MS)
+        self.request_bytes = Histogram(SIZE_BUCKETS)
+        self.response_bytes = Histogram(SIZE_BUCKETS)
+        self.codes = collections.Counter()
+
+
+class RpcMetrics:
+    """Thread-safe metrics of RPC methods and stages inside them."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._methods = collections.defaultdict(_MethodMetrics)
+        self._stages = collections.defaultdict(
+            lambda: Histogram(LATENCY_BUCKETS_MS))
+
+    def record(self, method: str, latency: float, code: grpc.StatusCode,
+               request_bytes: int, response_bytes: int):
+        """Records an RPC which took `latency` seconds."""
+        with self._lock:
+            metrics = self._methods[method]
+            metrics.latency_ms.observe(latency * 1000)
+            metrics.request_bytes.observe(request_bytes)
+            metrics.response_bytes.observe(response_bytes)
+            metrics.codes[code.name] += 1
+
+    def observe_stage(self, stage: str, seconds: float):
+        with self._lock:
+            self._stages[stage].observe(seconds * 1000)
+
+    @contextlib.contextmanager
+    def stage(self, stage: str):
+        """Records time of the block as `stage`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - started)
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {
+                'methods': {
+                    method: {
+                        'latency_ms': metrics.latency_ms.snapshot(),
+                        'request_bytes': metrics.request_bytes.snapshot(),
+                        'response_bytes': metrics.response_bytes.snapshot(),
+                        'codes': dict(metrics.codes),
+                    } for method, metrics in self._methods.items()
+                },
+                'stages_ms': {
+                    stage: histogram.snapshot()
+                    for stage, histogram in self._stages.items()
+                },
+            }
+
+    def summary(self) -> str:
+        """Returns one line per method and stage to log."""
+        with self._lock:
+            lines = []
+            for method, metrics in sorted(self._methods.items()):
+                latency = metrics.latency_ms
+                errors = {
+                    code: count
+                    for code, count in metrics.codes.items()
+                    if code != 'OK'
+                }
+                lines.append(
+                    f'{method}: {latency.count} calls, '
+                    f'p50 {latency.percentile(50):.0f}ms, '
+                    f'p95 {latency.percentile(95):.0f}ms, '
+                    f'p99 {latency.percentile(99):.0f}ms, '
+                    f'response {metrics.response_bytes.sum / 1024:.0f}KiB'
+                    f', errors {errors}')
+            for stage, histogram in sorted(self._stages.items()):
+                lines.append(f'{stage}: {histogram.count} times, '
+                             f'mean {histogram.sum / histogram.count:.1f}ms, '
+                             f'p95 {histogram.percentile(95):.0f}ms')
+            return '\n'.join(lines)
+
+
+def _method_name(full_method) -> str:
+    # '/DeepTrader/GetCandle' -> 'GetCandle'. asyncio clients give bytes.
+    if isinstance(full_method, bytes):
+        full_method = full_method.decode()
+    return full_method.rsplit('/', 1)[-1]
+
+
+def _byte_size(message) -> int:
+    return message.ByteSize() if message is not None else 0
+
+
+# asyncio servers give status codes as int.
+_STATUS_CODES = {code.value[0]: code for code in grpc.StatusCode}
+
+
+def _record_served(metrics, method, started, context, request,
+                   response_bytes, failed):
+    code = _STATUS_CODES.get(context.code(), context.code())
+    code = code or grpc.StatusCode.OK
+    if failed and code == grpc.StatusCode.OK:
+        code = grpc.StatusCode.UNKNOWN
+    metrics.record(method,
+                   time.perf_counter() - started, code, _byte_size(request),
+                   response_bytes)
+
+
+class MetricsServerInterceptor(grpc.ServerInterceptor):
+    """Records unary and server streaming RPCs of a server."""
+
+    def __init__(self, metrics: RpcMetrics):
+        self._metrics = metrics
+
+    def intercept_service(self, continuation, handler_call_details):
+        handler = continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details.method)
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                self._unary(method, handler.unary_unary),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer)
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                self._stream(method, handler.unary_stream),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer)
+        return handler
+
+    def _unary(self, method, behavior):
+
+        def _behavior(request, context):
+            started = time.perf_counter()
+            response = None
+            failed = True
+            try:
+                response = behavior(request, context)
+                failed = False
+                return response
+            finally:
+                _record_served(self._metrics, method, started, context,
+                               request, _byte_size(response), failed)
+
+        return _behavior
+
+    def _stream(self, method, behavior):
+
+        def _behavior(request, context):
+            started = time.perf_counter()
+            response_bytes = 0
+            failed = True
+            try:
+                for response in behavior(request, context):
+                    response_bytes += _byte_size(response)
+                    yield response
+                failed = False
+            except GeneratorExit:
+                # The client went away.
+                context.set_code(grpc.StatusCode.CANCELLED)
+                raise
+            finally:
+                _record_served(self._metrics, method, started, context,
+                               request, response_bytes, failed)
+
+        return _behavior
+
+
+class AsyncMetricsServerInterceptor(grpc.aio.ServerInterceptor):
+    """Records unary and server streaming RPCs of an asyncio server."""
+
+    def __init__(self, metrics: RpcMetrics):
+        self._metrics = metrics
+
+    async def intercept_service(self, continuation, handler_call_details):
+        handler = await continuation(handler_call_details)
+        if handler is None:
+            return None
+        method = _method_name(handler_call_details.method)
+        if handler.unary_unary:
+            return grpc.unary_unary_rpc_method_handler(
+                self._unary(method, handler.unary_unary),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer)
+        if handler.unary_stream:
+            return grpc.unary_stream_rpc_method_handler(
+                self._stream(method, handler.unary_stream),
+                request_deserializer=handler.request_deserializer,
+                response_serializer=handler.response_serializer)
+        return handler
+
+    def _unary(self, method, behavior):
+
+        async def _behavior(request, context):
+            started = time.perf_counter()
+            response = None
+            failed = True
+            try:
+                response = await behavior(request, context)
+                failed = False
+                return response
+            finally:
+                _record_served(self._metrics, method, started, context,
+                               request, _byte_size(response), failed)
+
+        return _behavior
+
+    def _stream(self, method, behavior):
+
+        async def _behavior(request, context):
+            started = time.perf_counter()
+            response_bytes = 0
+            failed = True
+            try:
+                async for response in behavior(request, context):
+                    response_bytes += _byte_size(response)
+                    yield response
+                failed = False
+            except (GeneratorExit, asyncio.CancelledError):
+                context.set_code(grpc.StatusCode.CANCELLED)
+                raise
+            finally:
+                _record_served(self._metrics, method, started, context,
+                               request, response_bytes, failed)
+
+        return _behavior
+
+
+class MetricsClientInterceptor(grpc.UnaryUnaryClientInterceptor,
+                               grpc.UnaryStreamClientInterceptor):
+    """Records unary and server streaming calls of a client.
+
+    Sizes of streamed responses are not recorded, not to wrap the call.
+    """
+
+    def __init__(self, metrics: RpcMetrics):
+        self._metrics = metrics
+
+    def intercept_unary_unary(self, continuation, client_call_details,
+                              request):
+        started = time.perf_counter()
+        method = _method_name(client_call_details.method)
+        call = continuation(client_call_details, request)
+
+        def _on_done(future):
+            code = future.code()
+            response = future.result() if code == grpc.StatusCode.OK else None
+            self._metrics.record(method,
+                                 time.perf_counter() - started, code,
+                                 _byte_size(request), _byte_size(response))
+
+        call.add_done_callback(_on_done)
+        return call
+
+    def intercept_unary_stream(self, continuation, client_call_details,
+                               request):
+        started = time.perf_counter()
+        method = _method_name(client_call_details.method)
+        call = continuation(client_call_details, request)
+        call.add_callback(lambda: self._metrics.record(
+            method,
+            time.perf_counter() - started, call.code(), _byte_size(request),
+            0))
+        return call
+
+
+class AsyncMetricsUnaryUnaryInterceptor(grpc.aio.UnaryUnaryClientInterceptor):
+    """Records unary calls of an asyncio client."""
+
+    def __init__(self, metrics: RpcMetrics):
+        self._metrics = metrics
+
+    async def intercept_unary_unary(self, continuation, client_call_details,
+                                    request):
+        started = time.perf_counter()
+        call = await continuation(client_call_details, request)
+        response = None
+        try:
+            response = await call
+        except grpc.aio.AioRpcError:
+            # The caller gets the error by awaiting the call.
+            pass
+        self._metrics.record(_method_name(client_call_details.method),
+                             time.perf_counter() - started, await call.code(),
+                             _byte_size(request), _byte_size(response))
+        return call
+
+
+class AsyncMetricsUnaryStreamInterceptor(
+        grpc.aio.UnaryStreamClientInterceptor):
+    """Records server streaming calls of an asyncio client.
+
+    Sizes of streamed responses are not recorded, not to wrap the call.
+    """
+
+    def __init__(self, metrics: RpcMetrics):
+        self._metrics = metrics
+
+    async def intercept_unary_stream(self, continuation, client_call_details,
+                                     request):
+        started = time.perf_counter()
+        method = _method_name(client_call_details.method)
+        call = await continuation(client_call_details, request)
+
+        async def _record(call, latency):
+            # Code of the done call is available without waiting.
+            self._metrics.record(method, latency, await call.code(),
+                                 _byte_size(request), 0)
+
+        call.add_done_callback(lambda call: asyncio.ensure_future(
+            _record(call,
+                    time.perf_counter() - started)))
+        return call
+
+
+def serve_metrics(port: int, sources: Dict[str, Callable[[], Dict]],
+                  host: str = '127.0.0.1') -> http_server.HTTPServer:
+    """Serves JSON of {name: source()} at /metrics in background.
+
+    Returns the HTTP server. Its bound port is `server.server_port`.
+    """
+
+    class _Handler(http_server.BaseHTTPRequestHandler):
+
+        def do_GET(self):
+            if self.path.rstrip('/') != '/metrics':
+                self.send_error(404)
+                return
+            metrics = {name: source() for name, source in sources.items()}
+            body = json.dumps(metrics, indent=2).encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logging.debug(fmt, *args)
+
+    server = http_server.ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever,
+                     name='metrics_server',
+                     daemon=True).start()
+    logging.info('Metrics are served on http://%s:%d/metrics', host,
+                 server.server_port)
+    return server
@@ -3,8 +3,7 @@ from absl import flags
 from absl import logging
 import grpc
 
-import deep_trader_pb2
-import deep_trader_pb2_grpc
+import cybos_client
 
 flags.DEFINE_string('host', '39.125.76.24', 'Host to connect.')
 flags.DEFINE_integer('port', 11231, 'Port to connect.')
@@ -15,15 +14,10 @@ FLAGS = flags.FLAGS
 def main(unused_args):
     logging.info('Cybor5 wrapping client has started on port %d', FLAGS.port)
     
-    channel = grpc.insecure_channel(f'{FLAGS.host}:{FLAGS.port}')
-    stub = deep_trader_pb2_grpc.DeepTraderStub(channel)
+    client = cybos_client.CybosClient(f'{FLAGS.host}:{FLAGS.port}')
 
     try:
-        response = stub.GetCandle(
-            deep_trader_pb2.GetCandleRequest(code='A005930',
-                                             cycle_type='m',
-                                             cycle=5,
-                                             count=720))
+        response = client.get_candle('A005930', 'm', 5, 720)
         print(f'Data count: {len(response.candle_data)}')
         print(f'Date: {response.candle_data[0].date}')
         print(f'Time: {response.candle_data[0].time}')
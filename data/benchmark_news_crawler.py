@@ -0,0 +1,65 @@
+"""Throughput benchmark of `download_news_data` against the fake server.
+
+Crawls `--num_codes` codes of `fake_news_server.FakeNewsServer` one page
+at a time and with `--num_workers` concurrent pages, then publishes a few
+news of each code and reruns to see how many pages an incremental crawl
+fetches.
+
+Example usage:
+
+    python benchmark_news_crawler.py --num_codes 4 --num_news 1000 \
+        --latency_ms 50 --num_workers 8 --requests_per_sec 100
+"""
+
+import os
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+
+import download_news_data
+import fake_news_server
+
+flags.DEFINE_integer('num_codes', 4, 'Number of codes to crawl.')
+
+FLAGS = flags.FLAGS
+
+
+def _crawl(server, codes, outdir, num_workers):
+    manifest = download_news_data._load_manifest(outdir)  # pylint: disable=protected-access
+    started = time.perf_counter()
+    with download_news_data.NaverNewsCrawler(
+            server.url, num_workers, FLAGS.requests_per_sec) as crawler:
+        num_news = sum(
+            download_news_data.crawl_code(crawler, code, FLAGS.max_page or
+                                          10_000, outdir, manifest)
+            for code in codes)
+    elapsed = time.perf_counter() - started
+    return (f'{crawler.page_count} pages, {num_news} new news in '
+            f'{elapsed:.2f}s, {crawler.page_count / elapsed:.1f} pages/s')
+
+
+def main(unused_args):
+    codes = [f'{i:06d}' for i in range(FLAGS.num_codes)]
+    server = fake_news_server.FakeNewsServer(FLAGS.num_news,
+                                             latency=FLAGS.latency_ms / 1000)
+    try:
+        with tempfile.TemporaryDirectory() as directory:
+            sequential, concurrent = (os.path.join(directory, name)
+                                      for name in ['sequential', 'concurrent'])
+            os.makedirs(sequential)
+            os.makedirs(concurrent)
+            print(f'sequential: {_crawl(server, codes, sequential, 1)}')
+            print(f'concurrent: '
+                  f'{_crawl(server, codes, concurrent, FLAGS.num_workers)}')
+            for code in codes:
+                server.add_news(code, 15)
+            print(f'incremental: '
+                  f'{_crawl(server, codes, concurrent, FLAGS.num_workers)}')
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,87 @@
+"""Throughput benchmark of `sentiment_client` against the fake service.
+
+Scores `--num_titles` titles of `fake_predict_service` with
+- new channel: a new channel and one blocking call for each title, as the
+  client did before.
+- pipelined: one channel and up to `--max_in_flight` concurrent calls.
+- cached: the same titles again, from the cache of the pipelined run.
+
+Example usage:
+
+    python benchmark_sentiment_client.py --num_titles 2000 \
+        --service_latency_ms 20 --max_in_flight 32
+"""
+
+import os
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+import grpc
+import numpy as np
+
+import fake_predict_service
+import sentiment_client
+import service_pb2
+import service_pb2_grpc
+
+flags.DEFINE_integer('num_titles', 2000, 'Number of titles to score.')
+flags.DEFINE_float('service_latency_ms', 20.,
+                   'Simulated latency of each call of the fake service.')
+flags.DEFINE_integer('max_in_flight', 32,
+                     'Maximum number of concurrent calls.')
+flags.DEFINE_integer('new_channel_titles', 200,
+                     'Number of titles to score with new channels.')
+
+FLAGS = flags.FLAGS
+
+
+def _score_with_new_channels(address, titles):
+    for title in titles:
+        with grpc.insecure_channel(address) as channel:
+            stub = service_pb2_grpc.PredictServiceStub(channel)
+            stub.Classify(service_pb2.ClassificationRequest(text=title),
+                          timeout=60)
+
+
+def _report(name, num_titles, num_calls, elapsed):
+    print(f'{name}: {num_titles} titles, {num_calls} calls in '
+          f'{elapsed:.2f}s, {num_titles / elapsed:.1f} titles/s')
+
+
+def main(unused_args):
+    titles = [f'fake news title {i}' for i in range(FLAGS.num_titles)]
+    servicer = fake_predict_service.FakePredictServicer(
+        FLAGS.service_latency_ms / 1000)
+    server, port = fake_predict_service.serve(
+        servicer, max_workers=FLAGS.max_in_flight)
+    address = f'localhost:{port}'
+    try:
+        # Fewer titles as it is slow.
+        started = time.perf_counter()
+        _score_with_new_channels(address, titles[:FLAGS.new_channel_titles])
+        _report('new channel', FLAGS.new_channel_titles,
+                FLAGS.new_channel_titles, time.perf_counter() - started)
+
+        with tempfile.TemporaryDirectory() as directory:
+            cache_path = os.path.join(directory, 'sentiment_cache.tsv')
+            for name in ['pipelined', 'cached']:
+                started = time.perf_counter()
+                with sentiment_client.SentimentClassifierClient(
+                        address,
+                        max_in_flight=FLAGS.max_in_flight,
+                        cache_path=cache_path) as client:
+                    scores = client.get_sentiment_scores(titles)
+                elapsed = time.perf_counter() - started
+                # Scores are float32 in responses.
+                assert np.allclose(scores, [
+                    fake_predict_service.fake_score(title) for title in titles
+                ]), 'Scores differ from the fake.'
+                _report(name, len(titles), client.call_count, elapsed)
+    finally:
+        server.stop(None)
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -0,0 +1,66 @@
+"""Schema of company data shared by its converter and readers.
+
+Company data is a crawled CSV/TSV file of annual fundamentals with one row
+per code and year. See "Company data" of README.md for an example.
+
+Columns can also be saved as `.npz` of one array per column, which loads
+without parsing text:
+
+    columns = company_schema.load_columns('company_data.npz')
+    columns['per'][columns['code'] == '017960']
+"""
+
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+# Columns identifying a row.
+KEY_COLUMNS = ('code', 'year')
+# Columns of float32 values.
+NUMERIC_COLUMNS = ('total_equity', 'sales', 'profit', 'net_income', 'bps',
+                   'per', 'eps', 'debt_ratio', 'profit_ratio')
+COLUMNS = ('code', 'corp_name', 'year') + NUMERIC_COLUMNS
+
+# dtypes of `pd.read_csv`. Years are read as str to join 'code@year' keys.
+CSV_DTYPES = {
+    'code': str,
+    'corp_name': str,
+    'year': str,
+    **{column: np.float32 for column in NUMERIC_COLUMNS},
+}
+
+
+def read_company_data(path: str) -> pd.DataFrame:
+    """Returns company data TSV of `path` with `CSV_DTYPES`.
+
+    Missing corp_name is ''.
+    """
+    df_company = pd.read_csv(path, sep='\t', dtype=CSV_DTYPES)
+    df_company['corp_name'] = df_company['corp_name'].fillna('')
+    return df_company
+
+
+def to_columns(df_company: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """Returns an array of each column of `COLUMNS`.
+
+    Strings are fixed width unicode arrays, not object arrays, so that
+    they are saved without pickling.
+    """
+    return {
+        column: (df_company[column].values.astype(str)
+                 if CSV_DTYPES[column] is str else
+                 df_company[column].values.astype(np.float32))
+        for column in COLUMNS
+    }
+
+
+def save_columns(path: str, columns: Dict[str, np.ndarray]):
+    # Pass file object not to let numpy append '.npz' to the path.
+    with open(path, 'wb') as f:
+        np.savez(f, **columns)
+
+
+def load_columns(path: str) -> Dict[str, np.ndarray]:
+    with np.load(path) as data:
+        return {column: data[column] for column in COLUMNS}
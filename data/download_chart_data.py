@@ -1,56 +1,113 @@
 """Script which is used when downloading chart data
 
-NOTE: This script requires Windows environment.
+Streams candle history of stocks page by page from Cybos wrapper service,
+keeping pages of a code as compact columns, and appends the code to the
+CSV file only when its whole history arrives. A failed stream leaves no
+rows of the code, and codes already in the file are skipped, so that a
+rerun resumes the download without duplicates. Each row is
+`Code,Date,Time,Open,High,Low,Close,Volume` with the latest candle first,
+as `FundamentalDataManager.get_candle_data_from_csv` reads.
 
-Details: https://skelterlabs.atlassian.net/wiki/spaces/DeepTrader/pages/1956085778/API+CYBOS+Plus
-
-"""
-
-import win32com.client
-
-inst_cp_cybos = win32com.client.Dispatch("CpUtil.CpCybos")
-print(inst_cp_cybos.IsConnect)
-
-inst_cp_stock_code = win32com.client.Dispatch("CpUtil.CpStockCode")
-total_count = inst_cp_stock_code.getCount()
-
-stock_codes = []
-f = open('c:\\test.csv', 'w')
-
-for i in range(total_count) :
-    #print(inst_cp_stock_code.GetData(1,i))
-    stock_codes.append(inst_cp_stock_code.GetData(0, i))
-
-inst_stock_chart = win32com.client.Dispatch("CpSysDib.StockChart")
-COUNT = 3000000
+The service runs on Windows with Cybos, and this script runs anywhere.
 
-for stock_code in stock_codes:
-
-    inst_stock_chart.SetInputValue(0, stock_code)
-    inst_stock_chart.SetInputValue(1, ord('2'))
-    inst_stock_chart.SetInputValue(4, COUNT)
-    inst_stock_chart.SetInputValue(5, (0, 1, 2, 3, 4, 5, 8))
-    inst_stock_chart.SetInputValue(6, ord('m'))
-
-    sum_data = 0
-
-    while sum_data <= COUNT:
-        inst_stock_chart.BlockRequest()
-
-        num_data = inst_stock_chart.GetHeaderValue(3)
-        num_field = inst_stock_chart.GetHeaderValue(1)
-
-        print(num_data)
-
-        if num_data == 0 :
-            break
+Details: https://skelterlabs.atlassian.net/wiki/spaces/DeepTrader/pages/1956085778/API+CYBOS+Plus
 
-        sum_data += num_data
+Example usage:
 
-        for i in range(num_data):
-            f.write("%s" % (stock_code))
-            for j in range(num_field):
-                f.write(",%s" % (inst_stock_chart.GetDataValue(j, i)))
-            f.write("\n")
+    python download_chart_data.py --outfile ~/tmp/chart_data.csv \
+        --codes A005930,A000660 --cybos_address 192.168.0.2:11231
+"""
 
-f.close()
+import csv
+import os
+import sys
+from typing import Dict, List, Set
+
+from absl import app
+from absl import flags
+from absl import logging
+import FinanceDataReader as fdr
+import grpc
+import numpy as np
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'cybos_wrapper'))
+import candle_encoding  # pylint: disable=wrong-import-position
+import cybos_client  # pylint: disable=wrong-import-position
+
+FLAGS = flags.FLAGS
+flags.DEFINE_string('outfile', None, 'Output file path to CSV.')
+flags.DEFINE_list(
+    'codes', [], 'Cybos codes (e.g. A005930) to download. All KRX stocks '
+    'if not given.')
+flags.DEFINE_string('cycle_type', 'm', 'Chart type of Cybos, e.g. m, D.')
+flags.DEFINE_integer('cycle', 1, 'Cycle of chart, e.g. 1 for 1 minute.')
+flags.DEFINE_integer('count', 0,
+                     'Number of candles of each code. 0 downloads all.')
+flags.DEFINE_string('cybos_address', 'localhost:11231',
+                    'Address of Cybos wrapper service.')
+
+flags.mark_flag_as_required('outfile')
+
+
+def _get_codes():
+    if FLAGS.codes:
+        return FLAGS.codes
+    listing = fdr.StockListing('KRX')
+    return [f'A{code}' for code in listing['Symbol']]
+
+
+def _downloaded_codes(path: str) -> Set[str]:
+    """Returns codes with candles in the CSV file at `path`."""
+    if not os.path.exists(path):
+        return set()
+    with open(path, newline='') as f:
+        return {row[0] for row in csv.reader(f) if row}
+
+
+def download(client: cybos_client.CybosClient,
+             code: str) -> Dict[str, np.ndarray]:
+    """Returns columns of candles of `code` with the latest candle first."""
+    pages: List[Dict[str, np.ndarray]] = []
+    for page in client.stream_candle_history(code, FLAGS.cycle_type,
+                                             FLAGS.cycle, FLAGS.count):
+        pages.append(candle_encoding.decode_candles(page))
+    if not pages:
+        return {
+            column: np.zeros(0, dtype=np.int64)
+            for column in candle_encoding.COLUMNS
+        }
+    return {
+        column: np.concatenate([page[column] for page in pages])
+        for column in candle_encoding.COLUMNS
+    }
+
+
+def main(args):
+    del args  # Unused
+
+    downloaded = _downloaded_codes(FLAGS.outfile)
+    codes = [code for code in _get_codes() if code not in downloaded]
+    if downloaded:
+        logging.info(f'Skip {len(downloaded)} codes in {FLAGS.outfile}')
+    with cybos_client.CybosClient(FLAGS.cybos_address) as client, open(
+            FLAGS.outfile, 'a', newline='') as f:
+        writer = csv.writer(f)
+        for i, code in enumerate(codes):
+            try:
+                columns = download(client, code)
+            except grpc.RpcError as ex:
+                logging.error(f'Failed to download {code}: {ex.code().name}')
+                continue
+            num_candles = len(columns['date'])
+            # Written after the whole history not to leave a truncated one.
+            writer.writerows(
+                zip([code] * num_candles,
+                    *[columns[column] for column in candle_encoding.COLUMNS]))
+            f.flush()
+            logging.info(f'[{i + 1}/{len(codes)}] {code}: {num_candles}')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -2,13 +2,28 @@
 
 And save as TFRecord dataset.
 
+Symbols are downloaded by a pool of `--num_workers` threads into
+`--cache_dir`, one CSV per symbol, with a manifest of the last downloaded
+date of each symbol. Later runs download only bars since then and merge
+them into the CSVs, and symbols already downloaded today are skipped, so
+that an interrupted run resumes where it stopped. TFRecord shards are
+written from the CSVs at the end. See `tfrecord_shards`.
+
 @see https://github.com/FinanceData/FinanceDataReader
 
 Example usage:
 
-    python download_finance_data.py --outfile ~/tmp/finance_data.tfrecord
+    python download_finance_data.py --outfile ~/tmp/finance_data.tfrecord \
+        --cache_dir ~/tmp/finance_cache --num_shards 8 --compression GZIP
 """
+from concurrent import futures
+import datetime
+import functools
+import json
 import math
+import os
+import threading
+import time
 
 from absl import app
 from absl import flags
@@ -18,29 +33,29 @@ import numpy as np
 import pandas as pd
 import tensorflow as tf
 
+import fake_finance_data
+import tfrecord_shards
+
 FLAGS = flags.FLAGS
 flags.DEFINE_string('outfile', None, 'Output file path to TFRecord.')
+flags.DEFINE_string('cache_dir', None,
+                    'Directory of downloaded CSV of each symbol.')
+flags.DEFINE_integer('num_workers', 8,
+                     'Number of symbols to download concurrently.')
+flags.DEFINE_list('symbols', [],
+                  'Symbols to download. All KRX symbols if not given.')
+flags.DEFINE_boolean('fake_source', False,
+                     'Download from `FakeFinanceDataSource` for testing.')
+flags.DEFINE_integer('num_shards', 8, 'Number of TFRecord shards to write.')
+flags.DEFINE_enum('compression', 'GZIP', ['NONE', 'GZIP', 'ZLIB'],
+                  'Compression of TFRecord shards.')
+flags.DEFINE_integer(
+    'num_writer_processes', None,
+    'Number of processes writing shards. Number of CPUs if not given.')
 
-
-def _bytes_feature(values):
-    """Return an bytes_list from str list."""
-    bytes_values = []
-    for v in values:
-        if isinstance(v, str):
-            bytes_values.append(str.encode(v))
-        else:
-            bytes_values.append(v)
-    return tf.train.Feature(bytes_list=tf.train.BytesList(value=bytes_values))
-
-
-def _int64_feature(values):
-    """Returns an int64_list from a bool / enum / int / uint list."""
-    return tf.train.Feature(int64_list=tf.train.Int64List(value=values))
-
-
-def _float_feature(values):
-    """Returns an float_list from a bool / enum / int / uint list."""
-    return tf.train.Feature(float_list=tf.train.FloatList(value=values))
+_MANIFEST = 'manifest.json'
+# Number of downloaded symbols to save the manifest after.
+_MANIFEST_SAVE_INTERVAL = 50
 
 
 def _strftime_values(series):
@@ -51,7 +66,7 @@ def _float_values(series):
     return series.values.astype(np.float32)
 
 
-def _build_example(code, ohlcvc):
+def build_example(code, ohlcvc):
     """Return an ohlcvc example.
 
     An example consists of Open, High, Low, Close, Volume, Change and
@@ -67,21 +82,127 @@ def _build_example(code, ohlcvc):
     Code |15   |18   |12  |17    |220    |0.0209 |YYYY-mm-dd + ndays
     """
     feature = {
-        'code': _bytes_feature([code]),
-        'date': _bytes_feature(_strftime_values(ohlcvc.index)),
-        'open': _float_feature(_float_values(ohlcvc['Open'])),
-        'high': _float_feature(_float_values(ohlcvc['High'])),
-        'low': _float_feature(_float_values(ohlcvc['Low'])),
-        'close': _float_feature(_float_values(ohlcvc['Close'])),
-        'volume': _float_feature(_float_values(ohlcvc['Volume'])),
-        'change': _float_feature(_float_values(ohlcvc['Change'])),
+        'code': tfrecord_shards.bytes_feature([code]),
+        'date': tfrecord_shards.bytes_feature(_strftime_values(ohlcvc.index)),
     }
+    for column in ['Open', 'High', 'Low', 'Close', 'Volume', 'Change']:
+        feature[column.lower()] = tfrecord_shards.float_feature(
+            _float_values(ohlcvc[column]))
     return tf.train.Example(features=tf.train.Features(feature=feature))
 
 
-def _download_krx(writer):
-    df_krx = fdr.StockListing('KRX')
-    count = 0
+class FdrDataSource:
+    """KRX listing and daily bars from FinanceDataReader."""
+
+    def listing(self) -> pd.DataFrame:
+        return fdr.StockListing('KRX')
+
+    def read(self, symbol: str, start: str = None) -> pd.DataFrame:
+        return fdr.DataReader(symbol, start)
+
+
+def _write_atomically(path, write):
+    # Readers never see a partially written file.
+    tmp_path = f'{path}.tmp'
+    write(tmp_path)
+    os.replace(tmp_path, path)
+
+
+class _Manifest:
+    """Last downloaded date and download day of each symbol."""
+
+    def __init__(self, cache_dir):
+        self._path = os.path.join(cache_dir, _MANIFEST)
+        self._lock = threading.Lock()
+        self._entries = {}
+        if os.path.exists(self._path):
+            with open(self._path) as f:
+                self._entries = json.load(f)
+        self._dirty = 0
+
+    def get(self, symbol):
+        with self._lock:
+            return self._entries.get(symbol)
+
+    def update(self, symbol, last_date, rows):
+        with self._lock:
+            self._entries[symbol] = {
+                'last_date': last_date,
+                'rows': rows,
+                'downloaded_on': datetime.date.today().isoformat(),
+            }
+            self._dirty += 1
+            if self._dirty >= _MANIFEST_SAVE_INTERVAL:
+                self._save()
+
+    def save(self):
+        with self._lock:
+            self._save()
+
+    def _save(self):
+
+        def _write(path):
+            with open(path, 'w') as f:
+                json.dump(self._entries, f, indent=2, sort_keys=True)
+
+        _write_atomically(self._path, _write)
+        self._dirty = 0
+
+
+def _csv_path(cache_dir, symbol):
+    return os.path.join(cache_dir, f'{symbol}.csv')
+
+
+def _read_csv(cache_dir, symbol):
+    return pd.read_csv(_csv_path(cache_dir, symbol),
+                       index_col='Date',
+                       parse_dates=True)
+
+
+def _merge(cached, fresh):
+    """Returns `cached` bars updated with `fresh` bars."""
+    merged = pd.concat([cached, fresh])
+    # Fresh bars replace the cached ones of the same date, e.g. the last
+    # bar downloaded during market hours.
+    merged = merged[~merged.index.duplicated(keep='last')].sort_index()
+    # Change of the first fresh bar needs the previous cached bar.
+    merged.loc[fresh.index, 'Change'] = merged['Close'].pct_change().loc[
+        fresh.index]
+    return merged
+
+
+def _download(source, manifest, symbol):
+    """Downloads new bars of `symbol` and returns number of them.
+
+    Returns None if `symbol` is already downloaded today.
+    """
+    entry = manifest.get(symbol)
+    today = datetime.date.today().isoformat()
+    if entry is not None and entry['downloaded_on'] == today:
+        return None
+
+    csv_path = _csv_path(FLAGS.cache_dir, symbol)
+    if entry is not None and os.path.exists(csv_path):
+        # Download again from the last date to update its bar.
+        fresh = source.read(symbol, entry['last_date'])
+        ohlcvc = _merge(_read_csv(FLAGS.cache_dir, symbol), fresh)
+    else:
+        # Open, High, Low, Close, Volume, Change
+        fresh = ohlcvc = source.read(symbol)
+
+    if ohlcvc.empty:
+        logging.warning(f'No bar of {symbol}')
+        return 0
+    ohlcvc.index.name = 'Date'
+    _write_atomically(csv_path, ohlcvc.to_csv)
+    manifest.update(symbol, ohlcvc.index[-1].strftime('%Y-%m-%d'),
+                    len(ohlcvc))
+    return len(fresh)
+
+
+def _listed_symbols(source):
+    df_krx = source.listing()
+    symbols = []
     for symbol, sector in zip(df_krx['Symbol'], df_krx['Sector']):
 
         # For example,
@@ -91,33 +212,68 @@ def _download_krx(writer):
         if isinstance(sector, float) and math.isnan(sector):
             logging.info(f'Skipped KRX: {symbol}')
             continue
+        symbols.append(symbol)
+    return symbols
 
-        # Open, High, Low, Close, Volume, Change
-        ohlcvc = fdr.DataReader(symbol)
-        try:
-            example = _build_example(symbol, ohlcvc)
-            writer.write(example.SerializeToString())
-            count += 1
-            if count % 100 == 0:
-                logging.info(f'Downloaded {count} examples')
-        except KeyError as ex:
-            # I saw `KeyError: 'Open' for 257720` on 2021-09-29 5 AM.
-            # "실리콘2" just gets listed on exchange market at the time.
-            logging.warning(f'KeyError: {ex} for {symbol}')
-
-    if count % 100 > 0:
-        logging.info(f'Downloaded {count} examples')
+
+def _download_krx(source, symbols):
+    """Downloads `symbols` concurrently and returns downloaded ones."""
+    manifest = _Manifest(FLAGS.cache_dir)
+    downloaded = []
+    started = time.monotonic()
+    num_bars = 0
+    try:
+        with futures.ThreadPoolExecutor(FLAGS.num_workers) as executor:
+            jobs = {
+                executor.submit(_download, source, manifest, symbol): symbol
+                for symbol in symbols
+            }
+            for i, job in enumerate(futures.as_completed(jobs)):
+                symbol = jobs[job]
+                try:
+                    num_new_bars = job.result()
+                except (KeyError, ValueError) as ex:
+                    # I saw `KeyError: 'Open' for 257720` on 2021-09-29
+                    # 5 AM. "실리콘2" just gets listed on exchange market
+                    # at the time.
+                    logging.warning(f'{type(ex).__name__}: {ex} for {symbol}')
+                    continue
+                downloaded.append(symbol)
+                num_bars += num_new_bars or 0
+                if (i + 1) % 100 == 0:
+                    logging.info(f'Downloaded {i + 1}/{len(symbols)} symbols')
+    finally:
+        manifest.save()
+    logging.info(f'Downloaded {num_bars} new bars of {len(downloaded)} '
+                 f'symbols in {time.monotonic() - started:.1f}s')
+    return downloaded
+
+
+def _build_example_from_csv(cache_dir, symbol):
+    if not os.path.exists(_csv_path(cache_dir, symbol)):
+        return None
+    return build_example(symbol, _read_csv(cache_dir, symbol))
 
 
 def main(args):
     del args  # Unused
 
-    with tf.io.TFRecordWriter(FLAGS.outfile) as writer:
-        _download_krx(writer)
+    if FLAGS.fake_source:
+        source = fake_finance_data.FakeFinanceDataSource()
+    else:
+        source = FdrDataSource()
+    os.makedirs(FLAGS.cache_dir, exist_ok=True)
+    symbols = FLAGS.symbols or _listed_symbols(source)
+    symbols = _download_krx(source, symbols)
+    tfrecord_shards.write_shards(
+        FLAGS.outfile, sorted(symbols),
+        functools.partial(_build_example_from_csv, FLAGS.cache_dir),
+        FLAGS.num_shards, FLAGS.compression, FLAGS.num_writer_processes)
 
 
 if __name__ == '__main__':
     flags.mark_flags_as_required([
         'outfile',
+        'cache_dir',
     ])
     app.run(main)
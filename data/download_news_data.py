@@ -1,5 +1,23 @@
 """Download news data from naver finance news.
 
+Pages of news titles of a code are fetched concurrently by
+`--num_workers` threads over a pooled HTTP session, under
+`--requests_per_sec` across all of them. News of each code are kept in
+`<outdir>/<code>.tsv` from the newest, and `<outdir>/manifest.json` keeps
+the date of the newest crawled news of each code as its watermark. Reruns
+fetch pages from the first until they reach the watermark, and prepend
+only unseen news. If `--max_page` pages run out before reaching the
+watermark or the last page, the watermark is kept and the next run resumes
+from the page after them, so that news in between are never skipped.
+
+`fake_news_server.py` serves fake news pages to crawl offline, and
+`news_index.py` aggregates crawled news by code and date as features.
+
+With `--use_sentiment_analytics`, titles of new news are scored by
+`sentiment_client` over one channel with concurrent calls, and scores are
+cached in `--sentiment_cache` so that reruns never score a title again.
+News failed to be scored are kept unscored, and scored again on reruns.
+
 NOTE: This is not build by bazel. Only running locally is tested and
 you need to install requirements manually.
 
@@ -21,158 +39,347 @@ just-dev2. Follow below processes before run this module.
 
 Example usage:
 
-    python download_news_data.py --outfile ./result.txt \
-                                 --code 005930 \
+    python download_news_data.py --outdir ./news \
+                                 --codes 005930,000660 \
                                  --max_page 2000 \
-                                 --interval_sleep_secs 0.05
+                                 --num_workers 4 \
+                                 --requests_per_sec 10 \
                                  --use_sentiment_analytics
 
-    results are saved as plain text file formed as
+    results are saved as plain text file of each code formed as
     `YYYY.MM.DD\tTitle of news\tsentiment_value`
 """
+import collections
+from concurrent import futures
+import datetime
+import itertools
+import json
+import os
 import re
-import requests
+import threading
 import time
-from typing import List, Tuple
+from typing import Dict, List, Optional, Tuple
 
 from absl import app
 from absl import flags
 from absl import logging
-from bs4 import BeautifulSoup
-import grpc
+import lxml.html
+import requests
+from requests import adapters
+from urllib3.util import retry
 
-import service_pb2
-import service_pb2_grpc
+import sentiment_client
 
-flags.DEFINE_string('code', None, 'Stock code to search.')
-flags.DEFINE_float('interval_sleep_secs', None,
-                   '(Optional)The secs to sleep after each searching.')
+flags.DEFINE_list('codes', None, 'Stock codes to search.')
 flags.DEFINE_integer('max_page', None, 'The number of pages to search.')
-flags.DEFINE_string('outfile', None, 'Output file path.')
-flags.DEFINE_boolean(
-    'use_sentiment_analytics', False, 'If True, use sentiment'
-    ' analytics for each news. But it makes overall process very slow.')
+flags.DEFINE_string('outdir', None,
+                    'Directory of news of each code and the manifest.')
+flags.DEFINE_string('news_url', 'https://finance.naver.com',
+                    'URL of naver finance, or of `fake_news_server.py`.')
+flags.DEFINE_integer('num_workers', 4,
+                     'Number of pages to fetch concurrently.')
+flags.DEFINE_float('requests_per_sec', 10.,
+                   'Maximum number of page requests per second.')
+flags.DEFINE_boolean('use_sentiment_analytics', False,
+                     'If True, use sentiment analytics for each news.')
 flags.DEFINE_integer('port', 8580,
                      'Local port-forwarded port for sentiment analytics.')
+flags.DEFINE_integer('sentiment_max_in_flight', 32,
+                     'Maximum number of concurrent sentiment analytics calls.')
+flags.DEFINE_string(
+    'sentiment_cache', None, '(Optional) File to cache sentiment scores. '
+    '`<outdir>/sentiment_cache.tsv` if not given.')
 
 FLAGS = flags.FLAGS
 
+_MANIFEST = 'manifest.json'
 
-class SentimentClassifierClient:
-    """For separate from Bazel build system, below code is copied from
-    ClassifierClient in //cabinet/iris/text_analytics/nlp/classfier_client.py"""
+# (date, title) of a news.
+News = Tuple[str, str]
 
-    def __init__(self, address, positive_label='1'):
-        self.address = address
-        self.positive_label = positive_label
 
-    def get_sentiment_score(self, text, timeout=60):
-        try:
-            with grpc.insecure_channel(self.address) as channel:
-                stub = service_pb2_grpc.PredictServiceStub(channel)
-                request = service_pb2.ClassificationRequest(text=text)
-                response = stub.Classify(request, timeout=timeout)
-        except Exception:
-            logging.error(f'Error occurred while processing text: {text}')
-            raise
-        else:
-            for class_result in response.classes:
-                if class_result.label == self.positive_label:
-                    return class_result.score
-            logging.warning(f'Positive label {self.positive_label} missing '
-                            'in classifier result.')
-            return -1
+class RateLimiter:
+    """Spaces acquisitions `1 / rate` seconds apart over all threads."""
+
+    def __init__(self, rate: float):
+        self._interval = 1 / rate
+        self._next_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self._next_at)
+            self._next_at = at + self._interval
+        if at > now:
+            time.sleep(at - now)
 
 
 class NaverNewsCrawler:
+    """Crawler of news titles of naver finance.
+
+    Args:
+        base_url: URL of naver finance.
+        num_workers: number of pages to fetch concurrently.
+        requests_per_sec: maximum number of page requests per second.
+        timeout: timeout of each page request in seconds.
+    """
+
+    def __init__(self,
+                 base_url: str = 'https://finance.naver.com',
+                 num_workers: int = 4,
+                 requests_per_sec: float = 10.,
+                 timeout: float = 10.):
+        self._base_url = base_url
+        self._num_workers = num_workers
+        self._timeout = timeout
+        self._rate_limiter = RateLimiter(requests_per_sec)
+        # Connections are kept alive and shared by the workers.
+        self._session = requests.Session()
+        adapter = adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=num_workers,
+            max_retries=retry.Retry(total=3,
+                                    backoff_factor=0.5,
+                                    status_forcelist=[429, 500, 502, 503,
+                                                      504]))
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+        self._executor = futures.ThreadPoolExecutor(num_workers)
+        self._lock = threading.Lock()
+        self.page_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
+        self._session.close()
 
     def _make_url(self, code, page):
-        return ('https://finance.naver.com/item/news_news.nhn?code=%s'
-                '&page=%s&sm=title_entity_id.basic&clusterId=') % (code,
-                                                                   str(page))
+        return (f'{self._base_url}/item/news_news.nhn?code={code}'
+                f'&page={page}&sm=title_entity_id.basic&clusterId=')
+
+    def fetch_page(self, code: str, page: int) -> Tuple[List[News], int]:
+        """Returns news of a page from the newest, and the last page."""
+        self._rate_limiter.acquire()
+        response = self._session.get(self._make_url(code, page),
+                                     timeout=self._timeout)
+        response.raise_for_status()
+        with self._lock:
+            self.page_count += 1
+        html = lxml.html.fromstring(response.text)
+
+        titles = [
+            x.text_content().strip()
+            for x in html.xpath('//td[@class="title"]/a')
+        ]
+        dates = [
+            x.text_content().split()[0]
+            for x in html.xpath('//td[@class="date"]')
+        ]
+        if len(titles) != len(dates):
+            logging.warning(
+                'Length of title and date is different. Skip page %d', page)
+            titles, dates = [], []
+
+        # The last page is linked from the navigation unless it is near.
+        last_page = page
+        for url in html.xpath('//table[@class="Nnavi"]//a/@href'):
+            match = re.search(r'page=(\d+)', url)
+            if match:
+                last_page = max(last_page, int(match.group(1)))
+        return list(zip(dates, titles)), last_page
 
     def get_titles(
-        self,
-        code: str,
-        max_page: int,
-        interval_sleep_secs: float = None,
-        sentiment_classifier_client: SentimentClassifierClient = None
-    ) -> List[List]:
-        logging.info('Crawling naver finance news titles.')
-
+            self,
+            code: str,
+            max_page: int,
+            watermark: Optional[str] = None,
+            start_page: int = 1) -> Tuple[List[News], Optional[int]]:
+        """Returns news of `code` from `start_page` down to `watermark`.
+
+        Pages are fetched from the first, up to as many ahead of the page
+        being read as pages read so far and at most `num_workers`, so that
+        reruns reaching `watermark` in a few pages fetch few pages in vain.
+        No more pages are requested once a page reaches news older than
+        `watermark`.
+
+        Args:
+            code: stock code.
+            max_page: maximum number of pages to fetch.
+            watermark: date of the newest news crawled before. News of
+                the date are included as some of them may be new.
+            start_page: page to start from.
+
+        Returns:
+            news from the newest, and the page to resume from if `max_page`
+            pages ran out before reaching `watermark` or the last page,
+            otherwise None.
+        """
+        logging.info(f'Crawling naver finance news titles of {code}.')
         results = []
-        cur_page = 1
-        while cur_page <= max_page:
-            html = BeautifulSoup(
-                requests.get(self._make_url(code, cur_page)).text, 'lxml')
-
-            if cur_page == 1:
-                last_page_url = html.find('td', {
-                    'class': 'pgRR'
-                }).find('a').get('href')
-                real_max_page = int(re.findall(r'page=(\d+)', last_page_url)[0])
-
-                if real_max_page < max_page:
-                    max_page = real_max_page
-
-            titles = [
-                x.find('a').get_text()
-                for x in html.findAll('td', {'class': 'title'})
-            ]
-
-            dates = [
-                x.get_text().split()[0]
-                for x in html.findAll('td', {'class': 'date'})
-            ]
-
-            if len(titles) == len(dates):
-                for title, date in zip(titles, dates):
-                    record = [date, title]
-                    if sentiment_classifier_client:
-                        try:
-                            record.append(
-                                str(
-                                    sentiment_classifier_client.
-                                    get_sentiment_score(title)))
-                        except grpc.RpcError as ex:
-                            logging.error(
-                                'Sentimet analytics error occured. Skip it. %s',
-                                str(ex))
-                            continue
-                    results.append(record)
-            else:
-                logging.warn(
-                    'Length of title and date is different. Skip page %d',
-                    cur_page)
-
-            logging.info('Crawlled %d pages' % cur_page)
-            cur_page += 1
-
-            if interval_sleep_secs:
-                time.sleep(interval_sleep_secs)
-
-        return results
+        news, last_page = self.fetch_page(code, start_page)
+        end_page = min(start_page + max_page - 1, last_page)
+        pages = iter(range(start_page + 1, end_page + 1))
+        pending = collections.deque()
+        num_read = 1
+        reached = False
+        try:
+            while True:
+                new = [
+                    x for x in news if watermark is None or x[0] >= watermark
+                ]
+                results.extend(new)
+                if len(new) < len(news) or not news:
+                    reached = True
+                    break
+                num_ahead = min(num_read, self._num_workers)
+                for page in itertools.islice(pages, num_ahead - len(pending)):
+                    pending.append(
+                        self._executor.submit(self.fetch_page, code, page))
+                if not pending:
+                    break
+                news, _ = pending.popleft().result()
+                num_read += 1
+        finally:
+            for future in pending:
+                future.cancel()
+        if reached or end_page >= last_page:
+            return results, None
+        return results, end_page + 1
+
+
+def _write_atomically(path, write):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _load_manifest(outdir: str) -> Dict:
+    try:
+        with open(os.path.join(outdir, _MANIFEST)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _read_records(path: str) -> List[List[str]]:
+    try:
+        with open(path) as f:
+            return [line.rstrip('\n').split('\t') for line in f]
+    except FileNotFoundError:
+        return []
+
+
+def crawl_code(crawler: NaverNewsCrawler,
+               code: str,
+               max_page: int,
+               outdir: str,
+               manifest: Dict,
+               sentiment_classifier_client=None) -> int:
+    """Adds news of `code` since its watermark to its file.
+
+    New news, and news failed to be scored before, are scored by
+    `sentiment_classifier_client`, a
+    `sentiment_client.SentimentClassifierClient`, if given.
+
+    If `max_page` pages run out before reaching the watermark, the
+    watermark is kept with the page to resume from in `manifest`, and the
+    next call crawls from there down to the watermark before newer news.
+
+    Returns:
+        number of new news.
+    """
+    path = os.path.join(outdir, f'{code}.tsv')
+    entry = manifest.get(code, {})
+    watermark = entry.get('watermark')
+    records = _read_records(path) if entry else []
+    # News crawled since the watermark, including ones of resumed crawls.
+    seen = {(record[0], record[1])
+            for record in records
+            if watermark is None or record[0] >= watermark}
+
+    news, resume_page = crawler.get_titles(code, max_page, watermark,
+                                           entry.get('resume_page', 1))
+    new_records = [[date, title]
+                   for date, title in news
+                   if (date, title) not in seen]
+    num_rescored = 0
+    if sentiment_classifier_client:
+        # News of sentiment analytics errors are kept unscored not to be
+        # lost behind the watermark, and scored again on the next run.
+        unscored = [record for record in records if len(record) == 2]
+        scores = sentiment_classifier_client.get_sentiment_scores(
+            [record[1] for record in new_records + unscored])
+        for record, score in zip(new_records + unscored, scores):
+            if score is not None:
+                record.append(str(score))
+        num_rescored = sum(len(record) == 3 for record in unscored)
+        num_failed = scores.count(None)
+        if num_failed:
+            logging.warning(f'{code}: {num_failed} news are left unscored')
+
+    # News of a resumed crawl go below the ones crawled before it.
+    position = entry.get('resume_index', 0)
+    if new_records or num_rescored or not records:
+        all_records = records[:position] + new_records + records[position:]
+        _write_atomically(
+            path, lambda f: f.writelines('\t'.join(record) + '\n'
+                                         for record in all_records))
+    dates = [record[0] for record in new_records]
+    newest = max(filter(None, dates + [entry.get('newest'), watermark]),
+                 default=None)
+    manifest[code] = {
+        'watermark': newest,
+        'crawled_at': datetime.datetime.now().isoformat(),
+    }
+    if resume_page is not None:
+        logging.warning(f'{code}: {max_page} pages ran out before reaching '
+                        f'watermark {watermark}. Resumes from page '
+                        f'{resume_page} on the next run.')
+        manifest[code].update(watermark=watermark,
+                              newest=newest,
+                              resume_page=resume_page,
+                              resume_index=position + len(new_records))
+    _write_atomically(os.path.join(outdir, _MANIFEST),
+                      lambda f: json.dump(manifest, f, indent=2))
+    logging.info(f'{code}: {len(new_records)} new news, '
+                 f'{num_rescored} news scored again')
+    return len(new_records)
 
 
 def main(unused_args):
-    nnc = NaverNewsCrawler()
+    os.makedirs(FLAGS.outdir, exist_ok=True)
     scc = None
     if FLAGS.use_sentiment_analytics:
-        scc = SentimentClassifierClient(f'localhost:{FLAGS.port}')
-
-    results = nnc.get_titles(FLAGS.code, FLAGS.max_page,
-                             FLAGS.interval_sleep_secs, scc)
-
-    with open(FLAGS.outfile, 'w') as f:
-        for record in results:
-            value = '\t'.join(record)
-            f.write(f'{value}\n')
+        scc = sentiment_client.SentimentClassifierClient(
+            f'localhost:{FLAGS.port}',
+            max_in_flight=FLAGS.sentiment_max_in_flight,
+            cache_path=FLAGS.sentiment_cache or
+            os.path.join(FLAGS.outdir, 'sentiment_cache.tsv'))
+
+    manifest = _load_manifest(FLAGS.outdir)
+    started = time.monotonic()
+    with NaverNewsCrawler(FLAGS.news_url, FLAGS.num_workers,
+                          FLAGS.requests_per_sec) as crawler:
+        for code in FLAGS.codes:
+            crawl_code(crawler, code, FLAGS.max_page, FLAGS.outdir, manifest,
+                       scc)
+    if scc:
+        scc.close()
+    logging.info(f'Fetched {crawler.page_count} pages in '
+                 f'{time.monotonic() - started:.1f}s')
 
 
 if __name__ == '__main__':
     flags.mark_flags_as_required([
-        'code',
+        'codes',
         'max_page',
-        'outfile',
+        'outdir',
     ])
-    app.run(main)
\ No newline at end of file
+    app.run(main)
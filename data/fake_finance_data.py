@@ -0,0 +1,97 @@
+"""Fake finance data source to run `download_finance_data.py` offline.
+
+Serves the same frames as FinanceDataReader: a KRX listing, and daily
+Open, High, Low, Close, Volume and Change indexed by Date. Bars are
+deterministic random walks of business days, so that a bar has the same
+values whenever it is read.
+
+Example usage:
+
+    python download_finance_data.py --fake_source \
+        --cache_dir ~/tmp/finance_cache --outfile ~/tmp/finance_data.tfrecord
+"""
+
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+_FIRST_DATE = '2015-01-02'
+
+
+class FakeFinanceDataSource:
+    """Random walk daily bars of `num_symbols` fake KRX symbols.
+
+    Args:
+        num_symbols: number of listed symbols. Every 10th of them has no
+            sector as derivatives in KRX listing do.
+        end_date: date of the last bar. Today if not given. Call `advance`
+            to add new bars.
+        latency: simulated latency of each read in seconds.
+    """
+
+    def __init__(self,
+                 num_symbols: int = 100,
+                 end_date: str = None,
+                 latency: float = 0.05):
+        self._num_symbols = num_symbols
+        self._end_date = pd.Timestamp(end_date or pd.Timestamp.today().date())
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.read_count = 0
+        self.read_rows = 0
+
+    def advance(self, days: int = 1):
+        """Adds bars of the next `days` business days."""
+        self._end_date += pd.offsets.BDay(days)
+
+    def listing(self) -> pd.DataFrame:
+        symbols = [f'{i:06d}' for i in range(self._num_symbols)]
+        return pd.DataFrame({
+            'Symbol': symbols,
+            'Market': 'KOSPI',
+            'Name': [f'Fake{symbol}' for symbol in symbols],
+            'Sector': [
+                np.nan if i % 10 == 9 else 'Fake'
+                for i in range(self._num_symbols)
+            ],
+        })
+
+    def _history(self, symbol: str) -> pd.DataFrame:
+        dates = pd.bdate_range(_FIRST_DATE, self._end_date, name='Date')
+        rng = np.random.default_rng(int(symbol))
+        # Generate ahead from the first date, so that bars don't change as
+        # the end date advances.
+        num_bars = len(pd.bdate_range(_FIRST_DATE, '2030-12-31'))
+        returns = rng.normal(0, 0.02, num_bars)
+        close = np.round(
+            rng.integers(1_000, 100_000) * np.exp(np.cumsum(returns)))
+        spread = np.abs(rng.normal(0, 0.01, num_bars)) * close
+        volume = rng.integers(1_000, 1_000_000, num_bars)
+        ohlcv = pd.DataFrame(
+            {
+                'Open': np.round(close + rng.uniform(-1, 1, num_bars) *
+                                 spread),
+                'High': np.round(close + spread),
+                'Low': np.round(close - spread),
+                'Close': close,
+                'Volume': volume,
+            },
+            index=pd.bdate_range(_FIRST_DATE, periods=num_bars, name='Date'))
+        ohlcv = ohlcv.loc[dates]
+        ohlcv['Change'] = ohlcv['Close'].pct_change()
+        return ohlcv
+
+    def read(self, symbol: str, start: str = None) -> pd.DataFrame:
+        """Returns bars of `symbol` since `start` like `fdr.DataReader`."""
+        time.sleep(self._latency)
+        ohlcvc = self._history(symbol)
+        if start is not None:
+            ohlcvc = ohlcvc.loc[pd.Timestamp(start):].copy()
+            # Change of the first bar is unknown without its previous bar.
+            ohlcvc.iloc[:1, ohlcvc.columns.get_loc('Change')] = np.nan
+        with self._lock:
+            self.read_count += 1
+            self.read_rows += len(ohlcvc)
+        return ohlcvc
@@ -0,0 +1,155 @@
+"""Fake naver finance news server to run `download_news_data.py` offline.
+
+Serves news title pages of the same HTML structure as naver finance, 10
+news of each page from the newest, with page navigation to the last page.
+News are deterministic, three a day back from `end_date`, and
+`add_news` adds newer ones as if they were published since the last crawl.
+
+Example usage:
+
+    python fake_news_server.py --fake_news_port 8581 --latency_ms 50
+    python download_news_data.py --news_url http://localhost:8581 \
+        --codes 005930 --max_page 100 --outdir ~/tmp/news
+"""
+
+import datetime
+import html
+import http.server
+import threading
+import time
+from typing import List, Tuple
+import urllib.parse
+
+from absl import app
+from absl import flags
+
+flags.DEFINE_integer('fake_news_port', 8581, 'Port to serve fake news.')
+flags.DEFINE_integer('num_news', 1000, 'Number of news of each code.')
+flags.DEFINE_float('latency_ms', 50., 'Simulated latency of each page.')
+
+FLAGS = flags.FLAGS
+
+NEWS_PER_PAGE = 10
+NEWS_PATH = '/item/news_news.nhn'
+
+
+def _page_html(code: str, page: int, last_page: int,
+               news: List[Tuple[str, str]]) -> str:
+    rows = ''.join(
+        '<tr><td class="title"><a href="/item/news_read.nhn?code='
+        f'{code}">{html.escape(title)}</a></td><td class="info">Fake</td>'
+        f'<td class="date"> {date} 09:00</td></tr>' for date, title in news)
+    navigation = ''.join(
+        f'<td><a href="{NEWS_PATH}?code={code}&amp;page={p}">{p}</a></td>'
+        for p in range(max(1, page - 4), min(last_page, page + 5) + 1))
+    if last_page > page + 5:
+        navigation += (f'<td class="pgRR"><a href="{NEWS_PATH}?code={code}'
+                       f'&amp;page={last_page}">&#47582;&#46244;</a></td>')
+    return ('<html><body><table class="type5"><tbody>'
+            f'{rows}</tbody></table><table class="Nnavi"><tr>{navigation}'
+            '</tr></table></body></html>')
+
+
+class FakeNewsServer:
+    """Serves `num_news` fake news of each code over HTTP.
+
+    Args:
+        num_news: number of news of each code.
+        end_date: date of the newest news. Today if not given.
+        latency: simulated latency of each page in seconds.
+        port: port to serve. Any free port if 0.
+    """
+
+    def __init__(self,
+                 num_news: int = 1000,
+                 end_date: datetime.date = None,
+                 latency: float = 0.05,
+                 port: int = 0):
+        self._num_news = num_news
+        self._end_date = end_date or datetime.date.today()
+        self._latency = latency
+        self._added = {}
+        self._lock = threading.Lock()
+        self.request_count = 0
+
+        server = self
+
+        class _Handler(http.server.BaseHTTPRequestHandler):
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                url = urllib.parse.urlparse(self.path)
+                query = urllib.parse.parse_qs(url.query)
+                if url.path != NEWS_PATH or 'code' not in query:
+                    self.send_error(404)
+                    return
+                body = server.page(query['code'][0],
+                                   int(query.get('page', ['1'])[0]))
+                body = body.encode('euc-kr', 'xmlcharrefreplace')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=euc-kr')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = http.server.ThreadingHTTPServer(('127.0.0.1', port),
+                                                       _Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self) -> str:
+        return f'http://127.0.0.1:{self._server.server_address[1]}'
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def add_news(self, code: str, count: int, date: datetime.date = None):
+        """Publishes `count` news of `code` newer than the others."""
+        date = date or self._end_date
+        with self._lock:
+            added = self._added.setdefault(code, [])
+            start = len(added)
+            added.extend(
+                (date.strftime('%Y.%m.%d'), f'{code} added news {i}')
+                for i in range(start, start + count))
+
+    def news(self, code: str) -> List[Tuple[str, str]]:
+        """Returns (date, title) of all news of `code` from the newest."""
+        with self._lock:
+            added = list(reversed(self._added.get(code, [])))
+        return added + [
+            ((self._end_date - datetime.timedelta(days=i // 3)).strftime(
+                '%Y.%m.%d'), f'{code} news {i}') for i in range(self._num_news)
+        ]
+
+    def page(self, code: str, page: int) -> str:
+        time.sleep(self._latency)
+        with self._lock:
+            self.request_count += 1
+        news = self.news(code)
+        last_page = max(1, -(-len(news) // NEWS_PER_PAGE))
+        start = (page - 1) * NEWS_PER_PAGE
+        return _page_html(code, page, last_page,
+                          news[start:start + NEWS_PER_PAGE])
+
+
+def main(unused_args):
+    server = FakeNewsServer(FLAGS.num_news,
+                            latency=FLAGS.latency_ms / 1000,
+                            port=FLAGS.fake_news_port)
+    print(f'Serving fake news at {server.url}')
+    try:
+        while True:
+            time.sleep(3600)
+    finally:
+        server.close()
+
+
+if __name__ == '__main__':
+    app.run(main)
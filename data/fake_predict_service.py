@@ -0,0 +1,55 @@
+"""Fake `PredictService` of sentiment classifier to test its clients.
+
+Scores are deterministic in the text, and each `Classify` call takes
+`latency` seconds as a model server would.
+"""
+
+from concurrent import futures
+import hashlib
+import threading
+import time
+from typing import Tuple
+
+import grpc
+
+import service_pb2
+import service_pb2_grpc
+
+
+def fake_score(text: str) -> float:
+    """Returns the positive score of `text` of the fake."""
+    return int(hashlib.md5(text.encode('utf-8')).hexdigest()[:8], 16) / 2**32
+
+
+class FakePredictServicer(service_pb2_grpc.PredictServiceServicer):
+    """Classifies texts to labels '0' and '1' of fake scores.
+
+    Args:
+        latency: simulated latency of each call in seconds.
+    """
+
+    def __init__(self, latency: float = 0.02):
+        self._latency = latency
+        self._lock = threading.Lock()
+        self.call_count = 0
+
+    def Classify(self, request, context):
+        time.sleep(self._latency)
+        with self._lock:
+            self.call_count += 1
+        score = fake_score(request.text)
+        return service_pb2.ClassificationResponse(classes=[
+            service_pb2.Class(label='0', score=1 - score),
+            service_pb2.Class(label='1', score=score),
+        ])
+
+
+def serve(servicer: FakePredictServicer,
+          port: int = 0,
+          max_workers: int = 32) -> Tuple[grpc.Server, int]:
+    """Starts a server of `servicer` and returns it and its port."""
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers))
+    service_pb2_grpc.add_PredictServiceServicer_to_server(servicer, server)
+    port = server.add_insecure_port(f'localhost:{port}')
+    server.start()
+    return server, port
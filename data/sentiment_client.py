@@ -0,0 +1,184 @@
+"""Client of sentiment classifier of news titles.
+
+The client keeps one gRPC channel open and pipelines `Classify` calls of
+many titles, up to `max_in_flight` of them at once. Scores are cached in
+a local file keyed by a hash of the title, so that titles scored before
+are never sent again.
+
+For separate from Bazel build system, the client is based on
+ClassifierClient in //cabinet/iris/text_analytics/nlp/classfier_client.py
+"""
+
+import hashlib
+import os
+import threading
+from typing import Dict, List, Optional, Sequence
+
+from absl import logging
+import grpc
+
+import service_pb2
+import service_pb2_grpc
+
+
+class SentimentCache:
+    """Scores of texts in a TSV file of `hash\tscore` lines.
+
+    New scores are appended to the file on `flush`.
+    """
+
+    def __init__(self, path: str):
+        self._path = path
+        self._scores = {}
+        self._unsaved = []
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    fields = line.rstrip('\n').split('\t')
+                    # Skip a line partially written by a killed run.
+                    if len(fields) != 2:
+                        continue
+                    try:
+                        self._scores[fields[0]] = float(fields[1])
+                    except ValueError:
+                        continue
+
+    def __len__(self):
+        return len(self._scores)
+
+    @staticmethod
+    def key(text: str) -> str:
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def get(self, text: str) -> Optional[float]:
+        return self._scores.get(self.key(text))
+
+    def put(self, text: str, score: float):
+        key = self.key(text)
+        if key not in self._scores:
+            self._unsaved.append(key)
+        self._scores[key] = score
+
+    def flush(self):
+        if not self._unsaved:
+            return
+        with open(self._path, 'a') as f:
+            f.writelines(f'{key}\t{self._scores[key]}\n'
+                         for key in self._unsaved)
+        self._unsaved = []
+
+
+class SentimentClassifierClient:
+    """Client of `PredictService` returning scores of the positive label.
+
+    Args:
+        address: address of `PredictService`.
+        positive_label: label of positive sentiment.
+        max_in_flight: maximum number of concurrent `Classify` calls.
+        cache_path: (Optional) file to cache scores.
+        timeout: timeout of each call in seconds.
+    """
+
+    def __init__(self,
+                 address: str,
+                 positive_label: str = '1',
+                 max_in_flight: int = 32,
+                 cache_path: Optional[str] = None,
+                 timeout: float = 60):
+        self.address = address
+        self.positive_label = positive_label
+        self._max_in_flight = max_in_flight
+        self._timeout = timeout
+        self._cache = SentimentCache(cache_path) if cache_path else None
+        self._channel = grpc.insecure_channel(address)
+        self._stub = service_pb2_grpc.PredictServiceStub(self._channel)
+        self.call_count = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self._cache is not None:
+            self._cache.flush()
+        self._channel.close()
+
+    def _positive_score(self, response) -> Optional[float]:
+        for class_result in response.classes:
+            if class_result.label == self.positive_label:
+                return class_result.score
+        logging.warning(f'Positive label {self.positive_label} missing '
+                        'in classifier result.')
+        return None
+
+    def get_sentiment_score(self, text, timeout=None) -> Optional[float]:
+        """Returns score of `text`.
+
+        None if the classifier result has no positive label. It is not
+        cached, so that the text is scored again later.
+
+        Raises:
+            grpc.RpcError: if the call fails.
+        """
+        if self._cache is not None:
+            score = self._cache.get(text)
+            if score is not None:
+                return score
+        try:
+            response = self._stub.Classify(
+                service_pb2.ClassificationRequest(text=text),
+                timeout=timeout or self._timeout)
+        except Exception:
+            logging.error(f'Error occurred while processing text: {text}')
+            raise
+        self.call_count += 1
+        score = self._positive_score(response)
+        if self._cache is not None and score is not None:
+            self._cache.put(text, score)
+        return score
+
+    def get_sentiment_scores(self,
+                             texts: Sequence[str]) -> List[Optional[float]]:
+        """Returns scores of `texts`, None of texts failed to be scored.
+
+        Texts whose call failed or whose result has no positive label are
+        not cached, so that they are scored again later.
+
+        Texts not in the cache are sent at once up to `max_in_flight`
+        calls, and each of distinct texts is sent only once.
+        """
+        scores: Dict[str, Optional[float]] = {}
+        missing = []
+        for text in dict.fromkeys(texts):
+            score = self._cache.get(text) if self._cache is not None else None
+            if score is None:
+                missing.append(text)
+            else:
+                scores[text] = score
+
+        in_flight = threading.Semaphore(self._max_in_flight)
+        calls = []
+        for text in missing:
+            in_flight.acquire()
+            call = self._stub.Classify.future(
+                service_pb2.ClassificationRequest(text=text),
+                timeout=self._timeout)
+            call.add_done_callback(lambda unused_call: in_flight.release())
+            calls.append((text, call))
+
+        for text, call in calls:
+            try:
+                response = call.result()
+            except grpc.RpcError as ex:
+                logging.error(f'Error occurred while processing text: {text}, '
+                              f'{ex.code()}: {ex.details()}')
+                continue
+            self.call_count += 1
+            scores[text] = self._positive_score(response)
+            if self._cache is not None and scores[text] is not None:
+                self._cache.put(text, scores[text])
+        if self._cache is not None:
+            self._cache.flush()
+        return [scores.get(text) for text in texts]
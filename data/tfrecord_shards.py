@@ -0,0 +1,177 @@
+"""Sharded TFRecord output of datasets.
+
+Examples are written into `num_shards` files next to each other with
+optional GZIP/ZLIB compression, by a pool of processes, one shard each at
+a time. An index `<outfile>.index.json` lists the shards:
+
+    {
+      "compression": "GZIP",
+      "num_examples": 2412,
+      "shards": [
+        {"path": "finance_data.tfrecord-00000-of-00008", "num_examples": 302,
+         "bytes": 5123456},
+        ...
+      ]
+    }
+
+Examples are built from items by an `ExampleBuilder`, or serialized in
+batches by a `RecordsBuilder` of `write_record_shards`, which is cheaper
+for many small examples.
+
+Readers get shard paths from `load_index` and can interleave them:
+
+    index = tfrecord_shards.load_index('finance_data.tfrecord.index.json')
+    dataset = tf.data.Dataset.from_tensor_slices(index['paths']).interleave(
+        lambda path: tf.data.TFRecordDataset(path, index['compression']),
+        num_parallel_calls=tf.data.AUTOTUNE)
+"""
+
+import functools
+import json
+import multiprocessing
+import os
+from typing import Callable, Dict, Iterable, Optional, Sequence
+
+from absl import logging
+import tensorflow as tf
+
+INDEX_SUFFIX = '.index.json'
+
+# Returns an example of an item, or None to skip it.
+ExampleBuilder = Callable[[object], Optional[tf.train.Example]]
+# Returns serialized examples of an item.
+RecordsBuilder = Callable[[object], Iterable[bytes]]
+
+
+def bytes_feature(values):
+    """Return an bytes_list from str list."""
+    bytes_values = []
+    for v in values:
+        if isinstance(v, str):
+            bytes_values.append(str.encode(v))
+        else:
+            bytes_values.append(v)
+    return tf.train.Feature(bytes_list=tf.train.BytesList(value=bytes_values))
+
+
+def int64_feature(values):
+    """Returns an int64_list from a bool / enum / int / uint list."""
+    return tf.train.Feature(int64_list=tf.train.Int64List(value=values))
+
+
+def float_feature(values):
+    """Returns an float_list from a bool / enum / int / uint list."""
+    return tf.train.Feature(float_list=tf.train.FloatList(value=values))
+
+
+def shard_path(outfile: str, shard: int, num_shards: int) -> str:
+    return f'{outfile}-{shard:05d}-of-{num_shards:05d}'
+
+
+def _compression_type(compression: str) -> str:
+    return '' if compression == 'NONE' else compression
+
+
+def _serialize(build_example: ExampleBuilder, item) -> Iterable[bytes]:
+    example = build_example(item)
+    if example is None:
+        return []
+    return [example.SerializeToString()]
+
+
+def _write_shard(compression: str, build_records: RecordsBuilder, path: str,
+                 items: Sequence) -> Dict:
+    options = tf.io.TFRecordOptions(
+        compression_type=_compression_type(compression))
+    num_examples = 0
+    with tf.io.TFRecordWriter(path, options) as writer:
+        for item in items:
+            for record in build_records(item):
+                writer.write(record)
+                num_examples += 1
+    return {
+        'path': os.path.basename(path),
+        'num_examples': num_examples,
+        'bytes': os.path.getsize(path),
+    }
+
+
+def write_shards(outfile: str,
+                 items: Sequence,
+                 build_example: ExampleBuilder,
+                 num_shards: int = 8,
+                 compression: str = 'GZIP',
+                 num_processes: int = None) -> Dict:
+    """Writes examples of `items` into shards of `outfile` and its index.
+
+    Items are assigned to shards in round robin, so that shards have
+    similar sizes.
+
+    Args:
+        outfile: path prefix of shards.
+        items: items to build examples from. They are sent to writer
+            processes, so they should be picklable.
+        build_example: returns an example of an item, or None to skip it.
+            It should be a picklable module level function (or a partial
+            of it), and should not depend on parsed flags as writer
+            processes don't parse them.
+        num_shards: number of shards.
+        compression: one of 'NONE', 'GZIP' and 'ZLIB'.
+        num_processes: number of writer processes. Number of CPUs if not
+            given.
+
+    Returns:
+        The index.
+    """
+    return write_record_shards(outfile, items,
+                               functools.partial(_serialize, build_example),
+                               num_shards, compression, num_processes)
+
+
+def write_record_shards(outfile: str,
+                        items: Sequence,
+                        build_records: RecordsBuilder,
+                        num_shards: int = 8,
+                        compression: str = 'GZIP',
+                        num_processes: int = None) -> Dict:
+    """Same as `write_shards` with serialized examples of each item.
+
+    An item may be a batch of many examples, e.g. columns of rows.
+    """
+    num_processes = min(num_processes or os.cpu_count(), num_shards)
+    write = functools.partial(_write_shard, compression, build_records)
+    jobs = [(shard_path(outfile, shard, num_shards), items[shard::num_shards])
+            for shard in range(num_shards)]
+    if num_processes > 1:
+        # TensorFlow of the parent is not safe to fork.
+        context = multiprocessing.get_context('spawn')
+        with context.Pool(num_processes) as pool:
+            shards = pool.starmap(write, jobs)
+    else:
+        shards = [write(path, shard_items) for path, shard_items in jobs]
+
+    index = {
+        'compression': compression,
+        'num_examples': sum(shard['num_examples'] for shard in shards),
+        'shards': shards,
+    }
+    with open(outfile + INDEX_SUFFIX, 'w') as f:
+        json.dump(index, f, indent=2)
+    logging.info(f'Wrote {index["num_examples"]} examples into {num_shards} '
+                 f'shards of {outfile}')
+    return index
+
+
+def load_index(index_path: str) -> Dict:
+    """Returns index with `paths` of its shards and their `compression`.
+
+    `compression` is the compression type of `tf.data.TFRecordDataset`.
+    """
+    with open(index_path) as f:
+        index = json.load(f)
+    directory = os.path.dirname(index_path)
+    index['paths'] = [
+        os.path.join(directory, shard['path']) for shard in index['shards']
+    ]
+    index['compression'] = _compression_type(index['compression'])
+    return index
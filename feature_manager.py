@@ -1,21 +1,31 @@
 """Manage various features for stock trading"""
 import abc
-from typing import Optional
+from typing import Dict, Optional
 
 from pykrx import stock
 import FinanceDataReader as fdr
 import numpy as np
 import pandas as pd
 
+import company_index
+import news_index
+
 
 class FeatureManager:
     CANDLE_FEATURES = ['Open', 'Close', 'High', 'Low', 'Volume', 'Change']
     COMPANY_FEATURES = []
     FEATURES = CANDLE_FEATURES + COMPANY_FEATURES
 
-    def __init__(self, market: str):
-        """Initialize feature manager"""
+    def __init__(self, market: str, listing_index=None):
+        """Initialize feature manager
+
+        Args:
+            market: market name.
+            listing_index: (Optional) `listing_index.ListingIndex` of the
+                market.
+        """
         self._market = market
+        self.listing_index = listing_index
 
     @abc.abstractmethod
     def get_feature(self,
@@ -32,9 +42,10 @@ class FinanceDataReaderManager(FeatureManager):
     def __init__(self,
                  market: str,
                  cache_start_date: Optional[str] = None,
-                 cache_end_date: Optional[str] = None):
+                 cache_end_date: Optional[str] = None,
+                 listing_index=None):
         
-        super(FinanceDataReaderManager, self).__init__(market)
+        super(FinanceDataReaderManager, self).__init__(market, listing_index)
 
         self._cache_start_date = cache_start_date
         self._cache_end_date = cache_end_date
@@ -44,14 +55,22 @@ class FinanceDataReaderManager(FeatureManager):
         return (self._cache_start_date is not None and
                 self._cache_end_date is not None)
 
+    def _in_cache_range(self, start, end):
+        return start >= self._cache_start_date and end <= self._cache_end_date
+
     def _has_cached_data(self, code, start, end):
         if not self._is_cache_used():
             return False
+        return code in self._cache and self._in_cache_range(start, end)
 
-        is_loaded = code in self._cache
-        in_range = (start >= self._cache_start_date and
-                    end <= self._cache_end_date)
-        return is_loaded and in_range
+    def set_cache(self, start, end, candles: Dict[str, pd.DataFrame]):
+        """Use `candles` of codes fetched for `[start, end]` as the cache.
+
+        Candles of other codes are fetched for `[start, end]` on request.
+        """
+        self._cache_start_date = start
+        self._cache_end_date = end
+        self._cache = dict(candles)
 
     def get_feature(self,
                     code: str,
@@ -85,6 +104,9 @@ class FinanceDataReaderManager(FeatureManager):
         """Get Candle data"""
         if not self._is_cache_used():
             return fdr.DataReader(code, start, end)
+        # Not to truncate candles out of the cache range.
+        if not self._in_cache_range(start, end):
+            return fdr.DataReader(code, start, end)
 
         if self._has_cached_data(code, start, end):
             # print('use cached data')
@@ -107,25 +129,22 @@ class AnnualFundamentalDataManager(FeatureManager):
 
     def __init__(self,
                  market : str,
-                 filepath: str):
+                 filepath: str,
+                 index_path: Optional[str] = None):
+        """Initialize annual fundamental data manager
+
+        Args:
+            market: market name.
+            filepath: company data TSV of `data/convert_company_data.py`.
+            index_path: (Optional) path to cache `company_index.CompanyIndex`
+                of `filepath`.
+        """
         super().__init__(market)
-        self._fundamental_df = pd.read_csv(
-            filepath,
-            sep='\t',
-            index_col='year',
-            dtype={
-                'code': str,
-                'corp_name': str,
-                'total_equity': np.float32,
-                'sales': np.float32,
-                'profit': np.float32,
-                'net_income': np.float32,
-                'bps': np.float32,
-                'per': np.float32,
-                'eps': np.float32,
-                'debt_ratio': np.float32,
-                'profit_ratio': np.float32,
-            })
+        if index_path:
+            self.company_index = company_index.CompanyIndex.load_or_build(
+                index_path, filepath)
+        else:
+            self.company_index = company_index.CompanyIndex.from_tsv(filepath)
 
     def _get_year(self, dt):
         return pd.to_datetime(dt).year
@@ -147,12 +166,73 @@ class AnnualFundamentalDataManager(FeatureManager):
                              start: Optional[int] = None,
                              end: Optional[int] = None) -> pd.DataFrame:
         """Get annual fundamental data"""
-        df = self._fundamental_df[self._fundamental_df['code'] == code]
-        if start:
-            df = df[df.index >= start]
-        if end:
-            df = df[df.index <= end]
-        return df
+        return self.company_index.code_frame(code, start, end)
+
+    def get_features_of(self, codes, feature_name: str,
+                        year: int) -> np.ndarray:
+        """Get feature values of `codes` in `year`, NaN if missing"""
+        if feature_name not in company_index.NUMERIC_COLUMNS:
+            raise ValueError(f'Invalid feature request: {feature_name}')
+        values, _ = self.company_index.lookup(codes, year)
+        return values[..., company_index.NUMERIC_COLUMNS.index(feature_name)]
+
+
+class NewsFeatureManager(FeatureManager):
+    """Daily news features of `news_index` joinable with candles
+
+    Features are defined on every calendar day, so that they can be
+    reindexed by market dates as candles.
+    """
+    NEWS_FEATURES = list(news_index.FEATURES)
+
+    def __init__(self,
+                 market: str,
+                 news_dir: str,
+                 index_path: Optional[str] = None,
+                 half_life: float = 5.):
+        """Initialize news feature manager
+
+        Args:
+            market: market name.
+            news_dir: output directory of `data/download_news_data.py`.
+            index_path: (Optional) path to cache `news_index.NewsIndex` of
+                `news_dir`.
+            half_life: days to halve sentiment of each news in
+                `decayed_sentiment`.
+        """
+        super().__init__(market)
+        if index_path:
+            self.news_index = news_index.NewsIndex.load_or_build(
+                index_path, news_dir, half_life)
+        else:
+            self.news_index = news_index.NewsIndex.from_news_dir(
+                news_dir, half_life)
+
+    def _feature_index(self, feature_name):
+        if feature_name not in self.NEWS_FEATURES:
+            raise ValueError(f'Invalid feature request: {feature_name}')
+        return self.NEWS_FEATURES.index(feature_name)
+
+    def get_feature(self,
+                    code: str,
+                    feature_name: str,
+                    start: Optional[str] = None,
+                    end: Optional[str] = None):
+        """Get feature value of each day in `[start, end]`"""
+        self._feature_index(feature_name)
+        return self.news_index.code_frame(code, start, end)[feature_name]
+
+    def get_feature_at(self, code: str, feature_name: str, time: str):
+        return self.news_index.lookup(code,
+                                      time)[self._feature_index(feature_name)]
+
+    def get_features_of(self, codes, feature_name: str,
+                        dates) -> np.ndarray:
+        """Get [dates, codes] feature values of `codes` at `dates`"""
+        values = self.news_index.lookup(
+            np.asarray(codes, dtype=str),
+            np.asarray(dates)[:, np.newaxis])
+        return values[..., self._feature_index(feature_name)]
 
 
 class FundamentalDataManager(FeatureManager):
@@ -0,0 +1,335 @@
+"""Hyperparameter search of trading algorithms over back test
+
+Runs random or TPE(Tree-structured Parzen Estimator) style search over the
+declared parameter space of an algorithm. Trials run in parallel worker
+processes, each of which keeps its feature manager and memoized pykrx
+responses warm across trials.
+Trials whose interim return and drawdown are dominated by most of the
+other trials at the same checkpoint are stopped early.
+
+Example usage:
+
+    python hparam_search.py --algorithm MultiFactorMarketTiming \
+        --num_trials 64 --num_workers 8 --sampler tpe
+"""
+
+from concurrent import futures
+import datetime
+import math
+import multiprocessing
+import random
+from typing import Any, Dict, List, Sequence
+
+from absl import app
+from absl import flags
+from absl import logging
+import numpy as np
+
+from algorithm import algorithm
+import back_tester
+import feature_manager as feature_manager_helper
+import listing_index
+
+FLAGS = flags.FLAGS
+flags.DEFINE_integer('num_trials', 32, 'Number of trials.')
+flags.DEFINE_integer('num_workers', 4, 'Number of parallel worker processes.')
+flags.DEFINE_enum('sampler', 'tpe', ['random', 'tpe'], 'Search algorithm.')
+flags.DEFINE_enum('objective', 'profit', ['profit', 'calmar'],
+                  'profit: profit rate, calmar: profit rate / |MDD|.')
+flags.DEFINE_integer('seed', 0, 'Random seed.')
+flags.DEFINE_list('checkpoints', ['0.25', '0.5', '0.75'],
+                  'Progress ratios to consider early stopping.')
+flags.DEFINE_float(
+    'dominated_ratio', 0.5, 'Stop a trial if this ratio of trials reached '
+    'the same checkpoint have both higher return and shallower drawdown.')
+flags.DEFINE_integer('min_peers', 4,
+                     'Minimum number of trials at a checkpoint to compare.')
+
+
+class Int:
+    def __init__(self, low: int, high: int):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: random.Random):
+        return rng.randint(self.low, self.high)
+
+    def to_unit(self, value) -> float:
+        return (value - self.low) / max(self.high - self.low, 1)
+
+    def from_unit(self, unit: float):
+        return int(round(self.low + unit * (self.high - self.low)))
+
+
+class Float:
+    def __init__(self, low: float, high: float):
+        self.low = low
+        self.high = high
+
+    def sample(self, rng: random.Random):
+        return rng.uniform(self.low, self.high)
+
+    def to_unit(self, value) -> float:
+        return (value - self.low) / (self.high - self.low)
+
+    def from_unit(self, unit: float):
+        return self.low + unit * (self.high - self.low)
+
+
+class Choice:
+    def __init__(self, values: Sequence[Any]):
+        self.values = list(values)
+
+    def sample(self, rng: random.Random):
+        return rng.choice(self.values)
+
+
+SEARCH_SPACES = {
+    'MultiFactorMarketTiming': {
+        'stock_num': Int(5, 50),
+        'stock_weight': Float(0.8, 0.99),
+        'ma_windows': Choice([(3, 5, 10), (5, 10, 20), (3, 10), (5, 20),
+                              (10, 20, 60)]),
+        'cap_rank_weight': Float(0., 2.),
+        'per_rank_weight': Float(0., 2.),
+        'pbr_rank_weight': Float(0., 2.),
+    },
+}
+
+
+class RandomSampler:
+    def __init__(self, space: Dict[str, Any], seed: int):
+        self._space = space
+        self._rng = random.Random(seed)
+
+    def suggest(self, history: List[Dict]) -> Dict[str, Any]:
+        del history  # Unused
+        return {
+            name: dist.sample(self._rng)
+            for name, dist in self._space.items()
+        }
+
+
+class TpeSampler(RandomSampler):
+    """Tree-structured Parzen Estimator with independent parameters.
+
+    Samples candidates around the good trials and picks the one maximizing
+    l(x) / g(x), where l and g are the kernel densities of good and bad
+    trials respectively.
+    """
+
+    def __init__(self,
+                 space: Dict[str, Any],
+                 seed: int,
+                 num_startup: int = 8,
+                 gamma: float = 0.25,
+                 num_candidates: int = 24,
+                 bandwidth: float = 0.1):
+        super().__init__(space, seed)
+        self._num_startup = num_startup
+        self._gamma = gamma
+        self._num_candidates = num_candidates
+        self._bandwidth = bandwidth
+
+    def _log_density(self, name, dist, value, trials) -> float:
+        if isinstance(dist, Choice):
+            count = sum(trial['params'][name] == value for trial in trials)
+            return math.log((count + 1) / (len(trials) + len(dist.values)))
+        units = np.array(
+            [dist.to_unit(trial['params'][name]) for trial in trials])
+        kernels = np.exp(-0.5 *
+                         ((dist.to_unit(value) - units) / self._bandwidth)**2)
+        return math.log(kernels.mean() + 1e-12)
+
+    def _sample_around(self, name, dist, good):
+        if isinstance(dist, Choice):
+            if self._rng.random() < 0.2:
+                return dist.sample(self._rng)
+            return self._rng.choice(good)['params'][name]
+        unit = dist.to_unit(self._rng.choice(good)['params'][name])
+        unit = min(max(self._rng.gauss(unit, self._bandwidth), 0.), 1.)
+        return dist.from_unit(unit)
+
+    def suggest(self, history):
+        completed = [trial for trial in history if not trial['stopped']]
+        if len(completed) < self._num_startup:
+            return super().suggest(history)
+
+        completed = sorted(completed, key=lambda t: t['score'], reverse=True)
+        num_good = max(1, int(len(completed) * self._gamma))
+        good, bad = completed[:num_good], completed[num_good:] or completed
+
+        best, best_score = None, -math.inf
+        for _ in range(self._num_candidates):
+            candidate = {
+                name: self._sample_around(name, dist, good)
+                for name, dist in self._space.items()
+            }
+            score = sum(
+                self._log_density(name, dist, candidate[name], good) -
+                self._log_density(name, dist, candidate[name], bad)
+                for name, dist in self._space.items())
+            if score > best_score:
+                best, best_score = candidate, score
+        return best
+
+
+class DominanceStopper:
+    """Early stopping by interim (profit rate, MDD) of peer trials.
+
+    Interim results are shared among worker processes through `board`,
+    a managed dict keyed by checkpoint.
+    """
+
+    def __init__(self, board, lock, checkpoints: Sequence[float],
+                 dominated_ratio: float, min_peers: int):
+        self._board = board
+        self._lock = lock
+        self._checkpoints = sorted(checkpoints)
+        self._dominated_ratio = dominated_ratio
+        self._min_peers = min_peers
+        self._next = 0
+        self.stopped_at = None
+
+    def __call__(self, progress, metric_manager) -> bool:
+        if (self._next >= len(self._checkpoints) or
+                progress < self._checkpoints[self._next]):
+            return False
+        # Scheduled back test may jump over several checkpoints at once.
+        while (self._next < len(self._checkpoints) and
+               progress >= self._checkpoints[self._next]):
+            checkpoint = self._checkpoints[self._next]
+            self._next += 1
+
+        summary = metric_manager.summary()
+        result = (summary['profit_rate'], summary['mdd'])
+        with self._lock:
+            peers = self._board.get(checkpoint, [])
+            self._board[checkpoint] = peers + [result]
+
+        if len(peers) < self._min_peers:
+            return False
+        # MDD is negative percentage, so larger is shallower.
+        dominated = sum(profit > result[0] and mdd > result[1]
+                        for profit, mdd in peers)
+        if dominated / len(peers) >= self._dominated_ratio:
+            self.stopped_at = checkpoint
+            return True
+        return False
+
+
+# Per worker process state which is reused across trials. pykrx responses
+# are memoized per process by `multi_factor_market_timing`.
+_worker_feature_manager = None
+
+
+def _init_worker(start_date, end_date, listing_index_path):
+    global _worker_feature_manager
+    index = None
+    if listing_index_path:
+        index = listing_index.ListingIndex.load_or_build(listing_index_path)
+    _worker_feature_manager = feature_manager_helper.FinanceDataReaderManager(
+        'KRX',
+        cache_start_date=start_date,
+        cache_end_date=end_date,
+        listing_index=index)
+
+
+def _objective(summary, objective):
+    if objective == 'calmar':
+        return summary['profit_rate'] / max(abs(summary['mdd']), 1e-3)
+    return summary['profit_rate']
+
+
+def _run_trial(trial_id, algorithm_name, params, start_date, end_date, budget,
+               objective, stopper):
+    trade_algorithm = algorithm.Algorithm.algorithms[algorithm_name](**params)
+    metric_manager = back_tester.run_back_test(start_date,
+                                               end_date,
+                                               trade_algorithm,
+                                               budget,
+                                               _worker_feature_manager,
+                                               should_stop=stopper)
+    summary = metric_manager.summary()
+    return {
+        'trial_id': trial_id,
+        'params': params,
+        'summary': summary,
+        'score': _objective(summary, objective),
+        'stopped': stopper.stopped_at is not None,
+        'stopped_at': stopper.stopped_at,
+    }
+
+
+def search(algorithm_name: str, start_date, end_date, budget: int,
+           sampler: RandomSampler, num_trials: int, num_workers: int,
+           objective: str, stopper_kwargs: Dict[str, Any],
+           listing_index_path: str = None) -> List[Dict]:
+    """Run search and returns trial results sorted by score."""
+    history = []
+    with multiprocessing.Manager() as manager:
+        board = manager.dict()
+        lock = manager.Lock()
+        with futures.ProcessPoolExecutor(
+                max_workers=num_workers,
+                initializer=_init_worker,
+                initargs=(start_date, end_date,
+                          listing_index_path)) as executor:
+            running = set()
+            submitted = 0
+            while submitted < num_trials or running:
+                while submitted < num_trials and len(running) < num_workers:
+                    params = sampler.suggest(history)
+                    running.add(
+                        executor.submit(
+                            _run_trial, submitted, algorithm_name, params,
+                            start_date, end_date, budget, objective,
+                            DominanceStopper(board, lock, **stopper_kwargs)))
+                    submitted += 1
+                done, running = futures.wait(
+                    running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    trial = future.result()
+                    history.append(trial)
+                    logging.info(
+                        f'Trial {trial["trial_id"]}: score={trial["score"]} '
+                        f'{trial["summary"]} stopped_at={trial["stopped_at"]} '
+                        f'params={trial["params"]}')
+    return sorted(history,
+                  key=lambda t: (not t['stopped'], t['score']),
+                  reverse=True)
+
+
+def main(args):
+    del args  # Unused
+
+    if FLAGS.algorithm not in SEARCH_SPACES:
+        raise ValueError(f'No search space for {FLAGS.algorithm}')
+    space = SEARCH_SPACES[FLAGS.algorithm]
+    if FLAGS.sampler == 'tpe':
+        sampler = TpeSampler(space, FLAGS.seed)
+    else:
+        sampler = RandomSampler(space, FLAGS.seed)
+
+    results = search(FLAGS.algorithm,
+                     datetime.datetime.strptime(FLAGS.start_date, '%Y-%m-%d'),
+                     datetime.datetime.strptime(FLAGS.end_date, '%Y-%m-%d'),
+                     FLAGS.budget,
+                     sampler,
+                     FLAGS.num_trials,
+                     FLAGS.num_workers,
+                     FLAGS.objective,
+                     stopper_kwargs={
+                         'checkpoints': [float(c) for c in FLAGS.checkpoints],
+                         'dominated_ratio': FLAGS.dominated_ratio,
+                         'min_peers': FLAGS.min_peers,
+                     },
+                     listing_index_path=FLAGS.listing_index)
+
+    print('------------ Top trials ------------')
+    for trial in results[:5]:
+        print(f'score={trial["score"]} {trial["summary"]} {trial["params"]}')
+
+
+if __name__ == '__main__':
+    app.run(main)
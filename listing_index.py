@@ -0,0 +1,138 @@
+"""Listing history index of KRX stocks
+
+Each row of the index is one listed interval `[listed_at, delisted_at)` of
+a stock code. A code may have several intervals if it was relisted.
+Currently listed codes have open-ended interval.
+"""
+
+import datetime
+from typing import Optional, Union
+
+from absl import logging
+import FinanceDataReader as fdr
+import numpy as np
+import pandas as pd
+
+_DateLike = Union[str, datetime.date, datetime.datetime, np.datetime64]
+
+# `delisted_at` of currently listed codes.
+_NOT_DELISTED = np.datetime64('9999-12-31', 'D')
+
+
+def _to_day(date: _DateLike) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(date).date(), 'D')
+
+
+class ListingIndex:
+    """Index to look up listed codes at given date."""
+
+    def __init__(self, codes, markets, listed_at, delisted_at):
+        codes = np.asarray(codes, dtype=str)
+        listed_at = np.asarray(listed_at, dtype='datetime64[D]')
+        delisted_at = np.asarray(delisted_at, dtype='datetime64[D]')
+        delisted_at = np.where(np.isnat(delisted_at), _NOT_DELISTED,
+                               delisted_at)
+
+        order = np.lexsort((listed_at, codes))
+        self._codes = codes[order]
+        self._markets = np.asarray(markets, dtype=str)[order]
+        self._listed_at = listed_at[order]
+        self._delisted_at = delisted_at[order]
+
+        # Rows of each code are contiguous after sort.
+        unique_codes, starts = np.unique(self._codes, return_index=True)
+        ends = np.append(starts[1:], len(self._codes))
+        self._code_rows = {
+            code: slice(start, end)
+            for code, start, end in zip(unique_codes, starts, ends)
+        }
+
+    def __len__(self):
+        return len(self._codes)
+
+    @classmethod
+    def from_krx(cls) -> 'ListingIndex':
+        """Build index from current and delisted KRX listings."""
+        listed = fdr.StockListing('KRX')
+        # Rows without listing date are not stocks (ETN, warrants, ...).
+        listed = listed[listed['ListingDate'].notna()]
+        delisted = fdr.StockListing('KRX-DELISTING')
+        delisted = delisted[delisted['ListingDate'].notna()]
+        logging.info(f'Listed: {len(listed)}, delisted: {len(delisted)}')
+        return cls(
+            codes=np.concatenate(
+                [listed['Symbol'].values, delisted['Symbol'].values]),
+            markets=np.concatenate(
+                [listed['Market'].values, delisted['Market'].values]),
+            listed_at=np.concatenate(
+                [listed['ListingDate'].values, delisted['ListingDate'].values]),
+            delisted_at=np.concatenate([
+                np.full(len(listed), np.datetime64('NaT'), 'datetime64[D]'),
+                delisted['DelistingDate'].values
+            ]))
+
+    @classmethod
+    def load(cls, path: str) -> 'ListingIndex':
+        with np.load(path) as data:
+            return cls(data['codes'], data['markets'], data['listed_at'],
+                       data['delisted_at'])
+
+    @classmethod
+    def load_or_build(cls, path: str) -> 'ListingIndex':
+        """Load index cached at `path` or build from KRX and cache it."""
+        try:
+            return cls.load(path)
+        except FileNotFoundError:
+            logging.info(f'Building listing index to {path}')
+        index = cls.from_krx()
+        index.save(path)
+        return index
+
+    def save(self, path: str):
+        # Pass file object not to let numpy append '.npz' to the path.
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     codes=self._codes,
+                     markets=self._markets,
+                     listed_at=self._listed_at,
+                     delisted_at=self._delisted_at)
+
+    def listed_mask(self, date: _DateLike) -> np.ndarray:
+        """Returns boolean mask of rows listed at `date`."""
+        day = _to_day(date)
+        return (self._listed_at <= day) & (day < self._delisted_at)
+
+    def universe_at(self,
+                    date: _DateLike,
+                    market: Optional[str] = None) -> np.ndarray:
+        """Returns sorted codes listed at `date`."""
+        mask = self.listed_mask(date)
+        if market is not None:
+            mask &= self._markets == market
+        return np.unique(self._codes[mask])
+
+    def _is_listed_on(self, code: str, day: np.datetime64) -> bool:
+        rows = self._code_rows.get(code)
+        if rows is None:
+            return False
+        return bool(
+            np.any((self._listed_at[rows] <= day) &
+                   (day < self._delisted_at[rows])))
+
+    def is_listed(self, code: str, date: _DateLike) -> bool:
+        return self._is_listed_on(code, _to_day(date))
+
+    def are_listed(self, codes, date: _DateLike) -> np.ndarray:
+        """Returns boolean mask of `codes` listed at `date`.
+
+        Only intervals of `codes` are looked up, not the whole index.
+        """
+        day = _to_day(date)
+        return np.array([self._is_listed_on(code, day) for code in codes],
+                        dtype=bool)
+
+    def delisted_between(self, start: _DateLike, end: _DateLike) -> pd.Series:
+        """Returns delisting dates in `(start, end]` indexed by code."""
+        mask = ((_to_day(start) < self._delisted_at) &
+                (self._delisted_at <= _to_day(end)))
+        return pd.Series(self._delisted_at[mask], index=self._codes[mask])
@@ -0,0 +1,139 @@
+"""Throughput benchmark of `finance_dataset` on CPU.
+
+Reports examples (windows) per second of
+- read: reading and parsing records only.
+- cold: the first batches of the pipeline, filling its cache and shuffle
+  buffer.
+- warm: following batches from the cache.
+- warm+company: the same with fundamentals joined from `company_table`.
+
+Runs on fake data of `fake_finance_data` unless --finance_data is given.
+
+Example usage:
+
+    python benchmark_finance_dataset.py --num_batches 500
+    python benchmark_finance_dataset.py \
+        --finance_data ~/tmp/finance_data.tfrecord.index.json \
+        --company_data ~/tmp/financial_data.txt
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from absl import app
+from absl import flags
+import numpy as np
+import pandas as pd
+import tensorflow as tf
+
+import company_table
+import finance_dataset
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'data'))
+# pylint: disable=wrong-import-position
+import download_finance_data
+import fake_finance_data
+import tfrecord_shards
+# pylint: enable=wrong-import-position
+
+flags.DEFINE_string(
+    'finance_data', None, 'Index of finance data shards or a TFRecord file. '
+    'Fake data if not given.')
+flags.DEFINE_string('company_data', None,
+                    'Company data TSV. Fake data if not given.')
+flags.DEFINE_integer('num_fake_symbols', 200, 'Number of fake symbols.')
+flags.DEFINE_integer('batch_size', 256, 'Batch size.')
+flags.DEFINE_integer('window', 20, 'Number of days of each window.')
+flags.DEFINE_integer('num_batches', 500, 'Number of batches to measure.')
+flags.DEFINE_integer('shuffle_buffer', 100_000,
+                     'Number of windows to shuffle over.')
+
+FLAGS = flags.FLAGS
+
+
+def _fake_finance_data(directory, source):
+    outfile = os.path.join(directory, 'finance_data.tfrecord')
+    items = [(symbol, source.read(symbol))
+             for symbol in source.listing()['Symbol']]
+    tfrecord_shards.write_shards(
+        outfile,
+        items,
+        lambda item: download_finance_data.build_example(*item),
+        num_shards=8,
+        num_processes=1)
+    return outfile + tfrecord_shards.INDEX_SUFFIX
+
+
+def _fake_company_data(directory, source):
+    rng = np.random.default_rng(0)
+    symbols = source.listing()['Symbol']
+    years = range(2014, pd.Timestamp.today().year + 1)
+    df_company = pd.DataFrame([(symbol, f'Fake{symbol}', year)
+                               for symbol in symbols
+                               for year in years],
+                              columns=['code', 'corp_name', 'year'])
+    for column in company_table.NUMERIC_COLUMNS:
+        df_company[column] = rng.normal(size=len(df_company)).round(2)
+    path = os.path.join(directory, 'company_data.tsv')
+    df_company.to_csv(path, sep='\t', index=False)
+    return path
+
+
+def _examples_per_sec(iterator, num_batches):
+    started = time.perf_counter()
+    num_examples = 0
+    for _ in range(num_batches):
+        _, labels = next(iterator)
+        num_examples += labels.shape[0]
+    return num_examples / (time.perf_counter() - started)
+
+
+def _bench_read(path):
+    paths, compression = finance_dataset.shard_paths(path)
+    dataset = tf.data.Dataset.from_tensor_slices(paths).interleave(
+        lambda path: tf.data.TFRecordDataset(path, compression),
+        num_parallel_calls=tf.data.AUTOTUNE).map(
+            finance_dataset.parse_example,
+            num_parallel_calls=tf.data.AUTOTUNE)
+    started = time.perf_counter()
+    num_examples = sum(1 for _ in dataset)
+    return num_examples / (time.perf_counter() - started)
+
+
+def _bench_pipeline(path, companies):
+    dataset = finance_dataset.make_dataset(path,
+                                           companies=companies,
+                                           window=FLAGS.window,
+                                           batch_size=FLAGS.batch_size,
+                                           shuffle_buffer=FLAGS.shuffle_buffer,
+                                           seed=0)
+    iterator = iter(dataset)
+    cold = _examples_per_sec(iterator, FLAGS.num_batches)
+    warm = _examples_per_sec(iterator, FLAGS.num_batches)
+    return cold, warm
+
+
+def main(unused_args):
+    with tempfile.TemporaryDirectory() as directory:
+        source = fake_finance_data.FakeFinanceDataSource(
+            FLAGS.num_fake_symbols, latency=0)
+        finance_data = FLAGS.finance_data or _fake_finance_data(
+            directory, source)
+        company_data = FLAGS.company_data or _fake_company_data(
+            directory, source)
+
+        print(f'read: {_bench_read(finance_data):.1f} records/s')
+        cold, warm = _bench_pipeline(finance_data, None)
+        print(f'cold: {cold:.0f} examples/s')
+        print(f'warm: {warm:.0f} examples/s')
+        _, warm = _bench_pipeline(finance_data,
+                                  company_table.load(company_data))
+        print(f'warm+company: {warm:.0f} examples/s')
+
+
+if __name__ == '__main__':
+    app.run(main)
@@ -1,7 +1,7 @@
 """Company fundamental table.
 
-The tables are looked up with company code and year joined by '@'
-to result one of following value corresponding lookup key.
+The table is looked up with company code and year joined by '@'
+to result following values corresponding lookup key.
 
 - corp_name
 - total_equity
@@ -14,78 +14,108 @@ to result one of following value corresponding lookup key.
 - debt_ratio
 - profit_ratio
 
+Keys are looked up once in a hash table of row indices, and numeric
+values of all columns are gathered at once from a packed float32 matrix.
+
 NOTE: The tables should be updated once a year at least. Check and
 warn if it seems not?
 """
 
+import os
+import sys
+from typing import Sequence, Tuple, Union
+
 import numpy as np
-import pandas as pd
 import tensorflow as tf
 
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'data'))
+import company_schema  # pylint: disable=wrong-import-position
+
+# Columns of values of `CompanyTable.lookup` in order.
+NUMERIC_COLUMNS = company_schema.NUMERIC_COLUMNS
+
+
+class CompanyTable(tf.Module):
+    """Company fundamentals looked up by 'code@year' keys.
+
+    Args:
+        keys: 'code@year' of each row.
+        names: corp_name of each row.
+        values: [rows, len(NUMERIC_COLUMNS)] values of each row.
+        default_value: value of missing keys, either a scalar or a value of
+            each column.
+    """
 
-def load(filepath):
-    """Returns dict of StaticHashTable's company fundamental data loaded.
+    def __init__(self,
+                 keys: Sequence[str],
+                 names: Sequence[str],
+                 values: np.ndarray,
+                 default_value: Union[float, Sequence[float]] = 0.):
+        super().__init__()
+        num_rows = len(keys)
+        initializer = tf.lookup.KeyValueTensorInitializer(
+            tf.constant(keys, tf.string),
+            tf.range(num_rows, dtype=tf.int64))
+        # Missing keys are looked up to the last row of defaults.
+        self._index = tf.lookup.StaticHashTable(initializer,
+                                                default_value=num_rows)
+        default_row = np.broadcast_to(
+            np.asarray(default_value, np.float32),
+            (1, len(NUMERIC_COLUMNS)))
+        self._values = tf.constant(
+            np.concatenate([np.asarray(values, np.float32), default_row]))
+        self._names = tf.constant(list(names) + [''], tf.string)
+        self._num_rows = num_rows
+
+    def _rows(self, keys):
+        return self._index.lookup(tf.convert_to_tensor(keys, tf.string))
+
+    def lookup(self, keys) -> Tuple[tf.Tensor, tf.Tensor]:
+        """Returns values of `keys` and whether each key is found.
+
+        Values are [..., len(NUMERIC_COLUMNS)] float32 in order of
+        `NUMERIC_COLUMNS`, and the default for missing keys.
+        """
+        rows = self._rows(keys)
+        return tf.gather(self._values, rows), rows < self._num_rows
+
+    def lookup_names(self, keys) -> tf.Tensor:
+        """Returns corp_name of `keys`, or '' for missing keys."""
+        return tf.gather(self._names, self._rows(keys))
+
+
+def load(filepath: str,
+         default_value: Union[float, Sequence[float]] = 0.) -> CompanyTable:
+    """Returns `CompanyTable` of company fundamental data loaded.
+
+    `filepath` is a company data TSV, or `.npz` columns of
+    `convert_company_data.py --output_format npz`.
 
     NOTE: Do not forget to run initializers if used in tensorflow
     graph mode.
     """
-    # TODO(jaesup): Dedup with `convert_company_data.py`.
-    df_company = pd.read_csv(
-        filepath,
-        sep='\t',
-        dtype={
-            'code': str,
-            'year': str,
-            'corp_name': str,
-            'total_equity': np.float32,
-            'sales': np.float32,
-            'profit': np.float32,
-            'net_income': np.float32,
-            'bps': np.float32,
-            'per': np.float32,
-            'eps': np.float32,
-            'debt_ratio': np.float32,
-            'profit_ratio': np.float32,
-        })
-
-    tables = {}
-
-    # Key tensor is common among all lookup tables.
-    keys_t = tf.constant(df_company['code'] + '@' + df_company['year'])
-
-    # Company name lookup table value dtype is tf.string.
-    vals_t = tf.constant(df_company['corp_name'])
-    initializer = tf.lookup.KeyValueTensorInitializer(keys_t, vals_t)
-    tables['corp_name'] = tf.lookup.StaticHashTable(
-        initializer, default_value='')
-
-    # Other lookup tables, dtype is tf.float32.
-    for colname in [
-            'total_equity',
-            'sales',
-            'profit',
-            'net_income',
-            'bps',
-            'per',
-            'eps',
-            'debt_ratio',
-            'profit_ratio',
-    ]:
-        vals_t = tf.constant(df_company[colname])
-        initializer = tf.lookup.KeyValueTensorInitializer(keys_t, vals_t)
-        tables[colname] = tf.lookup.StaticHashTable(
-            initializer, default_value=0)  # TODO(jaesup): Is OK default 0?
-
-    return tables
+    if filepath.endswith('.npz'):
+        columns = company_schema.load_columns(filepath)
+    else:
+        columns = company_schema.to_columns(
+            company_schema.read_company_data(filepath))
+    keys = np.char.add(np.char.add(columns['code'], '@'), columns['year'])
+    return CompanyTable(keys, columns['corp_name'],
+                        np.stack([columns[c] for c in NUMERIC_COLUMNS],
+                                 axis=1), default_value)
 
 
 def _test(filepath):
-    tables = load(filepath)
-    print('lookup corp_name:',
-          tables['corp_name'].lookup(tf.constant(['', '017960@2020'])))
-    print('lookup per:', tables['per'].lookup(tf.constant(['', '017960@2020'])))
+    table = load(filepath, default_value=np.nan)
+    keys = tf.constant(['', '017960@2020'])
+    print('lookup corp_name:', table.lookup_names(keys))
+    values, found = table.lookup(keys)
+    print('lookup per:', values[:, NUMERIC_COLUMNS.index('per')])
     print('lookup profit_ratio:',
-          tables['profit_ratio'].lookup(tf.constant(['', '017960@2020'])))
+          values[:, NUMERIC_COLUMNS.index('profit_ratio')])
+    print('found:', found)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,198 @@
+"""tf.data input pipeline of daily OHLCVC training windows.
+
+Reads examples of `data/download_finance_data.py`, one example per code
+holding its whole daily history, and generates sliding windows of
+`window` days with the log return of close over the next `horizon` days
+as the label. Fundamentals of the code are joined from `company_table`.
+
+Windows of a code are cut at once with `tf.gather` over the parsed
+history instead of `Dataset.window`, and histories are cached after
+parsing, so epochs after the first skip reading and decoding records.
+
+Example usage:
+
+    dataset = finance_dataset.make_dataset(
+        'finance_data.tfrecord.index.json',
+        companies=company_table.load('financial_data.txt'))
+    for features, labels in dataset:
+        ...
+"""
+
+import os
+import sys
+import tensorflow as tf
+
+import company_table
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                 'data'))
+import tfrecord_shards  # pylint: disable=wrong-import-position
+
+# Columns of each day in `ohlcvc` feature in order.
+OHLCVC_COLUMNS = ('open', 'high', 'low', 'close', 'volume', 'change')
+
+_FEATURE_SPEC = {
+    'code': tf.io.FixedLenFeature([], tf.string),
+    'date': tf.io.VarLenFeature(tf.string),
+    **{
+        column: tf.io.VarLenFeature(tf.float32)
+        for column in OHLCVC_COLUMNS
+    },
+}
+
+
+def shard_paths(path: str):
+    """Returns (paths, compression) of `path`, an index or a TFRecord."""
+    if path.endswith(tfrecord_shards.INDEX_SUFFIX):
+        index = tfrecord_shards.load_index(path)
+        return index['paths'], index['compression']
+    return [path], ''
+
+
+def parse_example(serialized):
+    """Returns code, dates and [days, 6] OHLCVC history of an example."""
+    parsed = tf.io.parse_single_example(serialized, _FEATURE_SPEC)
+    return {
+        'code': parsed['code'],
+        'date': tf.sparse.to_dense(parsed['date']),
+        # [days, len(OHLCVC_COLUMNS)]
+        'ohlcvc': tf.stack([
+            tf.sparse.to_dense(parsed[column]) for column in OHLCVC_COLUMNS
+        ],
+                           axis=1),
+    }
+
+
+def _windows(history, window: int, horizon: int):
+    """Returns all windows of a code history and their labels."""
+    ohlcvc = history['ohlcvc']
+    num_days = tf.shape(ohlcvc)[0]
+    # Index of the last day of each window.
+    ends = tf.range(window - 1, num_days - horizon)
+    # [num_windows, window]
+    days = ends[:, tf.newaxis] + tf.range(-window + 1, 1)[tf.newaxis, :]
+    frames = tf.gather(ohlcvc, days)
+    close = ohlcvc[:, OHLCVC_COLUMNS.index('close')]
+    last_close = tf.gather(close, ends)
+    labels = tf.math.log(
+        tf.math.divide_no_nan(tf.gather(close, ends + horizon), last_close))
+
+    # Prices relative to the last close, log volume, and change without NaN
+    # of the first day.
+    prices = tf.math.divide_no_nan(frames[..., :4],
+                                   last_close[:, tf.newaxis, tf.newaxis])
+    volume = tf.math.log1p(frames[..., 4:5])
+    change = frames[..., 5:6]
+    change = tf.where(tf.math.is_nan(change), tf.zeros_like(change), change)
+    features = tf.concat([prices, volume, change], axis=-1)
+
+    # Drop windows over suspended days of zero prices.
+    valid = tf.math.is_finite(labels) & tf.reduce_all(
+        tf.math.is_finite(features), axis=[1, 2])
+    num_windows = tf.shape(ends)[0]
+    return {
+        'code': tf.boolean_mask(tf.fill([num_windows], history['code']),
+                                valid),
+        'date': tf.boolean_mask(tf.gather(history['date'], ends), valid),
+        'ohlcvc': tf.boolean_mask(features, valid),
+    }, tf.boolean_mask(labels, valid)
+
+
+def _join_fundamentals(companies: company_table.CompanyTable):
+
+    def _join(features, labels):
+        # Annual reports of a year are published in the next year. Use the
+        # report of the previous year not to look ahead.
+        year = tf.strings.to_number(tf.strings.substr(features['date'], 0, 4),
+                                    tf.int32) - 1
+        keys = features['code'] + '@' + tf.strings.as_string(year)
+        features['fundamentals'], features['has_fundamentals'] = (
+            companies.lookup(keys))
+        return features, labels
+
+    return _join
+
+
+def make_dataset(path: str,
+                 companies: company_table.CompanyTable = None,
+                 window: int = 20,
+                 horizon: int = 1,
+                 batch_size: int = 256,
+                 shuffle_buffer: int = 100_000,
+                 cache_file: str = '',
+                 training: bool = True,
+                 seed: int = None) -> tf.data.Dataset:
+    """Returns dataset of batches of (features, labels).
+
+    Features are
+    - `code`: [batch] string.
+    - `date`: [batch] string of the last day of the window.
+    - `ohlcvc`: [batch, window, 6] float32 of `OHLCVC_COLUMNS`. Prices are
+      relative to the last close and volume is log1p.
+    - `fundamentals`: [batch, 9] float32 of `company_table.NUMERIC_COLUMNS`,
+      and `has_fundamentals`: [batch] bool whether they are found, if
+      `companies` is given.
+    Labels are [batch] log return of close over `horizon` days after the
+    window.
+
+    Args:
+        path: index of TFRecord shards, or a TFRecord file.
+        companies: fundamentals of companies to join.
+        window: number of days of each window.
+        horizon: number of days to the label.
+        batch_size: number of windows of each batch.
+        shuffle_buffer: number of windows to shuffle over.
+        cache_file: file to cache parsed histories. Cached in memory if
+            empty.
+        training: shuffle and repeat forever, and drop the last partial
+            batch.
+        seed: seed of shuffles.
+    """
+    paths, compression = shard_paths(path)
+    dataset = tf.data.Dataset.from_tensor_slices(paths)
+    if training:
+        dataset = dataset.shuffle(len(paths), seed=seed)
+    dataset = dataset.interleave(
+        lambda path: tf.data.TFRecordDataset(path, compression),
+        cycle_length=tf.data.AUTOTUNE,
+        num_parallel_calls=tf.data.AUTOTUNE,
+        deterministic=not training)
+    dataset = dataset.map(parse_example, num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.cache(cache_file)
+    if training:
+        dataset = dataset.repeat()
+
+    dataset = dataset.map(lambda history: _windows(history, window, horizon),
+                          num_parallel_calls=tf.data.AUTOTUNE,
+                          deterministic=not training)
+    dataset = dataset.unbatch()
+    if training:
+        dataset = dataset.shuffle(shuffle_buffer, seed=seed)
+    dataset = dataset.batch(batch_size,
+                            drop_remainder=training,
+                            num_parallel_calls=tf.data.AUTOTUNE,
+                            deterministic=not training)
+    if companies is not None:
+        # Batched lookups are cheaper than lookups of each window.
+        dataset = dataset.map(_join_fundamentals(companies),
+                              num_parallel_calls=tf.data.AUTOTUNE)
+    dataset = dataset.prefetch(tf.data.AUTOTUNE)
+
+    options = tf.data.Options()
+    options.experimental_optimization.map_parallelization = True
+    # NOTE: `parallel_batch` optimization hangs after `unbatch` in TF 2.6.
+    return dataset.with_options(options)
+
+
+def count_windows(path: str, window: int = 20, horizon: int = 1) -> int:
+    """Returns number of windows in an epoch of `path`."""
+    dataset = make_dataset(path,
+                           window=window,
+                           horizon=horizon,
+                           batch_size=4096,
+                           training=False)
+    return int(
+        dataset.reduce(tf.constant(0, tf.int64),
+                       lambda count, batch: count + tf.size(
+                           batch[1], out_type=tf.int64)))
@@ -0,0 +1,224 @@
+"""Daily news sentiment index of KRX stocks
+
+Each row of the index aggregates news of a code on a date with news, read
+from the output directory of `data/download_news_data.py`:
+
+- news_count: number of news.
+- mean_sentiment, max_sentiment: of sentiment scores of the news, NaN if
+  none of them is scored.
+- decayed_sentiment: sum of scores off neutral 0.5 of news up to the date,
+  each halved every `half_life` days after it. Positive after positive
+  news, and decays to 0 without news.
+
+Rows are sorted by code and date, and looked up for many codes and dates
+at once with `np.searchsorted`. Dates without news have no news and the
+decayed sentiment of the last news date.
+"""
+
+import datetime
+import json
+import os
+from typing import Optional, Union
+
+from absl import logging
+import numpy as np
+import pandas as pd
+
+_DateLike = Union[str, datetime.date, datetime.datetime, np.datetime64]
+
+FEATURES = ('news_count', 'mean_sentiment', 'max_sentiment',
+            'decayed_sentiment')
+
+NEUTRAL_SCORE = 0.5
+
+# Same as `data/download_news_data.py`.
+_MANIFEST = 'manifest.json'
+
+# Dates are days since epoch below this in keys of code and date.
+_DAYS_PER_CODE = 1 << 20
+
+
+def _to_days(dates) -> np.ndarray:
+    """Returns days since epoch of `dates`."""
+    dates = np.asarray(dates)
+    days = pd.to_datetime(dates.ravel()).values.astype('datetime64[D]')
+    return days.astype(np.int64).reshape(dates.shape)
+
+
+def _read_news(path: str) -> pd.DataFrame:
+    """Returns date and score of news in a file of `download_news_data`."""
+    dates, scores = [], []
+    with open(path) as f:
+        for line in f:
+            fields = line.rstrip('\n').split('\t')
+            dates.append(fields[0])
+            # Unscored, or scored without the positive label.
+            score = float(fields[2]) if len(fields) > 2 else np.nan
+            scores.append(score if score >= 0 else np.nan)
+    return pd.DataFrame({
+        'date': pd.to_datetime(dates, format='%Y.%m.%d'),
+        'score': np.array(scores, dtype=np.float32),
+    })
+
+
+def _decay(codes, days, offsets, half_life: float) -> np.ndarray:
+    """Returns decayed sums of `offsets` of rows sorted by code and day."""
+    same_code = np.zeros(len(codes), dtype=bool)
+    same_code[1:] = codes[1:] == codes[:-1]
+    factors = np.where(same_code,
+                       np.power(0.5, np.diff(days, prepend=0) / half_life),
+                       0.)
+    decayed = []
+    last = 0.
+    for factor, offset in zip(factors.tolist(), offsets.tolist()):
+        last = last * factor + offset
+        decayed.append(last)
+    return np.array(decayed, dtype=np.float32)
+
+
+class NewsIndex:
+    """Index to look up daily news features by code and date."""
+
+    def __init__(self, codes, dates, values, half_life: float):
+        codes = np.asarray(codes, dtype=str)
+        dates = np.asarray(dates, dtype='datetime64[D]')
+        order = np.lexsort((dates, codes))
+        self._codes = codes[order]
+        self._dates = dates[order]
+        self._values = np.asarray(values, dtype=np.float32)[order]
+        self.half_life = float(half_life)
+
+        self._unique_codes, code_ids = np.unique(self._codes,
+                                                 return_inverse=True)
+        self._keys = (code_ids.astype(np.int64) * _DAYS_PER_CODE +
+                      self._dates.astype(np.int64))
+
+    def __len__(self):
+        return len(self._codes)
+
+    @classmethod
+    def from_news_dir(cls, news_dir: str,
+                      half_life: float = 5.) -> 'NewsIndex':
+        """Build index from news of codes in the manifest of `news_dir`."""
+        with open(os.path.join(news_dir, _MANIFEST)) as f:
+            codes = sorted(json.load(f))
+        frames = []
+        for code in codes:
+            news = _read_news(os.path.join(news_dir, f'{code}.tsv'))
+            if not len(news):
+                continue
+            # Sizes count all news, and counts count scored news.
+            daily = news.groupby('date')['score'].agg(
+                ['size', 'count', 'mean', 'max', 'sum'])
+            daily['code'] = code
+            frames.append(daily.reset_index())
+        if not frames:
+            return cls([], [], np.zeros((0, len(FEATURES))), half_life)
+        # Sorted by code and date.
+        daily = pd.concat(frames, ignore_index=True)
+        decayed = _decay(daily['code'].values,
+                         _to_days(daily['date'].values),
+                         (daily['sum'] - NEUTRAL_SCORE * daily['count']).values,
+                         half_life)
+        return cls(
+            daily['code'].values, daily['date'].values,
+            np.stack([
+                daily['size'].values, daily['mean'].values,
+                daily['max'].values, decayed
+            ],
+                     axis=1), half_life)
+
+    @classmethod
+    def load(cls, path: str) -> 'NewsIndex':
+        with np.load(path) as data:
+            return cls(data['codes'], data['dates'], data['values'],
+                       data['half_life'].item())
+
+    @classmethod
+    def load_or_build(cls,
+                      path: str,
+                      news_dir: str,
+                      half_life: float = 5.) -> 'NewsIndex':
+        """Load index cached at `path` or build from `news_dir` and cache it.
+
+        The cache is rebuilt if news were crawled after it, or if it has
+        another `half_life`.
+        """
+        try:
+            if (os.path.getmtime(path) >= os.path.getmtime(
+                    os.path.join(news_dir, _MANIFEST))):
+                index = cls.load(path)
+                if index.half_life == half_life:
+                    return index
+        except FileNotFoundError:
+            pass
+        logging.info(f'Building news index to {path}')
+        index = cls.from_news_dir(news_dir, half_life)
+        index.save(path)
+        return index
+
+    def save(self, path: str):
+        # Pass file object not to let numpy append '.npz' to the path.
+        with open(path, 'wb') as f:
+            np.savez(f,
+                     codes=self._codes,
+                     dates=self._dates,
+                     values=self._values,
+                     half_life=self.half_life)
+
+    def lookup(self, codes, dates: _DateLike) -> np.ndarray:
+        """Returns [..., len(FEATURES)] features of `codes` at `dates`.
+
+        `codes` and `dates` are broadcast, e.g. codes of shape [codes] and
+        dates of shape [dates, 1] result [dates, codes, len(FEATURES)].
+        """
+        codes = np.asarray(codes, dtype=str)
+        days = _to_days(dates)
+        codes, days = np.broadcast_arrays(codes, days)
+        values = np.zeros(codes.shape + (len(FEATURES),), dtype=np.float32)
+        values[..., 1:3] = np.nan
+        if not len(self._keys):
+            return values
+
+        code_ids = np.asarray(np.searchsorted(self._unique_codes, codes))
+        known = np.asarray(code_ids < len(self._unique_codes))
+        known[known] = self._unique_codes[code_ids[known]] == codes[known]
+        keys = code_ids.astype(np.int64) * _DAYS_PER_CODE + days
+        # The last row of the code on or before the date.
+        rows = np.asarray(np.searchsorted(self._keys, keys, side='right') - 1)
+        found = np.asarray(known & (rows >= 0))
+        found[found] = (self._keys[rows[found]] // _DAYS_PER_CODE ==
+                        code_ids[found])
+
+        row_days = self._dates[rows[found]].astype(np.int64)
+        same_day = np.zeros_like(found)
+        same_day[found] = row_days == days[found]
+        values[same_day, :3] = self._values[rows[same_day], :3]
+        values[found, 3] = self._values[rows[found], 3] * np.power(
+            0.5, (days[found] - row_days) / self.half_life)
+        return values
+
+    def code_frame(self,
+                   code: str,
+                   start: Optional[_DateLike] = None,
+                   end: Optional[_DateLike] = None) -> pd.DataFrame:
+        """Returns features of `code` of each day in `[start, end]`.
+
+        `start` and `end` are the first and the last news dates of `code`
+        if not given.
+        """
+        if start is None or end is None:
+            first = np.searchsorted(self._codes, code)
+            last = np.searchsorted(self._codes, code, side='right')
+            if first == last:
+                return pd.DataFrame(columns=FEATURES,
+                                    index=pd.DatetimeIndex([], name='Date'),
+                                    dtype=np.float32)
+            start = self._dates[first] if start is None else start
+            end = self._dates[last - 1] if end is None else end
+        dates = pd.date_range(pd.Timestamp(start).normalize(),
+                              pd.Timestamp(end).normalize(),
+                              name='Date')
+        return pd.DataFrame(self.lookup(code, dates.values),
+                            index=dates,
+                            columns=FEATURES)
@@ -1,87 +1,294 @@
-"""Realtime Trader"""
+"""Realtime Trader
 
-import copy
+Runs the trading algorithm on an asyncio event loop with timers aligned to
+the KRX session:
+
+- pre-open: 08:30, before the opening auction.
+- bar close: every `--bar_minutes` from 09:00 during the regular session.
+- close auction: 15:20, when the closing auction starts.
+
+Data fetches for the watched codes run concurrently and blocking algorithm
+and broker calls are handed off to a thread pool. Candles are daily ones of
+FinanceDataReader by default, so bar closes re-run the algorithm on the same
+daily data until the day closes. `--candle_source=broker_minute` fetches
+minute candles of `--bar_minutes` from the broker instead.
+
+Latency from each timer (bar close) to order submission is measured and
+logged.
+"""
+
+import asyncio
+from concurrent import futures
 import datetime
-import sched
 import time
-from typing import List
+from typing import Callable, Dict, List, Tuple
 
 from absl import app
 from absl import flags
+from absl import logging
+import numpy as np
+import pandas as pd
 
-import algorithm
+from algorithm import algorithm
 import feature_manager
 import trading_manager
 
 FLAGS = flags.FLAGS
-flags.DEFINE_integer('frequency', 60 * 60 * 24, 'Iterating frequency (in sec)')
+flags.DEFINE_integer('budget', 10_000_000, 'Budget for trading.')
+flags.DEFINE_integer('bar_minutes', 60, 'Bar length (in minutes) to run on.')
+flags.DEFINE_list('codes', [], 'Codes to prefetch features on every run.')
+flags.DEFINE_string('cybos_address', 'localhost:11231',
+                    'Address of Cybos wrapper service.')
+flags.DEFINE_integer('max_workers', 16,
+                     'Number of threads for blocking data and broker calls.')
+flags.DEFINE_enum(
+    'candle_source', 'daily', ['daily', 'broker_minute'],
+    'daily: daily candles of FinanceDataReader, broker_minute: minute '
+    'candles of `--bar_minutes` from the Cybos wrapper service.')
+
+PRE_OPEN = 'pre_open'
+BAR_CLOSE = 'bar_close'
+CLOSE_AUCTION = 'close_auction'
+
+
+class MarketSession:
+    """KRX trading session timer."""
+
+    PRE_OPEN_TIME = datetime.time(8, 30)
+    OPEN_TIME = datetime.time(9, 0)
+    CLOSE_AUCTION_TIME = datetime.time(15, 20)
+
+    def __init__(self, bar_minutes: int):
+        self._bar_minutes = bar_minutes
 
+    @staticmethod
+    def is_trading_day(day: datetime.date) -> bool:
+        # TODO(agent): Consider KRX holidays.
+        return day.isoweekday() <= 5
 
-def _trading_sell_handler(context, trader, trading):
-    transactions = trader.sell(trading)
-    remained_stocks = copy.deepcopy(context.basket)
-    returned_budget = 0
+    def _events_of_day(
+            self, day: datetime.date) -> List[Tuple[datetime.datetime, str]]:
+        events = [(datetime.datetime.combine(day, self.PRE_OPEN_TIME),
+                   PRE_OPEN)]
+        bar_close = datetime.datetime.combine(day, self.OPEN_TIME)
+        close_auction = datetime.datetime.combine(day, self.CLOSE_AUCTION_TIME)
+        bar_length = datetime.timedelta(minutes=self._bar_minutes)
+        while bar_close + bar_length < close_auction:
+            bar_close += bar_length
+            events.append((bar_close, BAR_CLOSE))
+        events.append((close_auction, CLOSE_AUCTION))
+        return events
 
-    for trans in transactions:
-        remaining_sold_amount = trans.amount
-        updated_basket = []
-        for owned_stock in remained_stocks:
-            # Stock code is not matched
-            if owned_stock.code != trans.code:
-                updated_basket.append(owned_stock)
+    def next_event(
+            self, now: datetime.datetime) -> Tuple[datetime.datetime, str]:
+        """Returns (time, kind) of the first event after `now`."""
+        day = now.date()
+        while True:
+            if self.is_trading_day(day):
+                for event_time, kind in self._events_of_day(day):
+                    if event_time > now:
+                        return event_time, kind
+            day += datetime.timedelta(days=1)
+
+
+class LatencyRecorder:
+    """Records per iteration latencies in seconds by stage."""
+
+    STAGES = ['fetch', 'algorithm', 'order', 'total']
+
+    def __init__(self):
+        self._latencies = {stage: [] for stage in self.STAGES}
+
+    def record(self, stage: str, seconds: float):
+        self._latencies[stage].append(seconds)
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Returns count, p50, p95 and max latency of each stage."""
+        summary = {}
+        for stage, latencies in self._latencies.items():
+            if not latencies:
                 continue
-            # Stock is more than sold amount
-            if owned_stock.amount > trans.amount:
-                returned_budget += trans.sold_price * trans.amount
-                owned_stock.update_amount(owned_stock.amount - trans.amount)
-                updated_basket.append(owned_stock)
-                break
-            # Sold all amount of stock
-            remaining_sold_amount -= trans.amount
-            returned_budget += trans.sold_price * owned_stock.amount
-            if remaining_sold_amount <= 0:
-                break
-        remained_stocks = updated_basket
-
-    context.update_budget(context.budget + returned_budget)
-    context.update_basket(remained_stocks)
-
-    return transactions  # to save all transactions in simulator
-
-
-def _handler(trade_algorithm: algorithm.Algorithm, context: algorithm.Context,
-             trader: trading_manager.TradingManager,
-             features: feature_manager.FeatureManager,
-             history: List[trading_manager.Transaction]):
-    now = datetime.datetime.now()
-    if now.isoweekday() > 5:  # if weeken,
-        return
-
-    context.update_market_time(now)
-    trading_target = trade_algorithm.run(context, features)
-    for trading in trading_target:
-        if trading.action == 'buy':
-            stock = trader.buy(trading)
-            context.buy_stocks([stock])
+            summary[stage] = {
+                'count': len(latencies),
+                'p50': float(np.percentile(latencies, 50)),
+                'p95': float(np.percentile(latencies, 95)),
+                'max': float(np.max(latencies)),
+            }
+        return summary
+
+
+class BrokerMinuteCandles:
+    """Fetches minute candles of a code from the broker.
+
+    Args:
+        trader: trading manager connected to the Cybos wrapper service.
+        bar_minutes: length of each candle in minutes.
+    """
+
+    COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+    def __init__(self, trader: trading_manager.DaishinTradingManager,
+                 bar_minutes: int):
+        self._trader = trader
+        self._bar_minutes = bar_minutes
+
+    def __call__(self, code: str, start: datetime.datetime,
+                 end: datetime.datetime) -> pd.DataFrame:
+        """Returns candles of `code` in `[start, end]` indexed by time."""
+        # More candles than needed, as the session opens after `start`.
+        bar_seconds = 60 * self._bar_minutes
+        count = int((end - start).total_seconds()) // bar_seconds + 1
+        response = self._trader.get_candles([code], 'm', self._bar_minutes,
+                                            count)[0]
+        if response is None:
+            raise RuntimeError(f'No candles of {code}')
+        candle_data = response.candle_data
+        candles = pd.DataFrame(
+            [[c.open, c.high, c.low, c.close, c.volume] for c in candle_data],
+            columns=self.COLUMNS,
+            index=pd.to_datetime([f'{c.date}{c.time:04d}' for c in candle_data],
+                                 format='%Y%m%d%H%M')).sort_index()
+        return candles[(candles.index >= start) & (candles.index <= end)]
+
+
+class AsyncTrader:
+    """Asyncio runtime to run an algorithm on session events.
+
+    Args:
+        fetch_candles: (Optional) callable with code, start and end which
+            returns candles of the code. Defaults to daily candles of
+            `features`.
+    """
+
+    def __init__(self,
+                 trade_algorithm: algorithm.Algorithm,
+                 context: algorithm.Context,
+                 trader: trading_manager.TradingManager,
+                 features: feature_manager.FeatureManager,
+                 session: MarketSession,
+                 codes: List[str],
+                 max_workers: int,
+                 fetch_candles: Callable[
+                     [str, datetime.datetime, datetime.datetime],
+                     pd.DataFrame] = None):
+        self._trade_algorithm = trade_algorithm
+        self._context = context
+        self._trader = trader
+        self._features = features
+        self._session = session
+        self._codes = codes
+        self._fetch_candles = fetch_candles or features.get_candle_data
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self.history = []
+        self.latency = LatencyRecorder()
+
+    async def _call(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _fetch_features(self, now: datetime.datetime):
+        """Fetch today's candles of watched and owned codes concurrently.
+
+        The candles are cached in the feature manager for the algorithm.
+        Daily candles of today do not change between bar closes.
+        """
+        codes = list(set(self._codes) | set(self._context.portfolio.codes))
+        start = datetime.datetime.combine(now.date(), datetime.time())
+        results = await asyncio.gather(*[
+            self._call(self._fetch_candles, code, start, now)
+            for code in codes
+        ],
+                                       return_exceptions=True)
+        candles = {}
+        for code, result in zip(codes, results):
+            if isinstance(result, Exception):
+                logging.warning(f'Failed to fetch {code}: {result}')
+            else:
+                candles[code] = result
+        self._features.set_cache(start, now, candles)
+
+    async def _sell(self, trading: algorithm.Trading):
+        transactions = await self._call(self._trader.sell, trading)
+        self._context.sell_stocks(transactions)
+        self.history += transactions
+
+    async def _buy(self, trading: algorithm.Trading):
+        stock = await self._call(self._trader.buy, trading)
+        if stock is not None:
+            self._context.buy_stocks([stock])
             # TODO(jseo): append buy history to history buffer
-        else:
-            history.append(_trading_sell_handler(context, trader, trading))
+
+    async def run_once(self, event_time: datetime.datetime, kind: str):
+        started = time.monotonic()
+        self._context.update_market_time(event_time)
+        self._trader.set_user_and_stock_data(self._context, None)
+
+        await self._fetch_features(event_time)
+        fetched = time.monotonic()
+        trading_target = await self._call(self._trade_algorithm.run,
+                                          self._context, self._features)
+        decided = time.monotonic()
+
+        # Sells go first to free cash for buys.
+        await asyncio.gather(*[
+            self._sell(trading)
+            for trading in trading_target
+            if trading.action == 'sell'
+        ])
+        await asyncio.gather(*[
+            self._buy(trading)
+            for trading in trading_target
+            if trading.action == 'buy'
+        ])
+        ordered = time.monotonic()
+
+        # Latency since the scheduled event, including timer delay.
+        total = (datetime.datetime.now() - event_time).total_seconds()
+        self.latency.record('fetch', fetched - started)
+        self.latency.record('algorithm', decided - fetched)
+        self.latency.record('order', ordered - decided)
+        self.latency.record('total', total)
+        logging.info(f'[{event_time}] {kind}: {len(trading_target)} orders, '
+                     f'{total:.3f}s from event to order submission.')
+
+    async def run(self):
+        while True:
+            event_time, kind = self._session.next_event(datetime.datetime.now())
+            delay = (event_time - datetime.datetime.now()).total_seconds()
+            logging.info(f'Next {kind} at {event_time}')
+            await asyncio.sleep(max(delay, 0))
+            try:
+                await self.run_once(event_time, kind)
+            except Exception:  # pylint: disable=broad-except
+                logging.exception(f'Failed to run on {kind} at {event_time}')
+            if kind == CLOSE_AUCTION:
+                logging.info(f'Latency summary: {self.latency.summary()}')
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+        logging.info(f'Latency summary: {self.latency.summary()}')
 
 
 def main(args):
     del args  # Unused
 
-    context = algorithm.Context(budget=FLAGS.budget, basket=[])
+    context = algorithm.Context(budget=FLAGS.budget)
     trade_algorithm = algorithm.DummyAlgorithm()
 
-    trader = trading_manager.get_trading_manager('daishin')
-    features = feature_manager.FeatureManager()
+    trader = trading_manager.get_trading_manager(
+        'daishin', {'address': FLAGS.cybos_address})
+    features = feature_manager.FinanceDataReaderManager('KRX')
+    fetch_candles = None
+    if FLAGS.candle_source == 'broker_minute':
+        fetch_candles = BrokerMinuteCandles(trader, FLAGS.bar_minutes)
 
-    # TODO(jseo): Seperate scheduler as class to manage frequency
-    scheduler = sched.scheduler(time.time, time.sleep)
-    scheduler.enter(FLAGS.frequency, 1, _handler,
-                    (trade_algorithm, context, trader, features))
-    scheduler.run(blocking=True)
+    async_trader = AsyncTrader(trade_algorithm, context, trader, features,
+                               MarketSession(FLAGS.bar_minutes), FLAGS.codes,
+                               FLAGS.max_workers, fetch_candles)
+    try:
+        asyncio.run(async_trader.run())
+    finally:
+        async_trader.shutdown()
 
 
 if __name__ == '__main__':
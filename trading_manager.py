@@ -3,13 +3,41 @@
 import abc
 import dataclasses
 from datetime import date
-from typing import List, Optional
+from datetime import datetime
+import math
+import os
+import sys
+from typing import List, Optional, Sequence
 
 from absl import logging
 
 from algorithm import algorithm
 import feature_manager
 
+# Cybos wrapper modules use flat imports since the service runs in its own
+# directory on Windows.
+_CYBOS_WRAPPER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'cybos_wrapper')
+
+# (Lower bound of price, tick size) of KRX stocks, in descending order.
+_KRX_TICK_SIZES = [(500_000, 1000), (200_000, 500), (50_000, 100),
+                   (20_000, 50), (5_000, 10), (2_000, 5), (0, 1)]
+
+
+def krx_tick_size(price: float) -> int:
+    """Returns KRX tick size of stocks at `price`."""
+    for lower_bound, tick_size in _KRX_TICK_SIZES:
+        if price >= lower_bound:
+            return tick_size
+    return 1
+
+
+def round_to_tick(price: float, up: bool) -> int:
+    """Rounds `price` to a KRX tick, up or down to stay within `price`."""
+    tick_size = krx_tick_size(price)
+    rounding = math.ceil if up else math.floor
+    return int(rounding(price / tick_size)) * tick_size
+
 
 class SecuritiesManager:
     pass
@@ -17,6 +45,9 @@ class SecuritiesManager:
 
 @dataclasses.dataclass
 class Transaction:
+    __slots__ = ('code', 'bought_price', 'sold_price', 'amount', 'bought_at',
+                 'sold_at')
+
     code: str
     bought_price: int
     sold_price: int
@@ -41,13 +72,117 @@ class TradingManager(abc.ABC):
     def sell(self, trading: algorithm.Trading) -> List[Transaction]:
         raise NotImplementedError()
 
+    def set_user_and_stock_data(self, context: algorithm.Context, stock_data):
+        pass
+
     # TODO(jseo): Check the following method
     def get_transactions(self):
         return self._transactions
 
 
 class DaishinTradingManager(TradingManager):
-    pass
+    """Trading manager through Cybos wrapper service of Daishin securities."""
+
+    def __init__(self,
+                 address: str = 'localhost:11231',
+                 timeout: float = 10.,
+                 max_retries: int = 3):
+        super().__init__()
+        # Imported here not to load gRPC for back tests.
+        if _CYBOS_WRAPPER_DIR not in sys.path:
+            sys.path.append(_CYBOS_WRAPPER_DIR)
+        import cybos_client  # pylint: disable=import-outside-toplevel
+        self._client = cybos_client.CybosClient(address,
+                                                timeout=timeout,
+                                                max_retries=max_retries)
+        self._context = None
+
+    def set_user_and_stock_data(self, context: algorithm.Context, stock_data):
+        self._context = context
+
+    @staticmethod
+    def _to_cybos_code(code: str) -> str:
+        # Cybos prefixes 'A' to stock codes.
+        return code if code.startswith('A') else f'A{code}'
+
+    @staticmethod
+    def _order_price(trading: algorithm.Trading) -> int:
+        # Limit price not to buy above or sell below `bound_price`.
+        return round_to_tick(trading.bound_price, up=trading.action != 'buy')
+
+    def _submit_future(self, trading: algorithm.Trading):
+        return self._client.submit_order_future(
+            self._to_cybos_code(trading.code),
+            'L' if trading.action == 'buy' else 'S', int(trading.amount),
+            self._order_price(trading))
+
+    def _to_stock(self, trading: algorithm.Trading) -> algorithm.Stock:
+        return algorithm.Stock(code=trading.code,
+                               bought_price=self._order_price(trading),
+                               amount=trading.amount,
+                               bought_at=datetime.now())
+
+    def _to_transactions(self, trading: algorithm.Trading) -> List[Transaction]:
+        owned_stock = (self._context.portfolio.get(trading.code)
+                       if self._context else None)
+        return [
+            Transaction(
+                code=trading.code,
+                bought_price=owned_stock.bought_price if owned_stock else 0,
+                sold_price=self._order_price(trading),
+                amount=trading.amount,
+                bought_at=owned_stock.bought_at if owned_stock else None,
+                sold_at=datetime.now())
+        ]
+
+    def buy(self, trading: algorithm.Trading) -> Optional[algorithm.Stock]:
+        self._submit_future(trading).result()
+        return self._to_stock(trading)
+
+    def sell(self, trading: algorithm.Trading) -> List[Transaction]:
+        self._submit_future(trading).result()
+        return self._to_transactions(trading)
+
+    def submit_all(self, tradings: Sequence[algorithm.Trading]):
+        """Submit `tradings` concurrently.
+
+        Returns:
+            list of bought `Stock`s and list of sold `Transaction`s. Failed
+            orders are logged and excluded.
+        """
+        import grpc  # pylint: disable=import-outside-toplevel
+        calls = [(trading, self._submit_future(trading))
+                 for trading in tradings]
+        stocks, transactions = [], []
+        for trading, call in calls:
+            try:
+                call.result()
+            except grpc.RpcError as ex:
+                logging.error(f'Failed to submit {trading}: {ex}')
+                continue
+            if trading.action == 'buy':
+                stocks.append(self._to_stock(trading))
+            else:
+                transactions += self._to_transactions(trading)
+        return stocks, transactions
+
+    def get_candles(self, codes: Sequence[str], cycle_type: str, cycle: int,
+                    count: int):
+        """Get candles of `codes` in one batched call.
+
+        Returns responses in the order of `codes`, None of failed codes.
+        """
+        cybos_codes = [self._to_cybos_code(code) for code in codes]
+        responses = {}
+        for response in self._client.stream_candles([
+            (code, cycle_type, cycle, count) for code in cybos_codes
+        ]):
+            if response.error_code:
+                logging.error(f'Failed to get candles of {response.code}: '
+                              f'{response.error_message}')
+                continue
+            responses[response.code] = response
+        return [responses.get(code) for code in cybos_codes]
 
 
 class BackTestTradingManager(TradingManager):
@@ -94,33 +229,22 @@ class BackTestTradingManager(TradingManager):
         return self._selling_to_transaction(trading)
 
     def _selling_to_transaction(self, trading):
-        transactions = []
         close_price = self.get_stock_close_price(trading.code)
         if close_price is None:
             return []
 
-        selling_amount = trading.amount
-        for owned_stock in self._context.basket.values():
-            if owned_stock.code != trading.code:
-                continue
+        owned_stock = self._context.portfolio.get(trading.code)
+        if owned_stock is None:
+            return []
 
-            if selling_amount > owned_stock.amount:
-                selling_amount_for_owned_stock = owned_stock.amount
-                selling_amount -= owned_stock.amount
-            else:
-                selling_amount_for_owned_stock = selling_amount
-                selling_amount = 0
-
-            transaction = Transaction(code=owned_stock.code,
-                                      bought_price=owned_stock.bought_price,
-                                      sold_price=close_price,
-                                      amount=selling_amount_for_owned_stock,
-                                      bought_at=owned_stock.bought_at,
-                                      sold_at=self.get_market_time())
-            transactions.append(transaction)
-            if selling_amount == 0:
-                break
-        return transactions
+        return [
+            Transaction(code=owned_stock.code,
+                        bought_price=owned_stock.bought_price,
+                        sold_price=close_price,
+                        amount=min(trading.amount, owned_stock.amount),
+                        bought_at=owned_stock.bought_at,
+                        sold_at=self.get_market_time())
+        ]
 
     def log(self, log_str):
         if not self.LOGGING:
@@ -130,7 +254,7 @@ class BackTestTradingManager(TradingManager):
 
 def get_trading_manager(trading_manager_type: str, kwargs) -> TradingManager:
     if trading_manager_type == 'daishin':
-        return DaishinTradingManager()
+        return DaishinTradingManager(**kwargs)
     if trading_manager_type == 'back_test':
         return BackTestTradingManager(**kwargs)
     raise NotImplementedError(
@@ -0,0 +1,97 @@
+"""Tests of `DaishinTradingManager` against a fake `DeepTrader` servicer."""
+
+import datetime
+import os
+import sys
+import unittest
+
+from algorithm import algorithm
+import trading_manager
+
+sys.path.append(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cybos_wrapper'))
+import fake_deep_trader_service  # pylint: disable=wrong-import-position
+
+
+def _trading(code, amount, action):
+    return algorithm.Trading(code=code,
+                             target_price=10000,
+                             bound_price=10537 if action == 'buy' else 9483,
+                             amount=amount,
+                             action=action)
+
+
+class TickSizeTest(unittest.TestCase):
+
+    def test_krx_tick_size(self):
+        self.assertEqual([
+            trading_manager.krx_tick_size(price)
+            for price in [1999, 2000, 4995, 5000, 20000, 50000, 200000, 500000]
+        ], [1, 5, 5, 10, 50, 100, 500, 1000])
+
+    def test_round_to_tick_stays_within_price(self):
+        self.assertEqual(trading_manager.round_to_tick(10537, up=False), 10530)
+        self.assertEqual(trading_manager.round_to_tick(9483, up=True), 9490)
+        self.assertEqual(trading_manager.round_to_tick(4998.5, up=True), 5000)
+        self.assertEqual(trading_manager.round_to_tick(10530, up=True), 10530)
+
+
+class DaishinTradingManagerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servicer = fake_deep_trader_service.FakeDeepTraderServicer(
+            failed_codes=['A000660'])
+        server, address = fake_deep_trader_service.serve(self.servicer)
+        self.addCleanup(server.stop, None)
+        self.trader = trading_manager.DaishinTradingManager(address,
+                                                            timeout=2.)
+        client = self.trader._client  # pylint: disable=protected-access
+        self.addCleanup(client.close)
+
+    def test_submit_all_excludes_failed_orders(self):
+        self.trader.set_user_and_stock_data(
+            algorithm.Context(budget=0,
+                              basket={
+                                  '035420':
+                                      algorithm.Stock(
+                                          '035420', 900, 3,
+                                          datetime.datetime(2021, 3, 2))
+                              }), None)
+
+        stocks, transactions = self.trader.submit_all([
+            _trading('005930', 10, 'buy'),
+            _trading('000660', 5, 'buy'),
+            _trading('035420', 3, 'sell'),
+        ])
+
+        self.assertEqual([(stock.code, stock.amount) for stock in stocks],
+                         [('005930', 10)])
+        self.assertEqual([(transaction.code, transaction.bought_price,
+                           transaction.sold_price, transaction.amount)
+                          for transaction in transactions],
+                         [('035420', 900, 9490, 3)])
+        # Failed order is not retried.
+        self.assertEqual(self.servicer.calls['SubmitOrder'], 3)
+        self.assertEqual(stocks[0].bought_price, 10530)
+        # Limit orders at bound prices rounded to KRX ticks.
+        self.assertCountEqual([(order.code, order.order_type, order.count,
+                                order.price)
+                               for order in self.servicer.orders],
+                              [('A005930', 'L', 10, 10530),
+                               ('A035420', 'S', 3, 9490)])
+
+    def test_submit_all_has_deadline(self):
+        self.trader.submit_all([_trading('005930', 10, 'buy')])
+
+        self.assertLess(self.servicer.time_remaining[0], 2.1)
+
+    def test_get_candles_of_failed_code_is_none(self):
+        responses = self.trader.get_candles(['005930', '000660', '035420'],
+                                            'm', 1, 10)
+
+        self.assertEqual([response and response.code for response in responses],
+                         ['A005930', None, 'A035420'])
+
+
+if __name__ == '__main__':
+    unittest.main()